@@ -0,0 +1,242 @@
+"""
+Answer Preview Module
+Live score previews while a student types. The tokenization of each draft
+(analyzer terms, concept stems and quality signals, word by word) is kept per
+student and question; when the draft changes only the words from the first
+edited character onwards are tokenized again and the running counts patched,
+so a preview of a long draft costs about as much as one of a short draft.
+Scoring reuses the cached question features of the scoring model.
+"""
+
+import os
+import re
+import time
+import bisect
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Tuple
+import numpy as np
+from answer_scorer import (CONCEPT_STOP_WORDS, CONSTRUCTION_TERMS, STRUCTURE_WORDS, clean_text, combine_scores,
+                           embed_sentences, quality_score, scoring_model, vectorize_terms)
+from calculation_grader import grade_calculation
+import feedback_phrases as phrases
+from feedback_phrases import render_feedback
+from sentence_alignment import SentenceAlignment, split_sentences
+from stemming import stem
+
+# Seconds a student waits between previews (per worker)
+PREVIEW_MIN_INTERVAL = float(os.environ.get('PREVIEW_MIN_INTERVAL', 0.5))
+
+# Drafts whose tokenization (and students whose last preview time) is kept per worker,
+# least recently previewed dropped first
+MAX_PREVIEW_DRAFTS = 1000
+
+# Whitespace-separated words of a draft
+WORD_PATTERN = re.compile(r'\S+')
+
+# Same words as extract_key_concepts
+CONCEPT_PATTERN = re.compile(r'\b[a-zA-Z]{4,}\b')
+
+def common_prefix_length(first, second):
+    """Length of the longest common prefix, found by comparing slices (memcmp) rather than characters"""
+    length = min(len(first), len(second))
+    if first[:length] == second[:length]:
+        return length
+
+    low, high = 0, length - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+@dataclass
+class _Word:
+    """What one whitespace-separated word of a draft contributes"""
+    length: int  # characters left after cleaning
+    tokens: Tuple[str, ...]  # analyzer tokens, stop words removed
+    stems: Tuple[str, ...]  # stems of its concepts
+    signals: Tuple[str, ...]  # quality signals present in the word
+
+class _Draft:
+    """Incremental tokenization of one student's draft answer to one question"""
+
+    def __init__(self, features):
+        self.features = features
+        vectorizer = features.vectorizer
+        self._preprocess = vectorizer.build_preprocessor()
+        self._tokenize = vectorizer.build_tokenizer()
+        self._stop_words = vectorizer.get_stop_words() or frozenset()
+        self._min_n, self._max_n = vectorizer.ngram_range
+        self.lock = threading.Lock()
+
+        self.text = ''
+        self.words = []
+        self.ends = []  # offset just past each word in text
+        self.tokens = []
+        self.terms = Counter()  # analyzer terms (n-grams) -> count
+        self.unigrams = Counter()
+        self.stems = Counter()
+        self.signals = Counter()
+        self.characters = 0  # cleaned characters, not counting spaces
+        self.sentence_columns = {}  # student sentence -> cosine with every reference sentence
+
+    def update(self, text):
+        """Patch the tokenization to a new draft, re-tokenizing only from the first changed word"""
+        # Words ending before the first changed character are followed by unchanged whitespace
+        kept = bisect.bisect_left(self.ends, common_prefix_length(self.text, text))
+        for word in reversed(self.words[kept:]):
+            for _ in word.tokens:
+                self._pop_token()
+            _subtract(self.stems, word.stems)
+            _subtract(self.signals, word.signals)
+            self.characters -= word.length
+        del self.words[kept:]
+        del self.ends[kept:]
+
+        for match in WORD_PATTERN.finditer(text, self.ends[-1] if self.ends else 0):
+            word = self._analyze(match.group())
+            for token in word.tokens:
+                self._push_token(token)
+            self.stems.update(word.stems)
+            self.signals.update(word.signals)
+            self.characters += word.length
+            self.words.append(word)
+            self.ends.append(match.end())
+        self.text = text
+
+    def _analyze(self, raw_word):
+        # Cleaning, spelling correction and tokenization are all word-local, so tokenizing
+        # word by word gives what the scorer gets from the whole answer
+        word = clean_text(raw_word)
+        if self.features.spell_index is not None:
+            word = self.features.spell_index.normalize(word)
+        tokens = tuple(token for token in self._tokenize(self._preprocess(word)) if token not in self._stop_words)
+        concepts = {concept for concept in CONCEPT_PATTERN.findall(word) if concept not in CONCEPT_STOP_WORDS}
+
+        signals = []
+        if word:
+            signals.append('words')
+        if '.' in word or '!' in word or '?' in word:
+            signals.append('sentences')
+        if any(structure_word in word for structure_word in STRUCTURE_WORDS):
+            signals.append('structure')
+        if any(term in word for term in CONSTRUCTION_TERMS):
+            signals.append('terms')
+        return _Word(len(word), tokens, tuple(stem(concept) for concept in concepts), tuple(signals))
+
+    def _push_token(self, token):
+        self.tokens.append(token)
+        end = len(self.tokens)
+        for n in range(self._min_n, min(self._max_n, end) + 1):
+            self.terms[' '.join(self.tokens[end - n:end])] += 1
+        self.unigrams[token] += 1
+
+    def _pop_token(self):
+        end = len(self.tokens)
+        for n in range(self._min_n, min(self._max_n, end) + 1):
+            _subtract(self.terms, (' '.join(self.tokens[end - n:end]),))
+        _subtract(self.unigrams, (self.tokens.pop(),))
+
+    def preview(self):
+        """Score and feedback for the current draft, as score_answer would give them"""
+        features = self.features
+        # Only drafts with fewer than 5 word characters can be too short to score
+        if self.characters < 5 and len(clean_text(self.text)) < 5:
+            return {'score': 0, 'feedback': render_feedback([phrases.TOO_SHORT])}
+
+        user_stems = set(self.stems)
+        user_semantic = (features.semantic_space.transform_terms(self.unigrams)
+                         if features.semantic_space is not None else None)
+        similarities, coverages = features.compare_vectors(vectorize_terms(features.vectorizer, self.terms),
+                                                           user_stems, user_semantic)
+        quality = quality_score(self.signals['words'], self.signals['sentences'] > 0,
+                                self.signals['structure'] > 0, self.signals['terms'] > 0)
+        alignment = self._align() if features.sentences is not None else None
+
+        score, feedback_codes, _ = combine_scores(self.text, features.references, similarities, coverages, quality,
+                                                  features.difficulty, features, user_stems, alignment)
+        return {'score': score, 'feedback': render_feedback(feedback_codes)}
+
+    def _align(self):
+        """Sentence alignment, vectorizing only sentences not seen in earlier versions of the draft"""
+        key = self.features.sentences
+        sentences = split_sentences(self.text)
+        if len(self.sentence_columns) > 2 * len(sentences) + 100:
+            self.sentence_columns = {sentence: self.sentence_columns[sentence]
+                                     for sentence in sentences if sentence in self.sentence_columns}
+
+        new = [sentence for sentence in dict.fromkeys(sentences) if sentence not in self.sentence_columns]
+        if new:
+            vectors = embed_sentences(new, self.features.vectorizer, self.features.spell_index)
+            columns = (key.vectors @ vectors.T).toarray()
+            for index, sentence in enumerate(new):
+                self.sentence_columns[sentence] = columns[:, index]
+
+        if not sentences:
+            return SentenceAlignment(key, np.zeros(len(key.sentences)))
+        return SentenceAlignment(key, np.max([self.sentence_columns[sentence] for sentence in sentences], axis=0))
+
+def _subtract(counter, keys):
+    """Decrement counts, dropping keys that reach zero so the counter's keys are what is present"""
+    for key in keys:
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+class AnswerPreviewer:
+    """Per-worker store of draft tokenizations, with a per-student preview rate limit"""
+
+    def __init__(self, max_drafts=MAX_PREVIEW_DRAFTS, min_interval=PREVIEW_MIN_INTERVAL):
+        self.max_drafts = max_drafts
+        self.min_interval = min_interval
+        self._drafts = OrderedDict()  # (user id, question id) -> _Draft, least recently previewed first
+        self._last_preview = OrderedDict()  # user id -> time of the last preview, least recent first
+        self._lock = threading.Lock()
+
+    def retry_after(self, user_id):
+        """Seconds the student must still wait before another preview; 0 records a preview now"""
+        now = time.monotonic()
+        with self._lock:
+            wait = self._last_preview.get(user_id, -self.min_interval) + self.min_interval - now
+            if wait > 0:
+                return wait
+            # Students who have stopped previewing are dropped first, as their drafts are
+            self._last_preview.pop(user_id, None)
+            self._last_preview[user_id] = now
+            while len(self._last_preview) > self.max_drafts:
+                self._last_preview.popitem(last=False)
+            return 0
+
+    def preview(self, user_id, question_id, draft):
+        """Score preview of a draft: {'score', 'feedback'}, or None when the question has no preview"""
+        # Multiple-choice questions are answered by picking an option, not typed
+        if scoring_model.get_answer_key(question_id) is not None:
+            return None
+        features = scoring_model.get_features(question_id)
+        if features is None:
+            return None
+
+        if features.calculation is not None:
+            result = grade_calculation(draft, features.calculation)
+            return {'score': result['score'], 'feedback': result['feedback']}
+
+        key = (user_id, question_id)
+        with self._lock:
+            state = self._drafts.pop(key, None)
+            # A refitted bank invalidates the draft's tokens
+            if state is None or state.features is not features:
+                state = _Draft(features)
+            self._drafts[key] = state
+            while len(self._drafts) > self.max_drafts:
+                self._drafts.popitem(last=False)
+
+        with state.lock:
+            state.update(draft)
+            return state.preview()
+
+# Initialize shared answer previewer
+answer_previewer = AnswerPreviewer()
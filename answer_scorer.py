@@ -0,0 +1,948 @@
+"""
+Answer Scoring Module
+Scores student answers against model answers using NLP techniques, a
+corpus-level TF-IDF model fitted over the whole question bank and, when one
+has been trained, an LSA semantic space
+"""
+
+import os
+import re
+import time
+import heapq
+import hashlib
+import textwrap
+import random
+import zlib
+import threading
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.metrics.pairwise import cosine_similarity
+from models import Question, ReferenceAnswer, db
+from data_store import mock_ai_score
+from semantic_space import SEMANTIC_WEIGHT, SemanticSpace, space_version
+from calculation_grader import CalculationKey, calculation_key, grade_calculation
+from choice_grader import grade_choice
+from spell_index import SpellIndex, english_lexicon, vocabulary_of
+from sentence_alignment import SENTENCE_ALIGNMENT_MIN_MARKS, SentenceKey, sentence_key, split_sentences
+from stemming import stem, stems
+from text_cleaning import clean_text
+import feedback_phrases as phrases
+from feedback_phrases import render_feedback
+
+logger = logging.getLogger(__name__)
+
+# Text vectorizer used for similarity: 'tfidf' (vocabulary fitted on the bank) or
+# 'hashing' (stateless feature hashing - fixed memory, identical in every worker)
+SCORING_BACKEND = os.environ.get('SCORING_BACKEND', 'tfidf').lower()
+
+# Dimension of the hashed feature space for the 'hashing' backend
+HASHING_FEATURES = int(os.environ.get('HASHING_FEATURES', 2 ** 18))
+
+# Words ignored by extract_key_concepts
+CONCEPT_STOP_WORDS = {'this', 'that', 'with', 'have', 'will', 'from', 'they', 'been', 'were', 'said',
+                      'each', 'which', 'their', 'time', 'would', 'there', 'could', 'other', 'more',
+                      'very', 'what', 'know', 'just', 'first', 'into', 'over', 'think', 'also'}
+
+# Answers with more words than this are scored in degraded mode on a bounded sample
+MAX_SCORED_WORDS = int(os.environ.get('MAX_SCORED_WORDS', 2000))
+
+# Degraded mode keeps this share of the word budget from the start of the answer and
+# fills the rest with windows of SAMPLE_WINDOW_WORDS words sampled from the remainder
+DEGRADED_HEAD_SHARE = 0.75
+SAMPLE_WINDOW_WORDS = 25
+
+# Most missed concepts named in the feedback
+MISSING_CONCEPTS_SHOWN = 3
+
+# Keyword lists used by assess_answer_quality
+STRUCTURE_WORDS = ['first', 'second', 'third', 'finally', 'therefore', 'because']
+CONSTRUCTION_TERMS = ['construction', 'building', 'scaffold', 'brick', 'mortar', 'foundation',
+                      'safety', 'material', 'structure', 'tool', 'equipment']
+
+def blend_semantic_similarity(lexical, semantic):
+    """Similarity component when a semantic space is available: lexical and LSA cosines mixed"""
+    return (1 - SEMANTIC_WEIGHT) * lexical + SEMANTIC_WEIGHT * np.clip(semantic, 0.0, 1.0)
+
+def bound_answer(user_answer, max_words=None):
+    """
+    Limit how much of an answer scoring has to process: returns (text, degraded).
+    Words are streamed rather than split, so huge answers are never tokenized in full:
+    the head of the answer is kept as is and the rest of the budget is a reservoir
+    sample of word windows from the remainder, kept in their original order.
+    """
+    max_words = max_words or MAX_SCORED_WORDS
+    # Every word needs a character and a separator, so short texts cannot be over budget
+    if not user_answer or len(user_answer) < 2 * max_words:
+        return user_answer, False
+
+    words = re.finditer(r'\S+', user_answer)
+    head_words = int(max_words * DEGRADED_HEAD_SHARE)
+    head = [match.group() for _, match in zip(range(head_words), words)]
+
+    # Seeded by the text, so the same answer always gets the same sample (and score)
+    rng = random.Random(zlib.crc32(user_answer.encode('utf-8')))
+    slots = max(1, (max_words - head_words) // SAMPLE_WINDOW_WORDS)
+    reservoir = []
+    window = []
+    seen = 0
+    for match in words:
+        window.append(match.group())
+        if len(window) < SAMPLE_WINDOW_WORDS:
+            continue
+        if len(reservoir) < slots:
+            reservoir.append((seen, window))
+        else:
+            replace = rng.randrange(seen + 1)
+            if replace < slots:
+                reservoir[replace] = (seen, window)
+        seen += 1
+        window = []
+
+    if len(head) + seen * SAMPLE_WINDOW_WORDS + len(window) <= max_words:
+        return user_answer, False  # long words, but within the word budget
+
+    sampled = [word for _, chunk in sorted(reservoir) for word in chunk]
+    return ' '.join(head + sampled), True
+
+def make_vectorizer(backend=None):
+    """Create the similarity vectorizer for a scoring backend"""
+    backend = backend or SCORING_BACKEND
+    if backend == 'hashing':
+        # Unsigned counts, L2-normalised rows, so dot products are cosines as with TF-IDF
+        return HashingVectorizer(stop_words='english', ngram_range=(1, 2), n_features=HASHING_FEATURES,
+                                 alternate_sign=False, norm='l2')
+    if backend == 'tfidf':
+        return TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
+    raise ValueError(f"Unknown scoring backend '{backend}' (expected 'tfidf' or 'hashing')")
+
+@dataclass
+class QuestionFeatures:
+    """Precomputed scoring features for one question's model answer and its alternative references"""
+    question_id: int
+    model_answer: str
+    difficulty: str
+    references: List[str]  # model answer first, then any alternative reference answers
+    vectors: object  # references x vocabulary sparse rows, L2-normalised
+    concepts: Set[str]  # concepts of the model answer itself
+    concept_ids: Dict[str, int]  # stem -> column, over the union of every reference's concept stems
+    reference_concepts: object  # references x concept stems, 1 where the reference has the concept
+    vectorizer: object  # TfidfVectorizer or HashingVectorizer, depending on the backend
+    semantic_space: Optional[SemanticSpace] = None
+    semantic_vectors: object = None  # references x LSA components, when a semantic space is loaded
+    calculation: Optional[CalculationKey] = None  # quantities to grade against, for calculation questions
+    spell_index: Optional[SpellIndex] = None  # shared by every question, corrects to bank vocabulary
+    concept_weights: List[Dict[str, Tuple[float, str]]] = field(default_factory=list)  # per reference: stem -> (IDF, word)
+    sentences: Optional[SentenceKey] = None  # reference sentences, for long essay questions
+
+    def align_sentences(self, user_answer):
+        """Sentence alignment of an answer with every reference, or None if the question is not aligned"""
+        if self.sentences is None:
+            return None
+        return self.sentences.align(embed_sentences(split_sentences(user_answer), self.vectorizer, self.spell_index))
+
+    def missing_concepts(self, reference, user_stems, limit=MISSING_CONCEPTS_SHOWN):
+        """A reference's concepts the student left out, highest bank IDF first"""
+        if reference >= len(self.concept_weights):
+            return []
+        weights = self.concept_weights[reference]
+        return [weights[key][1] for key in heapq.nlargest(limit, weights.keys() - user_stems, key=weights.__getitem__)]
+
+    def compare(self, user_clean, user_concepts):
+        """
+        Similarity and concept coverage against every reference at once:
+        one sparse matrix-vector product each, however many references there are
+        """
+        user_semantic = self.semantic_space.transform([user_clean])[0] if self.semantic_space is not None else None
+        return self.compare_vectors(self.vectorizer.transform([user_clean]), stems(user_concepts), user_semantic)
+
+    def compare_vectors(self, user_vector, user_stems, user_semantic=None):
+        """compare() for an answer already vectorized: its 1 x vocabulary row, concept stems and LSA vector"""
+        # Rows are L2-normalised, so the dot products are cosines
+        similarities = (self.vectors @ user_vector.T).toarray().ravel()
+        if self.semantic_space is not None:
+            similarities = blend_semantic_similarity(similarities, self.semantic_vectors @ user_semantic)
+
+        concept_counts = self.reference_concepts.getnnz(axis=1)
+        coverages = np.zeros(len(self.references))
+        if user_stems:
+            matched = np.zeros(len(self.concept_ids))
+            matched[[self.concept_ids[key] for key in user_stems if key in self.concept_ids]] = 1
+            coverages = np.minimum(1.0, (self.reference_concepts @ matched) / np.maximum(concept_counts, 1))
+        coverages = np.where(concept_counts == 0, 0.8, coverages)  # Benefit of doubt, as before
+        return similarities, coverages
+
+@dataclass
+class _CorpusSnapshot:
+    """Immutable view of the fitted corpus, swapped atomically on refresh"""
+    fingerprint: Tuple
+    vectorizer: object  # None when the bank is empty
+    features: Dict[int, QuestionFeatures]
+    matrix: object = None  # references x vocabulary TF-IDF rows
+    reference_rows: Dict[int, np.ndarray] = field(default_factory=dict)  # question id -> matrix rows
+    concept_vocabulary: Dict[str, int] = field(default_factory=dict)  # concept stem -> column
+    concept_matrix: object = None  # references x concept stems, 1 where the reference has the concept
+    semantic_space: Optional[SemanticSpace] = None
+    semantic_matrix: object = None  # references x LSA components, rows as in matrix
+    answer_keys: Dict[int, str] = field(default_factory=dict)  # question id -> correct option letter
+    spell_index: Optional[SpellIndex] = None
+
+    def concept_relation(self, terms):
+        """Sparse terms x concepts matrix, 1 where a student term has the stem of a bank concept"""
+        term_ids = []
+        concept_ids = []
+        for term_id, term in enumerate(terms):
+            concept_id = self.concept_vocabulary.get(stem(term))
+            if concept_id is not None:
+                term_ids.append(term_id)
+                concept_ids.append(concept_id)
+
+        data = np.ones(len(term_ids), dtype=np.int32)
+        return sparse.csr_matrix((data, (term_ids, concept_ids)),
+                                 shape=(len(terms), len(self.concept_vocabulary)))
+
+class ScoringModel:
+    """Corpus-level TF-IDF (or hashed) model with cached per-question vectors and concepts"""
+
+    def __init__(self, check_interval=5.0, backend=None):
+        # How often (seconds) to compare the cache against the question bank,
+        # so edits made by other gunicorn workers are picked up as well
+        self.check_interval = check_interval
+        self.backend = backend or SCORING_BACKEND
+        self._snapshot = None
+        self._stale = True
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Mark the cache stale so the next lookup refits the corpus"""
+        self._stale = True
+
+    def get_features(self, question_id, model_answer=None):
+        """Get cached features for a question, or None if it is not in the bank"""
+        if question_id is None:
+            return None
+
+        snapshot = self._current_snapshot()
+        if snapshot is None:
+            return None
+
+        features = snapshot.features.get(question_id)
+        if features is None:
+            return None
+
+        # Guard against scoring with a model answer that has changed underneath us
+        if model_answer is not None and features.model_answer != model_answer:
+            return None
+
+        return features
+
+    def get_answer_key(self, question_id):
+        """Correct option of a multiple-choice question, or None for questions scored with NLP"""
+        if question_id is None:
+            return None
+        snapshot = self._current_snapshot()
+        return snapshot.answer_keys.get(question_id) if snapshot is not None else None
+
+    def get_corpus(self):
+        """Get the current fitted corpus snapshot (None until the bank has been loaded)"""
+        return self._current_snapshot()
+
+    def corpus_version(self):
+        """
+        Short hash of the backend and the fitted bank. Every score depends on both: the bank
+        sets the IDF weights, the spell vocabulary and (through its version) the LSA space.
+        """
+        snapshot = self._current_snapshot()
+        fingerprint = snapshot.fingerprint if snapshot is not None else None
+        return hashlib.sha1(repr((self.backend, fingerprint)).encode('utf-8')).hexdigest()[:16]
+
+    def _current_snapshot(self):
+        """Return the fitted snapshot, refitting it if the bank has changed"""
+        now = time.monotonic()
+        if not self._stale and self._snapshot is not None and now - self._last_check < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            try:
+                fingerprint = self._bank_fingerprint()
+                self._last_check = now
+                if self._stale or self._snapshot is None or fingerprint != self._snapshot.fingerprint:
+                    self._snapshot = self._build_snapshot(fingerprint)
+                    self._stale = False
+            except Exception as e:
+                logger.error(f"Error refreshing scoring model: {e}")
+
+        return self._snapshot
+
+    def _bank_fingerprint(self):
+        """Cheap summary of the question bank that changes whenever it is edited"""
+        count, max_id, last_update = db.session.query(
+            db.func.count(Question.id),
+            db.func.max(Question.id),
+            db.func.max(Question.updated_at)
+        ).one()
+        reference_count, max_reference_id = db.session.query(
+            db.func.count(ReferenceAnswer.id),
+            db.func.max(ReferenceAnswer.id)
+        ).one()
+        semantic_version = space_version() if SEMANTIC_WEIGHT > 0 else None
+        return (count, max_id, str(last_update), reference_count, max_reference_id, semantic_version)
+
+    def what_if_corpus(self, question_id, model_answer, difficulty=None, reference_answers=None,
+                       question_type=None):
+        """
+        Corpus snapshot as it would be if a question's model answer (and optionally its difficulty, type
+        and alternative answers) were replaced by a draft; nothing is stored. The vectorizer is refitted over
+        the bank with the draft in it, as saving would do, but only the draft question gets features.
+        """
+        questions, alternatives, _ = self._load_bank()
+        questions = [(row_id, model_answer, difficulty or row_difficulty, question_type or row_type, marks)
+                     if row_id == question_id else (row_id, text, row_difficulty, row_type, marks)
+                     for row_id, text, row_difficulty, row_type, marks in questions]
+        if reference_answers is not None:
+            alternatives[question_id] = list(reference_answers)
+
+        # The live snapshot's spell index and semantic space are reused, so nothing is rebuilt on disk
+        current = self._current_snapshot()
+        return self._fit_snapshot(None, questions, alternatives, {}, only={question_id}, base=current)
+
+    def _load_bank(self):
+        """Questions (id, model answer, difficulty, type, marks), alternative answers and answer keys"""
+        questions = db.session.query(Question.id, Question.model_answer, Question.difficulty,
+                                     Question.question_type, Question.marks).all()
+        answer_keys = dict(db.session.query(Question.id, Question.correct_choice).
+                           filter(Question.correct_choice.isnot(None)))
+        alternatives = {}
+        for question_id, answer_text in db.session.query(ReferenceAnswer.question_id, ReferenceAnswer.answer_text).\
+                order_by(ReferenceAnswer.id):
+            alternatives.setdefault(question_id, []).append(answer_text)
+        return questions, alternatives, answer_keys
+
+    def _build_snapshot(self, fingerprint):
+        """Fit one vectorizer over every reference answer and cache per-question features"""
+        questions, alternatives, answer_keys = self._load_bank()
+        return self._fit_snapshot(fingerprint, questions, alternatives, answer_keys)
+
+    def _fit_snapshot(self, fingerprint, questions, alternatives, answer_keys, only=None, base=None):
+        """
+        Fit the corpus over the given bank. Features are built for the questions in only (default: all);
+        a base snapshot's spell index and semantic space are reused instead of being loaded.
+        """
+        # One corpus row per reference; each question's model answer comes first
+        question_rows = []  # (question id, model answer, difficulty, question type, marks, raw references, first row)
+        raw_references = []
+        cleaned_references = []
+        for question_id, model_answer, difficulty, question_type, marks in questions:
+            if not clean_text(model_answer):
+                continue
+            references = [text for text in [model_answer] + alternatives.get(question_id, []) if clean_text(text)]
+            question_rows.append((question_id, model_answer, difficulty or 'medium', question_type, marks,
+                                  references, len(raw_references)))
+            raw_references.extend(references)
+            cleaned_references.extend(clean_text(text) for text in references)
+
+        if not cleaned_references:
+            return _CorpusSnapshot(fingerprint, None, {}, answer_keys=answer_keys)
+
+        vectorizer = make_vectorizer(self.backend)
+        try:
+            # Hashing has nothing to fit, so this is a plain transform for that backend
+            matrix = vectorizer.fit_transform(cleaned_references).tocsr()
+        except ValueError:
+            # Only stop words in the whole bank - nothing to fit
+            return _CorpusSnapshot(fingerprint, None, {}, answer_keys=answer_keys)
+
+        reference_concept_sets = [extract_key_concepts(text) for text in cleaned_references]
+        reference_stem_sets = [stems(concepts) for concepts in reference_concept_sets]
+        concept_vocabulary = {}
+        concept_rows = []
+        concept_cols = []
+        for row, concept_stems in enumerate(reference_stem_sets):
+            for concept_stem in concept_stems:
+                concept_rows.append(row)
+                concept_cols.append(concept_vocabulary.setdefault(concept_stem, len(concept_vocabulary)))
+
+        concept_matrix = sparse.csr_matrix(
+            (np.ones(len(concept_rows), dtype=np.int32), (concept_rows, concept_cols)),
+            shape=(len(cleaned_references), len(concept_vocabulary))
+        )
+
+        # Smoothed IDF of each concept over the bank's references (as TfidfVectorizer computes it),
+        # used to rank missed concepts in the feedback
+        document_frequency = np.bincount(concept_cols, minlength=len(concept_vocabulary))
+        concept_idf = np.log((1 + len(cleaned_references)) / (1 + document_frequency)) + 1
+        reference_weights = [_concept_weights(concepts, lambda key: float(concept_idf[concept_vocabulary[key]]))
+                             for concepts in reference_concept_sets]
+
+        if base is not None:
+            spell_index = base.spell_index
+            semantic_space = base.semantic_space
+        else:
+            # Deletion index is only loaded (or rebuilt for a new vocabulary) on the first misspelling;
+            # the word list it must leave alone is read now, so no answer waits for it
+            spell_index = SpellIndex(vocabulary_of(cleaned_references))
+            english_lexicon()
+
+            # Trained offline by train_semantic_space.py; arrays are memory-mapped, not read
+            semantic_space = SemanticSpace.load() if SEMANTIC_WEIGHT > 0 else None
+        semantic_matrix = None
+        if semantic_space is not None:
+            semantic_matrix = np.zeros((len(cleaned_references), semantic_space.dimensions), dtype=np.float32)
+
+        features = {}
+        reference_rows = {}
+        for question_id, model_answer, difficulty, question_type, marks, references, first_row in question_rows:
+            if only is not None and question_id not in only:
+                continue
+            rows = np.arange(first_row, first_row + len(references))
+            reference_rows[question_id] = rows
+            if semantic_space is not None:
+                semantic_matrix[rows] = semantic_space.reference_vectors_for(
+                    question_id, [cleaned_references[row] for row in rows])
+
+            # Concept stems local to this question: union over its references
+            union = sorted(set().union(*(reference_stem_sets[row] for row in rows)))
+            local_ids = {concept_stem: index for index, concept_stem in enumerate(union)}
+            local_rows = [position for position, row in enumerate(rows) for _ in reference_stem_sets[row]]
+            local_cols = [local_ids[concept_stem] for row in rows for concept_stem in reference_stem_sets[row]]
+
+            features[question_id] = QuestionFeatures(
+                question_id=question_id,
+                model_answer=model_answer,
+                difficulty=difficulty,
+                references=references,
+                vectors=matrix[rows],
+                concepts=reference_concept_sets[first_row],
+                concept_ids=local_ids,
+                reference_concepts=sparse.csr_matrix(
+                    (np.ones(len(local_rows)), (local_rows, local_cols)), shape=(len(rows), len(union))
+                ),
+                vectorizer=vectorizer,
+                semantic_space=semantic_space,
+                semantic_vectors=semantic_matrix[rows] if semantic_space is not None else None,
+                calculation=calculation_key(model_answer) if question_type == 'calculation' else None,
+                spell_index=spell_index,
+                concept_weights=[reference_weights[row] for row in rows]
+            )
+            if SENTENCE_ALIGNMENT_MIN_MARKS > 0 and (marks or 0) >= SENTENCE_ALIGNMENT_MIN_MARKS:
+                features[question_id].sentences = sentence_key(
+                    references, lambda sentences: embed_sentences(sentences, vectorizer, spell_index))
+
+        # What-if snapshots are thrown away after one simulation, so they are not logged
+        if only is None:
+            dimension = len(vectorizer.vocabulary_) if self.backend == 'tfidf' else vectorizer.n_features
+            logger.info(f"Scoring model ({self.backend}) built on {len(cleaned_references)} reference answers for "
+                        f"{len(features)} questions ({dimension} features, {len(concept_vocabulary)} concepts"
+                        f"{f', {semantic_space.dimensions}-d semantic space' if semantic_space is not None else ''})")
+        return _CorpusSnapshot(
+            fingerprint=fingerprint,
+            vectorizer=vectorizer,
+            features=features,
+            matrix=matrix,
+            reference_rows=reference_rows,
+            concept_vocabulary=concept_vocabulary,
+            concept_matrix=concept_matrix,
+            semantic_space=semantic_space,
+            semantic_matrix=semantic_matrix,
+            answer_keys=answer_keys,
+            spell_index=spell_index
+        )
+
+def _concept_weights(concepts, weight_of):
+    """Stem -> (weight, word shown) for one reference; the shortest word of each stem is shown"""
+    weights = {}
+    for concept in sorted(concepts, key=lambda word: (len(word), word)):
+        key = stem(concept)
+        if key not in weights:
+            weights[key] = (weight_of(key), concept)
+    return weights
+
+def embed_sentences(sentences, vectorizer, spell_index):
+    """Similarity vectors of sentences, cleaned and spell-normalised like whole answers"""
+    cleans = [clean_text(sentence) for sentence in sentences]
+    if spell_index is not None:
+        cleans = [spell_index.normalize(text) for text in cleans]
+    return vectorizer.transform(cleans)
+
+# Initialize shared scoring model
+scoring_model = ScoringModel()
+
+def intelligent_ai_score(user_answer, model_answer, question_difficulty='medium', question_id=None):
+    """
+    Intelligent AI scoring using NLP techniques to compare student and model answers
+    """
+    # Multiple-choice questions with a key are graded by option letter alone
+    answer_key = scoring_model.get_answer_key(question_id)
+    if answer_key is not None:
+        return grade_choice(user_answer, answer_key)
+
+    features = scoring_model.get_features(question_id, model_answer)
+    return score_answer(user_answer, model_answer, question_difficulty, features)
+
+def score_answer(user_answer, model_answer, question_difficulty='medium', features=None):
+    """
+    Score one answer against precomputed question features, or against the
+    model answer alone when features is None. Never touches the database,
+    so it is safe to call from worker processes.
+    """
+    # Calculation questions are graded on the quantities stated, not the wording
+    if features is not None and features.calculation is not None:
+        return grade_calculation(user_answer, features.calculation)
+
+    # Bound the cost of huge answers by scoring a streamed sample of them
+    user_answer, degraded = bound_answer(user_answer)
+    scoring_mode = 'degraded' if degraded else 'full'
+
+    try:
+        # Clean and normalize text
+        user_clean = clean_text(user_answer)
+
+        if not user_clean or len(user_clean) < 5:
+            return {
+                'score': 0,
+                'feedback': render_feedback([phrases.TOO_SHORT]),
+                'feedback_codes': [phrases.TOO_SHORT],
+                'scoring_mode': scoring_mode
+            }
+
+        # Map misspelled words to the bank's spelling so they still match
+        if features is not None and features.spell_index is not None:
+            user_clean = features.spell_index.normalize(user_clean)
+
+        # Extract key concepts from the student answer
+        user_concepts = extract_key_concepts(user_clean)
+
+        # Use the cached corpus features when the question is in the bank,
+        # otherwise fit on the pair (e.g. sample questions)
+        if features is not None:
+            similarities, coverages = features.compare(user_clean, user_concepts)
+            references = features.references
+        else:
+            model_clean = clean_text(model_answer)
+            similarities = np.array([calculate_text_similarity(user_clean, model_clean)])
+            coverages = np.array([calculate_concept_coverage(user_concepts, extract_key_concepts(model_clean))])
+            references = [model_answer]
+
+        # Long essays are also aligned sentence by sentence
+        alignment = features.align_sentences(user_answer) if features is not None else None
+
+        # Assess answer quality
+        quality_score = assess_answer_quality(user_clean)
+
+        final_score, feedback_codes, components = combine_scores(user_answer, references, similarities, coverages,
+                                                                 quality_score, question_difficulty, features,
+                                                                 stems(user_concepts), alignment)
+        if degraded:
+            feedback_codes.append(phrases.DEGRADED)
+
+        return {
+            'score': final_score,
+            'feedback': render_feedback(feedback_codes),
+            'feedback_codes': feedback_codes,
+            'scoring_mode': scoring_mode,
+            'components': components
+        }
+
+    except Exception as e:
+        logging.error(f"Error in intelligent scoring: {e}")
+        # Fallback to mock scoring
+        result = mock_ai_score(user_answer, model_answer, question_difficulty)
+        result['fallback'] = True  # Random score - must not be cached or reused
+        return result
+
+def combine_scores(user_answer, references, similarities, coverages, quality_score, question_difficulty='medium',
+                   features=None, user_stems=frozenset(), alignment=None):
+    """
+    Final score and feedback from an answer's similarity and concept coverage against
+    each reference and its quality: the best reference wins. Returns (score, feedback codes, components).
+    """
+    # Long essays: similarity is at least how much of each reference's sentences the answer covers
+    if alignment is not None:
+        similarities = np.maximum(similarities, alignment.coverages())
+
+    # Calculate final score (weighted combination) against every reference and keep the best
+    reference_scores = np.floor((similarities * 0.4 + coverages * 0.4 + quality_score * 0.2) * 100)
+    best = int(np.argmax(reference_scores))
+    final_score = int(reference_scores[best])
+    similarity_score = float(similarities[best])
+    concept_coverage = float(coverages[best])
+
+    # Adjust for difficulty
+    if question_difficulty == 'easy' and final_score >= 60:
+        final_score = min(100, final_score + 5)
+    elif question_difficulty == 'hard' and final_score < 80:
+        final_score = max(50, final_score - 5)
+
+    # Generate detailed feedback against the closest reference
+    missing_concepts = features.missing_concepts(best, user_stems) if features is not None else ()
+    feedback_codes = detailed_feedback_codes(user_answer, references[best], final_score,
+                                             similarity_score, concept_coverage, missing_concepts,
+                                             alignment.points(best) if alignment is not None else None)
+
+    if features is not None:
+        reference_weights = features.concept_weights[best] if best < len(features.concept_weights) else {}
+    else:
+        reference_weights = _concept_weights(extract_key_concepts(clean_text(references[best])), lambda key: 0.0)
+    components = scoring_components(similarity_score, concept_coverage, quality_score, reference_weights, user_stems)
+    return max(0, min(100, final_score)), feedback_codes, components
+
+def scoring_components(similarity, coverage, quality, reference_weights, user_stems):
+    """
+    Values stored with a scored answer: its score components against the closest reference
+    and that reference's concepts it matched and missed, most important first
+    """
+    ranked = sorted(reference_weights.items(), key=lambda item: (-item[1][0], item[1][1]))
+    return {
+        'similarity': round(float(similarity), 3),
+        'coverage': round(float(coverage), 3),
+        'quality': round(float(quality), 3),
+        'matched': [word for key, (_, word) in ranked if key in user_stems],
+        'missed': [word for key, (_, word) in ranked if key not in user_stems]
+    }
+
+def vectorize_terms(vectorizer, term_counts):
+    """
+    vectorizer.transform() for one text given as its analyzed terms: {term: count},
+    with terms as the vectorizer's analyzer produces them (unigrams and 'word word' bigrams)
+    """
+    if isinstance(vectorizer, HashingVectorizer):
+        hasher = FeatureHasher(n_features=vectorizer.n_features, input_type='pair',
+                               alternate_sign=vectorizer.alternate_sign, dtype=vectorizer.dtype)
+        return normalize(hasher.transform([term_counts.items()]), norm=vectorizer.norm)
+
+    vocabulary = vectorizer.vocabulary_
+    columns = [vocabulary[term] for term in term_counts if term in vocabulary]
+    counts = [count for term, count in term_counts.items() if term in vocabulary]
+    row = sparse.csr_matrix((np.asarray(counts, dtype=np.float64) * vectorizer.idf_[columns],
+                             ([0] * len(columns), columns)), shape=(1, len(vocabulary)))
+    return normalize(row, norm=vectorizer.norm)
+
+def batch_intelligent_ai_score(items, corpus=None, with_feedback=True):
+    """
+    Score many (question_id, user_answer) pairs in one vectorized pass.
+    Similarity, concept coverage and quality are computed with sparse matrix
+    operations over the whole batch; returns one result dict per item, in order.
+    Pass a corpus snapshot to score without database access (e.g. in worker processes),
+    and with_feedback=False when only the scores are needed (no feedback or components).
+    """
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    if corpus is None:
+        corpus = scoring_model.get_corpus()
+    question_ids = [item[0] for item in items]
+    bounded = [bound_answer(item[1] or '') for item in items]
+    user_answers = [text for text, _ in bounded]
+    degraded = [flag for _, flag in bounded]
+    user_cleans = [clean_text(answer) for answer in user_answers]
+
+    # Items that can go through the vectorized path
+    scorable = []
+    for index, (question_id, user_clean) in enumerate(zip(question_ids, user_cleans)):
+        if corpus is not None and question_id in corpus.answer_keys:
+            results[index] = dict(grade_choice(items[index][1], corpus.answer_keys[question_id]),
+                                  question_id=question_id)
+        elif corpus is not None and question_id in corpus.features and \
+                corpus.features[question_id].calculation is not None:
+            results[index] = dict(grade_calculation(items[index][1], corpus.features[question_id].calculation),
+                                  question_id=question_id)
+        elif corpus is None or question_id not in corpus.reference_rows:
+            results[index] = {'question_id': question_id, 'score': None, 'error': 'Question not found'}
+        elif len(user_clean) < 5:
+            results[index] = {
+                'question_id': question_id,
+                'score': 0,
+                'feedback': render_feedback([phrases.TOO_SHORT]),
+                'feedback_codes': [phrases.TOO_SHORT],
+                'scoring_mode': 'degraded' if degraded[index] else 'full'
+            }
+        else:
+            scorable.append(index)
+
+    if not scorable:
+        return results
+
+    cleans = [user_cleans[index] for index in scorable]
+    if corpus.spell_index is not None:
+        cleans = [corpus.spell_index.normalize(clean) for clean in cleans]
+
+    # One (answer, reference) pair per reference of each answer's question, grouped by answer
+    answer_references = [corpus.reference_rows[question_ids[index]] for index in scorable]
+    pair_counts = np.array([len(rows) for rows in answer_references])
+    pair_answers = np.repeat(np.arange(len(scorable)), pair_counts)
+    pair_references = np.concatenate(answer_references)
+
+    # Similarity: row-wise dot products of L2-normalised TF-IDF vectors
+    user_matrix = corpus.vectorizer.transform(cleans)
+    similarity = np.asarray(user_matrix[pair_answers].multiply(corpus.matrix[pair_references]).sum(axis=1)).ravel()
+    if corpus.semantic_space is not None:
+        user_semantic = corpus.semantic_space.transform(cleans)
+        semantic = np.einsum('ij,ij->i', user_semantic[pair_answers], corpus.semantic_matrix[pair_references])
+        similarity = blend_semantic_similarity(similarity, semantic)
+
+    # Long essays: similarity is at least how much of each reference's sentences the answer covers.
+    # Every answer's sentences are vectorized together, then one similarity product per answer
+    group_starts = np.concatenate(([0], np.cumsum(pair_counts)[:-1]))
+    aligned = [position for position, index in enumerate(scorable)
+               if corpus.features[question_ids[index]].sentences is not None]
+    alignments = {}
+    if aligned:
+        answer_sentences = [split_sentences(user_answers[scorable[position]]) for position in aligned]
+        sentence_vectors = embed_sentences([sentence for sentences in answer_sentences for sentence in sentences],
+                                           corpus.vectorizer, corpus.spell_index).tocsr()
+        offsets = np.cumsum([0] + [len(sentences) for sentences in answer_sentences])
+        for position, start, end in zip(aligned, offsets[:-1], offsets[1:]):
+            key = corpus.features[question_ids[scorable[position]]].sentences
+            alignments[position] = alignment = key.align(sentence_vectors[start:end])
+            pairs = slice(group_starts[position], group_starts[position] + pair_counts[position])
+            similarity[pairs] = np.maximum(similarity[pairs], alignment.coverages())
+
+    # Concept coverage: answers x terms  @  terms x concepts, masked by each reference's concepts
+    coverage, answer_concepts = _batch_concept_coverage(cleans, pair_answers, pair_references, corpus)
+    concept_stems = list(corpus.concept_vocabulary)  # dicts keep insertion (= column) order
+
+    # Quality checks over all answers at once
+    quality = _batch_answer_quality(cleans)[pair_answers]
+
+    pair_scores = np.floor((similarity * 0.4 + coverage * 0.4 + quality * 0.2) * 100).astype(int)
+
+    # Best reference per answer: sort each answer's group by descending score, take the first
+    best = np.lexsort((-pair_scores, pair_answers))[group_starts]
+    final = pair_scores[best]
+
+    # Adjust for difficulty
+    difficulty = np.array([corpus.features[question_ids[index]].difficulty for index in scorable])
+    easy = (difficulty == 'easy') & (final >= 60)
+    hard = (difficulty == 'hard') & (final < 80)
+    final = np.where(easy, np.minimum(100, final + 5), final)
+    final = np.where(hard, np.maximum(50, final - 5), final)
+    final = np.clip(final, 0, 100)
+
+    for position, index in enumerate(scorable):
+        question_id = question_ids[index]
+        pair = best[position]
+        features = corpus.features[question_id]
+        reference = pair - group_starts[position]
+        score = int(final[position])
+        if not with_feedback:
+            results[index] = {'question_id': question_id, 'score': score,
+                              'scoring_mode': 'degraded' if degraded[index] else 'full'}
+            continue
+
+        user_stems = set()
+        if answer_concepts is not None:
+            row = answer_concepts.indices[answer_concepts.indptr[position]:answer_concepts.indptr[position + 1]]
+            user_stems = {concept_stems[column] for column in row}
+        alignment = alignments.get(position)
+        feedback_codes = detailed_feedback_codes(user_answers[index], features.references[reference], score,
+                                                 similarity[pair], coverage[pair],
+                                                 features.missing_concepts(reference, user_stems),
+                                                 alignment.points(reference) if alignment is not None else None)
+        if degraded[index]:
+            feedback_codes.append(phrases.DEGRADED)
+        results[index] = {
+            'question_id': question_id,
+            'score': score,
+            'feedback': render_feedback(feedback_codes),
+            'feedback_codes': feedback_codes,
+            'scoring_mode': 'degraded' if degraded[index] else 'full',
+            'components': scoring_components(similarity[pair], coverage[pair], quality[pair],
+                                             features.concept_weights[reference], user_stems)
+        }
+
+    return results
+
+def _batch_concept_coverage(cleans, pair_answers, pair_references, corpus):
+    """
+    Concept coverage for many (answer, reference) pairs using sparse products instead of nested loops.
+    Also returns the answers x bank concepts matrix of concepts each answer has (None if none has any).
+    """
+    reference_concepts = corpus.concept_matrix[pair_references]
+    concept_counts = reference_concepts.getnnz(axis=1)
+
+    concept_vectorizer = CountVectorizer(token_pattern=r'\b[a-zA-Z]{4,}\b', stop_words=list(CONCEPT_STOP_WORDS),
+                                         binary=True)
+    try:
+        user_terms = concept_vectorizer.fit_transform(cleans)
+    except ValueError:
+        # No answer contains a single concept word
+        return np.where(concept_counts == 0, 0.8, 0.0), None
+
+    relation = corpus.concept_relation(concept_vectorizer.get_feature_names_out())
+    answer_concepts = (user_terms @ relation).tocsr()
+    user_matches = answer_concepts[pair_answers]
+    matched = user_matches.multiply(reference_concepts).getnnz(axis=1)
+    has_concepts = user_terms.getnnz(axis=1)[pair_answers] > 0
+
+    coverage = np.divide(matched, concept_counts, out=np.zeros(len(pair_answers)), where=concept_counts > 0)
+    coverage = np.where(has_concepts, np.minimum(1.0, coverage), 0.0)
+    return np.where(concept_counts == 0, 0.8, coverage), answer_concepts
+
+def _batch_answer_quality(cleans):
+    """assess_answer_quality for many answers: one regex pass per check over the joined batch"""
+    # Cleaned text never contains newlines, so they safely separate answers
+    blob = '\n'.join(cleans)
+    starts = np.cumsum([0] + [len(text) + 1 for text in cleans[:-1]])
+
+    def answers_matching(pattern):
+        positions = [match.start() for match in re.finditer(pattern, blob)]
+        return np.searchsorted(starts, positions, side='right') - 1
+
+    count = len(cleans)
+    word_count = np.bincount(answers_matching(r'\S+'), minlength=count)
+
+    def has_match(pattern):
+        flags = np.zeros(count, dtype=bool)
+        flags[answers_matching(pattern)] = True
+        return flags
+
+    score = np.full(count, 0.5)
+    score += np.where(word_count >= 20, 0.2, np.where(word_count >= 10, 0.1, 0.0))
+    score += np.where(has_match(r'[.!?]'), 0.1, 0.0)
+    score += np.where(has_match('|'.join(STRUCTURE_WORDS)), 0.1, 0.0)
+    score += np.where(has_match('|'.join(CONSTRUCTION_TERMS)), 0.1, 0.0)
+    return np.minimum(1.0, score)
+
+def calculate_text_similarity(text1, text2, backend=None):
+    """Calculate semantic similarity between two texts using TF-IDF (or hashed term vectors)"""
+    try:
+        vectorizer = make_vectorizer(backend)
+        tfidf_matrix = vectorizer.fit_transform([text1, text2])
+        if tfidf_matrix.nnz == 0:
+            raise ValueError('No content words to compare')  # What TF-IDF raises on an empty vocabulary
+        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+        return similarity
+    except:
+        # Fallback to simple word overlap
+        words1 = set(text1.split())
+        words2 = set(text2.split())
+        intersection = words1.intersection(words2)
+        union = words1.union(words2)
+        return len(intersection) / len(union) if union else 0
+
+def extract_key_concepts(text):
+    """Extract key concepts from text using simple NLP techniques"""
+    try:
+        # Simple word-based concept extraction
+        words = re.findall(r'\b[a-zA-Z]{4,}\b', text.lower())
+
+        # Remove common stop words
+        concepts = set()
+        for word in words:
+            if word not in CONCEPT_STOP_WORDS and len(word) > 3:
+                concepts.add(word)
+
+        return concepts
+    except:
+        # Fallback to simple word extraction
+        words = text.split()
+        return set(word.lower() for word in words if len(word) > 3)
+
+def calculate_concept_coverage(user_concepts, model_concepts):
+    """Calculate how well user answer covers model answer concepts"""
+    # Concepts match when they share a stem ("scaffolds" and "scaffolding"); intersecting the
+    # stem sets takes one pass over each side, so long answers no longer cost a substring
+    # scan per pair of concepts
+    model_stems = stems(model_concepts)
+    if not model_stems:
+        return 0.8  # Give benefit of doubt if no model concepts
+
+    if not user_concepts:
+        return 0.0
+
+    return len(model_stems & stems(user_concepts)) / len(model_stems)
+
+def assess_answer_quality(text):
+    """Assess overall quality of the answer"""
+    return quality_score(len(text.split()),
+                         '.' in text or '!' in text or '?' in text,
+                         any(word in text.lower() for word in STRUCTURE_WORDS),
+                         any(term in text.lower() for term in CONSTRUCTION_TERMS))
+
+def quality_score(word_count, has_sentences, has_structure_words, has_terms):
+    """Quality score from the signals assess_answer_quality looks for"""
+    score = 0.5  # Base score
+
+    # Length-based scoring
+    if word_count >= 20:
+        score += 0.2
+    elif word_count >= 10:
+        score += 0.1
+
+    # Structure indicators
+    if has_sentences:
+        score += 0.1  # Has sentences
+
+    if has_structure_words:
+        score += 0.1  # Has structure words
+
+    # Technical indicators for construction topics
+    if has_terms:
+        score += 0.1  # Contains relevant terminology
+
+    return min(1.0, score)
+
+def generate_detailed_feedback(user_answer, model_answer, score, similarity, coverage, missing_concepts=(),
+                               points=None):
+    """Feedback text of detailed_feedback_codes()"""
+    return render_feedback(detailed_feedback_codes(user_answer, model_answer, score, similarity, coverage,
+                                                   missing_concepts, points))
+
+def detailed_feedback_codes(user_answer, model_answer, score, similarity, coverage, missing_concepts=(),
+                            points=None):
+    """
+    Generate detailed feedback based on scoring components, the most important missed
+    concepts and, for sentence-aligned essays, the (sentence, covered) points of the model answer.
+    Returns the feedback as phrase codes (see feedback_phrases).
+    """
+    feedback_codes = []
+
+    if score >= 85:
+        feedback_codes.append(phrases.EXCELLENT)
+    elif score >= 70:
+        feedback_codes.append(phrases.GOOD)
+    elif score >= 55:
+        feedback_codes.append(phrases.FAIR)
+    else:
+        feedback_codes.append(phrases.NEEDS_IMPROVEMENT)
+
+    # Similarity feedback
+    if similarity < 0.3:
+        feedback_codes.append(phrases.LOW_SIMILARITY)
+    elif similarity < 0.6:
+        feedback_codes.append(phrases.PARTIAL_SIMILARITY)
+
+    # Coverage feedback
+    if coverage < 0.4:
+        feedback_codes.append(phrases.LOW_COVERAGE)
+    elif coverage < 0.7:
+        feedback_codes.append(phrases.PARTIAL_COVERAGE)
+
+    # Missed concepts, most distinctive in the question bank first
+    if missing_concepts and score < 85:
+        feedback_codes.append([phrases.KEY_CONCEPTS, ', '.join(missing_concepts)])
+
+    # Points of the model answer the essay did not address
+    if points:
+        missed = [sentence for sentence, covered in points if not covered]
+        if missed:
+            feedback_codes.append([phrases.POINTS_ADDRESSED, len(points) - len(missed), len(points),
+                                   textwrap.shorten(missed[0], 100, placeholder='...')])
+        else:
+            feedback_codes.append(phrases.ALL_POINTS_ADDRESSED)
+
+    # Constructive suggestions
+    model_length = len(model_answer.split())
+    user_length = len(user_answer.split())
+
+    if user_length < model_length * 0.3:
+        feedback_codes.append(phrases.TOO_BRIEF)
+
+    return feedback_codes
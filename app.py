@@ -24,11 +24,15 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
 }
 
+# Answer scoring - ASYNC_SCORING stores submissions as pending and scores them in a local pool
+app.config["ASYNC_SCORING"] = os.environ.get("ASYNC_SCORING", "false").lower() == "true"
+app.config["SCORING_WORKERS"] = int(os.environ.get("SCORING_WORKERS", 2))
+
 # Initialize database
 db = SQLAlchemy(app, model_class=Base)
 
 # Create tables
 with app.app_context():
     import models  # noqa: F401
-    db.create_all()
+    db.create_all()  # new tables only; columns added to existing tables: python migrate_database.py
     logging.info("Database tables created")
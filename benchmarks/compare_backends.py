@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the 'tfidf' and 'hashing' scoring backends on the
+existing question bank: model build time, per-answer latency, memory and
+how closely the two backends agree on scores.
+
+Each backend runs in its own process so RSS figures are not mixed up.
+
+Usage: python benchmarks/compare_backends.py [--answers 2000] [--seed 42]
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BACKENDS = ['tfidf', 'hashing']
+
+def build_answers(features, count, seed):
+    """Synthetic student answers: subsets of a model answer's words mixed with words from other questions"""
+    rng = random.Random(seed)
+    question_ids = sorted(features)
+    bank_words = [word for qid in question_ids for word in features[qid].model_answer.split()]
+    answers = []
+    for _ in range(count):
+        question_id = rng.choice(question_ids)
+        words = features[question_id].model_answer.split()
+        kept = [word for word in words if rng.random() < rng.uniform(0.2, 1.0)]
+        noise = [rng.choice(bank_words) for _ in range(rng.randint(0, len(words)))]
+        answer = kept + noise
+        rng.shuffle(answer)
+        answers.append((question_id, ' '.join(answer)))
+    return answers
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_backend(backend, count, seed):
+    """Worker mode: build the model with one backend, score the synthetic answers, print JSON"""
+    os.environ['SCORING_BACKEND'] = backend
+    from app import app
+    from answer_scorer import ScoringModel, score_answer
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with app.app_context():
+        model = ScoringModel(backend=backend)
+        start = time.perf_counter()
+        corpus = model.get_corpus()
+        build_seconds = time.perf_counter() - start
+
+    features = corpus.features
+    answers = build_answers(features, count, seed)
+
+    latencies = []
+    scores = []
+    for question_id, answer in answers:
+        question = features[question_id]
+        start = time.perf_counter()
+        result = score_answer(answer, question.model_answer, question.difficulty, question)
+        latencies.append((time.perf_counter() - start) * 1000)
+        scores.append(result['score'])
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'backend': backend,
+        'questions': len(features),
+        'build_ms': build_seconds * 1000,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'vectorizer_bytes': len(pickle.dumps(corpus.vectorizer)),
+        'matrix_bytes': corpus.matrix.data.nbytes + corpus.matrix.indices.nbytes + corpus.matrix.indptr.nbytes,
+        'peak_rss_kb': rss_after,
+        'scoring_rss_kb': rss_after - rss_before,
+        'scores': scores
+    }))
+
+def agreement(scores_a, scores_b):
+    """Mean absolute difference, share within 5 points and rank correlation of two score lists"""
+    import numpy as np
+    a = np.array(scores_a, dtype=float)
+    b = np.array(scores_b, dtype=float)
+    ranks_a = a.argsort().argsort()
+    ranks_b = b.argsort().argsort()
+    return {
+        'mean_abs_diff': float(np.abs(a - b).mean()),
+        'within_5_points': float((np.abs(a - b) <= 5).mean() * 100),
+        'pearson': float(np.corrcoef(a, b)[0, 1]),
+        'spearman': float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--answers', type=int, default=2000, help='synthetic answers to score')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--worker', choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args.worker, args.answers, args.seed)
+        return
+
+    results = {}
+    for backend in BACKENDS:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', backend,
+             '--answers', str(args.answers), '--seed', str(args.seed)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        results[backend] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'backend':<10}{'build ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'vectorizer KB':>15}{'matrix KB':>11}{'peak RSS MB':>13}")
+    for backend in BACKENDS:
+        r = results[backend]
+        print(f"{backend:<10}{r['build_ms']:>10.1f}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+              f"{r['vectorizer_bytes'] / 1024:>15.1f}{r['matrix_bytes'] / 1024:>11.1f}"
+              f"{r['peak_rss_kb'] / 1024:>13.1f}")
+
+    stats = agreement(results['tfidf']['scores'], results['hashing']['scores'])
+    print(f"\nScore agreement over {args.answers} answers on {results['tfidf']['questions']} questions:")
+    print(f"  mean |tfidf - hashing|: {stats['mean_abs_diff']:.2f} points")
+    print(f"  within 5 points:        {stats['within_5_points']:.1f}%")
+    print(f"  Pearson / Spearman:     {stats['pearson']:.3f} / {stats['spearman']:.3f}")
+
+if __name__ == '__main__':
+    main()
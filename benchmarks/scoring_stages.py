@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the scoring pipeline stages - clean_text,
+extract_key_concepts, calculate_concept_coverage, generate_detailed_feedback
+and intelligent_ai_score - on synthetic answers of 5 to 5,000 words built
+from the real model answers.
+
+Reports p50/p95/p99 latency (fastest of several passes), throughput and
+allocations (tracemalloc, in a separate pass so it does not distort timings)
+per stage and answer size, and compares them with the baselines in
+benchmarks/baselines.json, exiting non-zero on regressions. Latencies are
+compared relative to a fixed calibration workload timed in the same process,
+so baselines recorded on a faster or slower machine still apply.
+
+Usage:
+    python benchmarks/scoring_stages.py                      # report and check against baselines
+    python benchmarks/scoring_stages.py --update-baselines   # record new baselines
+    python benchmarks/scoring_stages.py --threshold 0.5      # allowed slowdown before failing (50%)
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINES_PATH = os.path.join(ROOT, 'benchmarks', 'baselines.json')
+
+ANSWER_WORDS = [5, 50, 500, 5000]
+
+# Enough calls per stage for stable percentiles without making big answers take minutes
+TIME_BUDGET_WORDS = 200000
+MIN_RUNS = 10
+MAX_RUNS = 500
+
+# Timing passes per stage; the fastest is kept, as timeit does, to filter out machine noise
+REPEATS = 3
+
+# Latencies below this are mostly timer noise; they are never reported as regressions
+NOISE_FLOOR_MS = 0.05
+
+# Calls of the calibration workload per timing pass
+CALIBRATION_RUNS = 20
+
+def build_answers(questions, words, count, rng):
+    """Answers of an exact word count: model answer words with noise from the rest of the bank"""
+    bank_words = [word for question in questions for word in question.model_answer.split()]
+    answers = []
+    for _ in range(count):
+        question = rng.choice(questions)
+        own_words = question.model_answer.split()
+        answer = [rng.choice(own_words) if rng.random() < 0.6 else rng.choice(bank_words) for _ in range(words)]
+        if rng.random() < 0.5:
+            answer[-1] += '.'
+        answers.append((question, ' '.join(answer)))
+    return answers
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def stage_calls(answers):
+    """One zero-argument call per answer for each stage, with inputs prepared outside the timing"""
+    from answer_scorer import (calculate_concept_coverage, clean_text, extract_key_concepts,
+                               generate_detailed_feedback, intelligent_ai_score)
+
+    prepared = []
+    for question, answer in answers:
+        cleaned = clean_text(answer)
+        prepared.append((question, answer, cleaned, extract_key_concepts(cleaned),
+                         extract_key_concepts(clean_text(question.model_answer))))
+
+    return {
+        'clean_text': [lambda a=answer: clean_text(a) for _, answer, _, _, _ in prepared],
+        'extract_key_concepts': [lambda c=cleaned: extract_key_concepts(c) for _, _, cleaned, _, _ in prepared],
+        'calculate_concept_coverage': [lambda u=user, m=model: calculate_concept_coverage(u, m)
+                                       for _, _, _, user, model in prepared],
+        'generate_detailed_feedback': [lambda a=answer, q=question: generate_detailed_feedback(a, q.model_answer,
+                                                                                               65, 0.4, 0.5)
+                                       for question, answer, _, _, _ in prepared],
+        'intelligent_ai_score': [lambda a=answer, q=question: intelligent_ai_score(a, q.model_answer, q.difficulty,
+                                                                                   question_id=q.id)
+                                 for question, answer, _, _, _ in prepared],
+    }
+
+def time_calls(calls):
+    """One timing pass with the garbage collector paused: (latencies in ms, total seconds)"""
+    latencies = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for call in calls:
+            call_start = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - call_start) * 1000)
+        elapsed = time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return latencies, elapsed
+
+def calibrate(repeats=REPEATS):
+    """
+    Milliseconds per call of a fixed pure-Python workload (regex, string and dict work, like the
+    scoring stages do), fastest of several passes: the machine's speed, to normalise latencies by
+    """
+    text = ' '.join(f'Step {index}: erect the Scaffold, check bricks; mortar mix!' for index in range(500))
+
+    def workload():
+        counts = {}
+        for word in re.findall(r'\b[a-z]{4,}\b', re.sub(r'[^\w\s]', '', text.lower())):
+            counts[word] = counts.get(word, 0) + 1
+        return sorted(counts, key=counts.get)
+
+    workload()  # warm-up (regex compilation)
+    latencies, _ = min((time_calls([workload] * CALIBRATION_RUNS) for _ in range(repeats)),
+                       key=lambda timing: percentile(timing[0], 0.50))
+    return percentile(latencies, 0.50)
+
+def measure(calls, repeats=REPEATS):
+    """Latency percentiles, throughput and per-call allocations for a list of calls"""
+    calls[0]()  # warm-up (lazy imports, caches)
+
+    latencies, elapsed = min((time_calls(calls) for _ in range(repeats)),
+                             key=lambda timing: percentile(timing[0], 0.50))
+
+    # Allocation pass on a sample of the calls
+    sample = calls[:min(len(calls), 20)]
+    allocated = []
+    peaks = []
+    tracemalloc.start()
+    for call in sample:
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        after, peak = tracemalloc.get_traced_memory()
+        allocated.append(max(0, after - before))
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    return {
+        'runs': len(calls),
+        'p50_ms': round(percentile(latencies, 0.50), 4),
+        'p95_ms': round(percentile(latencies, 0.95), 4),
+        'p99_ms': round(percentile(latencies, 0.99), 4),
+        'ops_per_s': round(len(calls) / elapsed, 1),
+        'peak_kb': round(percentile(peaks, 0.50) / 1024, 1),
+        'retained_kb': round(percentile(allocated, 0.50) / 1024, 1)
+    }
+
+def run_suite(seed, repeats=REPEATS):
+    from app import app
+    from models import Question
+    from answer_scorer import scoring_model
+
+    rng = random.Random(seed)
+    results = {}
+    with app.app_context():
+        questions = Question.query.order_by(Question.id).all()
+        if not questions:
+            sys.exit('The question bank is empty; nothing to benchmark against')
+        scoring_model.get_corpus()  # fit once outside the measurements
+
+        for words in ANSWER_WORDS:
+            runs = max(MIN_RUNS, min(MAX_RUNS, TIME_BUDGET_WORDS // words))
+            answers = build_answers(questions, words, runs, rng)
+            for stage, calls in stage_calls(answers).items():
+                results[f'{stage}/{words}'] = measure(calls, repeats)
+    return results
+
+def relative_change(result, baseline, speed):
+    """Change of a p50 latency against its baseline, after scaling the baseline to this machine's speed"""
+    return result['p50_ms'] / (baseline['p50_ms'] * speed) - 1
+
+def compare(results, baselines, threshold, speed):
+    """
+    Regressions past the threshold: p50 latency (relative to the calibration workload, see relative_change)
+    or peak allocation grown by more than threshold. Allocations do not depend on the machine's speed,
+    so they are checked even when speed is None; latencies are not.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        if (speed is not None and result['p50_ms'] > NOISE_FLOOR_MS
+                and relative_change(result, baseline, speed) > threshold):
+            regressions.append(f"{key}: p50 {baseline['p50_ms'] * speed:.3f} -> {result['p50_ms']:.3f} ms "
+                               f"(baseline scaled to this machine)")
+        if result['peak_kb'] > 1 and result['peak_kb'] > baseline['peak_kb'] * (1 + threshold):
+            regressions.append(f"{key}: peak allocation {baseline['peak_kb']:.1f} -> {result['peak_kb']:.1f} KB")
+    return regressions
+
+def print_report(results, baselines, speed):
+    print(f"{'stage / words':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}"
+          f"{'peak KB':>10}{'kept KB':>9}{'vs base':>9}")
+    for key, r in results.items():
+        baseline = baselines.get(key)
+        change = (f"{relative_change(r, baseline, speed) * 100:+.0f}%"
+                  if baseline and baseline['p50_ms'] and speed else '-')
+        print(f"{key:<34}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['ops_per_s']:>11.1f}"
+              f"{r['peak_kb']:>10.1f}{r['retained_kb']:>9.1f}{change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scoring pipeline stages')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='timing passes per stage (fastest is kept)')
+    parser.add_argument('--threshold', type=float, default=0.5, help='allowed p50/allocation growth (0.5 = 50%%)')
+    parser.add_argument('--update-baselines', action='store_true', help='write results to baselines.json')
+    parser.add_argument('--json', action='store_true', help='print raw results as JSON')
+    args = parser.parse_args()
+
+    calibration_ms = calibrate(args.repeats)
+    results = run_suite(args.seed, args.repeats)
+
+    baselines = {}
+    baseline_calibration_ms = None
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            recorded = json.load(f)
+        baselines = recorded.get('results', {})
+        baseline_calibration_ms = recorded.get('calibration_ms')
+
+    # How much slower this machine is than the one the baselines were recorded on
+    speed = calibration_ms / baseline_calibration_ms if baseline_calibration_ms else None
+
+    if args.json:
+        print(json.dumps({'calibration_ms': round(calibration_ms, 4), 'results': results}, indent=2))
+    else:
+        print(f"Calibration workload: {calibration_ms:.3f} ms"
+              f"{f' ({speed:.2f}x the baseline machine)' if speed else ''}\n")
+        print_report(results, baselines, speed)
+
+    if args.update_baselines:
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({
+                'recorded': time.strftime('%Y-%m-%d'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'seed': args.seed,
+                'calibration_ms': round(calibration_ms, 4),
+                'results': results
+            }, f, indent=2)
+            f.write('\n')
+        print(f"\nBaselines written to {os.path.relpath(BASELINES_PATH, ROOT)}")
+        return
+
+    if not baselines:
+        print("\nNo baselines recorded yet; run with --update-baselines")
+        return
+
+    regressions = compare(results, baselines, args.threshold, speed)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold * 100:.0f}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+
+    if speed is None:
+        # Latencies cannot be checked at all: fail rather than pass without checking them
+        sys.exit("\nBaselines have no calibration measurement, so latencies were not checked; "
+                 "re-record them with --update-baselines")
+    if regressions:
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold * 100:.0f}% of the baselines")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Index answers stored before the near-duplicate index existed (see
+similarity_index.py). New answers are indexed as they are submitted, so this
+only needs to run once after upgrading; it is safe to re-run.
+
+Usage: python build_similarity_index.py [--batch-size 1000]
+"""
+import argparse
+from app import app
+from similarity_index import similarity_index
+
+def main():
+    parser = argparse.ArgumentParser(description='Index existing answers for near-duplicate detection')
+    parser.add_argument('--batch-size', type=int, default=1000, help='answers indexed per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        added = similarity_index.backfill(batch_size=args.batch_size)
+    print(f"Indexed {added} answers")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Offline bulk grading: score a JSONL or CSV file of answers with the same
+logic as the web app, without going through Flask requests.
+
+Input records need 'question_id' and 'answer' fields; 'id' and 'user_id' are
+optional and copied to the output. Records are read lazily and scored in
+chunks by a process pool with a bounded number of chunks in flight, so memory
+stays flat however large the file is. Results are written in input order.
+
+After every chunk the output is flushed and a checkpoint (records done and
+output size) is saved next to the output file; --resume continues from it.
+With --write-db, how many records are stored is also kept in the database,
+committed with the answers, so resuming never stores a chunk twice.
+
+Usage:
+    python bulk_grade.py answers.jsonl -o scores.jsonl [--workers 4] [--chunk-size 500]
+    python bulk_grade.py answers.csv -o scores.csv --resume
+    python bulk_grade.py answers.jsonl -o scores.jsonl --write-db [--user-id 3]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from scoring_constants import CORRECT_THRESHOLD
+
+OUTPUT_FIELDS = ['record', 'id', 'question_id', 'user_id', 'score', 'scoring_mode', 'feedback', 'error']
+
+# Corpus snapshot shipped once to each worker process by the pool initializer
+_worker_corpus = None
+
+def _init_worker(corpus):
+    """Pool initializer: keep the question bank's scoring features in the worker"""
+    global _worker_corpus
+    _worker_corpus = corpus
+
+def _score_chunk(items, corpus=None):
+    """Score (question_id, answer) pairs in a worker process (or inline when corpus is given)"""
+    from answer_scorer import batch_intelligent_ai_score
+    return batch_intelligent_ai_score(items, corpus or _worker_corpus)
+
+def detect_format(path, requested=None):
+    """'jsonl' or 'csv', from --format or the file extension"""
+    if requested:
+        return requested
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+def read_records(path, file_format):
+    """Yield input records one at a time as dicts"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield {'_error': f'Invalid JSON: {e}'}
+
+def parse_record(record, default_user_id=None):
+    """Validate one input record; returns (question_id, answer, user_id, error)"""
+    if '_error' in record:
+        return None, None, None, record['_error']
+    answer = record.get('answer', record.get('user_answer'))
+    if not answer or not str(answer).strip():
+        return None, None, None, 'Missing answer'
+    try:
+        question_id = int(record.get('question_id'))
+    except (TypeError, ValueError):
+        return None, None, None, 'Missing or invalid question_id'
+    user_id = record.get('user_id') or default_user_id
+    try:
+        user_id = int(user_id) if user_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return None, None, None, 'Invalid user_id'
+    return question_id, str(answer), user_id, None
+
+def chunked(iterable, size):
+    """Yield lists of up to size items without materializing the iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class Checkpoint:
+    """Progress file recording how many input records have been fully written"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, input_path, records, output_bytes):
+        """Atomically replace the checkpoint"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'input': os.path.abspath(input_path), 'records': records,
+                       'output_bytes': output_bytes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class ResultWriter:
+    """Appends result rows to a JSONL or CSV file"""
+
+    def __init__(self, path, file_format, resume_bytes=None):
+        self.format = file_format
+        if resume_bytes is not None and os.path.exists(path):
+            # Drop anything written after the last checkpoint
+            self.file = open(path, 'r+', newline='', encoding='utf-8')
+            self.file.truncate(resume_bytes)
+            self.file.seek(resume_bytes)
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+        if self.format == 'csv':
+            self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_FIELDS)
+            if self.file.tell() == 0:
+                self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + '\n')
+
+    def flush(self):
+        """Flush to disk and return the file size"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class DatabaseWriter:
+    """Inserts scored answers and updates student statistics, one transaction per chunk"""
+
+    def __init__(self, db, answer_model, user_model, progress_model, similarity_index, input_path, resume=False):
+        self.db = db
+        self.Answer = answer_model
+        self.User = user_model
+        self.similarity_index = similarity_index
+        self.known_users = {user_id for (user_id,) in db.session.query(user_model.id)}
+
+        self.progress = db.session.get(progress_model, os.path.abspath(input_path))
+        if self.progress is None:
+            self.progress = progress_model(input_path=os.path.abspath(input_path), records=0)
+            db.session.add(self.progress)
+        elif not resume:
+            self.progress.records = 0  # a fresh run stores every record again
+        db.session.commit()
+
+    @property
+    def stored_records(self):
+        """Input records whose answers are already in the database"""
+        return self.progress.records
+
+    def write(self, rows, records):
+        """
+        Insert a chunk of result rows and record that the first records input records are stored,
+        in one transaction; returns the number of answers inserted
+        """
+        answers = []
+        user_totals = {}
+        for row in rows:
+            if row['score'] is None or row['record'] <= self.progress.records:
+                continue  # not scored, or stored by the run being resumed
+            if row['user_id'] is None:
+                row['error'] = 'No user_id to store the answer under'
+                continue
+            if row['user_id'] not in self.known_users:
+                row['error'] = f"User #{row['user_id']} not found"
+                continue
+            answers.append({
+                'user_id': str(row['user_id']),
+                'question_id': row['question_id'],
+                'user_answer': row.pop('_answer'),
+                'score': row['score'],
+                **self.Answer.feedback_values({'feedback': row['feedback'],
+                                               'feedback_codes': row.pop('_feedback_codes', None)}),
+                'status': 'scored',
+                'scoring_mode': row['scoring_mode'],
+                **self.Answer.component_values(row.pop('_components', None))
+            })
+            totals = user_totals.setdefault(row['user_id'], [0, 0, 0])
+            totals[0] += 1
+            totals[1] += row['score']
+            totals[2] += int(row['score'] >= CORRECT_THRESHOLD)
+
+        if answers:
+            inserted = self.db.session.execute(
+                self.db.insert(self.Answer).returning(self.Answer.id, sort_by_parameter_order=True), answers
+            ).scalars().all()
+            self.similarity_index.add_many([(answer_id, answer['question_id'], answer['user_answer'])
+                                            for answer_id, answer in zip(inserted, answers)])
+        for user_id, (attempted, score, correct) in user_totals.items():
+            self.db.session.execute(
+                self.db.update(self.User).where(self.User.id == user_id).values(
+                    questions_attempted=self.User.questions_attempted + attempted,
+                    total_score=self.User.total_score + score,
+                    questions_correct=self.User.questions_correct + correct
+                )
+            )
+        self.progress.records = max(self.progress.records, records)
+        self.db.session.commit()
+        return len(answers)
+
+    def finish(self):
+        """Forget the progress of a completed run"""
+        self.db.session.delete(self.progress)
+        self.db.session.commit()
+
+def score_chunks(chunks, corpus, workers, max_in_flight):
+    """Yield (chunk, results) in input order with at most max_in_flight chunks queued in the pool"""
+    def scorable(chunk):
+        return [(question_id, answer) for question_id, answer, error, _ in chunk if error is None]
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, _score_chunk(scorable(chunk), corpus)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(corpus,)) as pool:
+        window = deque()
+        for chunk in chunks:
+            window.append((chunk, pool.submit(_score_chunk, scorable(chunk))))
+            if len(window) >= max_in_flight:
+                done_chunk, future = window.popleft()
+                yield done_chunk, future.result()
+        while window:
+            done_chunk, future = window.popleft()
+            yield done_chunk, future.result()
+
+def bulk_grade(args):
+    from app import app
+    from models import Answer, BulkGradeProgress, User, db
+    from answer_scorer import scoring_model
+    from similarity_index import similarity_index
+
+    input_format = detect_format(args.input, args.format)
+    output_format = detect_format(args.output, args.output_format)
+    checkpoint = Checkpoint(args.checkpoint or args.output + '.checkpoint')
+
+    skip = 0
+    resume_bytes = None
+    if args.resume:
+        state = checkpoint.load()
+        if state is None:
+            print("No checkpoint found; starting from the beginning")
+        elif state['input'] != os.path.abspath(args.input):
+            sys.exit(f"Checkpoint belongs to {state['input']}, not {args.input}")
+        else:
+            skip = state['records']
+            resume_bytes = state['output_bytes']
+            print(f"Resuming after {skip} records")
+
+    with app.app_context():
+        corpus = scoring_model.get_corpus()
+        if corpus is None or not corpus.features:
+            sys.exit("The question bank has no questions to grade against")
+        db_writer = DatabaseWriter(db, Answer, User, BulkGradeProgress, similarity_index, args.input,
+                                   resume=args.resume) if args.write_db else None
+        if db_writer and args.user_id is not None and args.user_id not in db_writer.known_users:
+            sys.exit(f"User #{args.user_id} not found")
+        if db_writer and db_writer.stored_records > skip:
+            print(f"Answers of the first {db_writer.stored_records} records are already stored; "
+                  f"they are not stored again")
+
+        def parsed_records():
+            for number, record in enumerate(islice(read_records(args.input, input_format), skip, None), skip + 1):
+                question_id, answer, user_id, error = parse_record(record, args.user_id)
+                if error is None and question_id not in corpus.features:
+                    error = 'Question not found'
+                yield question_id, answer, error, (number, record.get('id'), user_id)
+
+        writer = ResultWriter(args.output, output_format, resume_bytes)
+        processed = skip
+        scored = stored = 0
+        start = time.perf_counter()
+        try:
+            chunks = chunked(parsed_records(), args.chunk_size)
+            for chunk, results in score_chunks(chunks, corpus, args.workers, args.workers * 2):
+                results = iter(results)
+                rows = []
+                for question_id, answer, error, (number, record_id, user_id) in chunk:
+                    row = {'record': number, 'id': record_id, 'question_id': question_id, 'user_id': user_id,
+                           'score': None, 'scoring_mode': None, 'feedback': None, 'error': error}
+                    if error is None:
+                        result = next(results)
+                        row['score'] = result['score']
+                        row['feedback'] = result.get('feedback')
+                        row['_feedback_codes'] = result.get('feedback_codes')
+                        row['_components'] = result.get('components')
+                        row['scoring_mode'] = result.get('scoring_mode')
+                        row['error'] = result.get('error')
+                        row['_answer'] = answer
+                    rows.append(row)
+
+                processed += len(chunk)
+                if db_writer:
+                    stored += db_writer.write(rows, processed)
+                for row in rows:
+                    row.pop('_answer', None)
+                    row.pop('_feedback_codes', None)
+                    row.pop('_components', None)
+                    writer.write(row)
+                    scored += row['score'] is not None
+
+                checkpoint.save(args.input, processed, writer.flush())
+                if args.progress:
+                    rate = (processed - skip) / max(time.perf_counter() - start, 1e-9)
+                    print(f"{processed} records ({rate:.0f}/s)", file=sys.stderr)
+        finally:
+            writer.close()
+
+        if db_writer:
+            db_writer.finish()
+
+    checkpoint.clear()
+    elapsed = time.perf_counter() - start
+    print(f"Scored {scored} of {processed - skip} records in {elapsed:.1f}s -> {args.output}")
+    if db_writer:
+        print(f"Stored {stored} answers in the database")
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a JSONL or CSV file of answers offline')
+    parser.add_argument('input', help='JSONL or CSV file with question_id and answer fields')
+    parser.add_argument('-o', '--output', required=True, help='where to write results (JSONL or CSV)')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from extension)')
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'], help='output format (default: from extension)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help='scoring processes (1 scores inline)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='answers per worker task and per transaction')
+    parser.add_argument('--checkpoint', help='checkpoint file (default: OUTPUT.checkpoint)')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint')
+    parser.add_argument('--write-db', action='store_true', help='also store scored answers in the answers table')
+    parser.add_argument('--user-id', type=int, help='user for records without a user_id (with --write-db)')
+    parser.add_argument('--progress', action='store_true', help='report progress after every chunk')
+    args = parser.parse_args()
+
+    if args.chunk_size < 1 or args.workers < 1:
+        parser.error('--chunk-size and --workers must be at least 1')
+    bulk_grade(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Calculation Grader Module
+Grades answers to calculation questions by the quantities they state rather
+than by text overlap: numbers and units are extracted from the student and
+model answers, converted to base units and compared within a tolerance
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+import feedback_phrases as phrases
+from feedback_phrases import render_feedback
+
+# Relative difference at which a student's value still matches the model answer's (0.02 = 2%)
+CALCULATION_TOLERANCE = float(os.environ.get('CALCULATION_TOLERANCE', 0.02))
+
+# Share of the score for the final result; the rest is for the intermediate values of the working
+RESULT_WEIGHT = 0.7
+
+# Distinct values an answer may state beyond the model answer's before its score is scaled down
+EXTRA_VALUES_ALLOWED = 5
+
+# Unit spelling -> (dimension, factor to the dimension's base unit)
+UNITS = {
+    'mm': ('length', 0.001), 'cm': ('length', 0.01), 'm': ('length', 1.0), 'km': ('length', 1000.0),
+    'metre': ('length', 1.0), 'metres': ('length', 1.0), 'meter': ('length', 1.0), 'meters': ('length', 1.0),
+    'mm²': ('area', 1e-6), 'mm2': ('area', 1e-6), 'cm²': ('area', 1e-4), 'cm2': ('area', 1e-4),
+    'm²': ('area', 1.0), 'm2': ('area', 1.0), 'ha': ('area', 1e4),
+    'mm³': ('volume', 1e-9), 'mm3': ('volume', 1e-9), 'cm³': ('volume', 1e-6), 'cm3': ('volume', 1e-6),
+    'm³': ('volume', 1.0), 'm3': ('volume', 1.0), 'l': ('volume', 0.001), 'ml': ('volume', 1e-6),
+    'litre': ('volume', 0.001), 'litres': ('volume', 0.001), 'liter': ('volume', 0.001), 'liters': ('volume', 0.001),
+    'g': ('mass', 0.001), 'kg': ('mass', 1.0), 't': ('mass', 1000.0),
+    'tonne': ('mass', 1000.0), 'tonnes': ('mass', 1000.0), 'ton': ('mass', 1000.0), 'tons': ('mass', 1000.0),
+    'n': ('force', 1.0), 'kn': ('force', 1000.0),
+    'pa': ('pressure', 1.0), 'kpa': ('pressure', 1e3), 'mpa': ('pressure', 1e6),
+    'n/mm²': ('pressure', 1e6), 'n/mm2': ('pressure', 1e6), 'kn/m²': ('pressure', 1e3), 'kn/m2': ('pressure', 1e3),
+    'kg/m³': ('density', 1.0), 'kg/m3': ('density', 1.0),
+    '%': ('percent', 1.0),
+    'bag': ('bags', 1.0), 'bags': ('bags', 1.0),
+    'brick': ('bricks', 1.0), 'bricks': ('bricks', 1.0),
+    'block': ('blocks', 1.0), 'blocks': ('blocks', 1.0),
+}
+
+# Written-out units rewritten to their symbols before extraction
+UNIT_PHRASES = [
+    (re.compile(r'\b(?:square|sq\.?)\s*(?:m|metres?|meters?)\b', re.IGNORECASE), 'm²'),
+    (re.compile(r'\b(?:cubic|cu\.?)\s*(?:m|metres?|meters?)\b', re.IGNORECASE), 'm³'),
+]
+
+# A number (thousands separators allowed) optionally followed by a unit
+QUANTITY_PATTERN = re.compile(
+    r'(?<![\w.])(-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)'
+    r'(?:\s?([a-zA-Z]+(?:/[a-zA-Z]+)?[²³23]?|%)(?![\w²³]))?'
+)
+
+# Step labels and list markers, whose numbers are not quantities
+NUMBERING_PATTERN = re.compile(r'(?i)\bstep\s+\d+|^\s*\d+[.)](?=\s)', re.MULTILINE)
+
+@dataclass(frozen=True)
+class Quantity:
+    """A number as written, with its unit's dimension and value in base units when it has a known unit"""
+    value: float
+    unit: Optional[str]
+    dimension: Optional[str]
+    base_value: float
+
+    def __str__(self):
+        number = f'{self.value:,.10g}'
+        return f'{number} {self.unit}' if self.unit else number
+
+@dataclass
+class CalculationKey:
+    """Quantities of a model answer: the final result and the intermediate values of the working"""
+    results: List[Quantity]
+    working: List[Quantity]
+
+def extract_quantities(text):
+    """Every quantity stated in a text, in order"""
+    for pattern, symbol in UNIT_PHRASES:
+        text = pattern.sub(symbol, text)
+    text = NUMBERING_PATTERN.sub(' ', text)
+
+    quantities = []
+    for number, unit in QUANTITY_PATTERN.findall(text):
+        value = float(number.replace(',', ''))
+        unit_info = UNITS.get(unit.lower()) if unit else None
+        if unit_info is None:
+            quantities.append(Quantity(value, None, None, value))
+        else:
+            dimension, factor = unit_info
+            quantities.append(Quantity(value, unit, dimension, value * factor))
+    return quantities
+
+def final_result(text):
+    """
+    The last line of a text that states a quantity and the quantities it gives as the
+    result: whatever follows its last '=', or the whole line. (None, []) without any.
+    """
+    lines = [line for line in (text or '').splitlines() if extract_quantities(line)]
+    if not lines:
+        return None, []
+    return lines[-1], extract_quantities(lines[-1].rsplit('=', 1)[-1])
+
+def calculation_key(model_answer):
+    """
+    Quantities to grade a calculation against, or None when the model answer does
+    not state a result (then the question is scored as text)
+    """
+    result_line, results = final_result(model_answer)
+    if not results or ('=' not in result_line and not any(quantity.unit for quantity in results)):
+        return None
+
+    # One working value per number, keeping the occurrence that states a unit
+    result_values = {quantity.value for quantity in results}
+    working = {}
+    for quantity in extract_quantities(model_answer):
+        if quantity.value in result_values:
+            continue
+        if quantity.value not in working or (quantity.unit and not working[quantity.value].unit):
+            working[quantity.value] = quantity
+    return CalculationKey(results=results, working=list(working.values()))
+
+def matches(expected, given, tolerance):
+    """Whether a student's quantity states the expected one, converting units of the same dimension"""
+    if expected.dimension is not None and given.dimension is not None:
+        if expected.dimension != given.dimension:
+            return False
+        target, value = expected.base_value, given.base_value
+    else:
+        target, value = expected.value, given.value  # unit left out on one side: compare as written
+    return abs(value - target) <= tolerance * max(abs(target), 1e-9)
+
+def _distinct(quantities):
+    return len({(quantity.dimension, quantity.base_value) for quantity in quantities})
+
+def grade_calculation(user_answer, key, tolerance=None):
+    """
+    Score a calculation answer by the share of the model answer's result and working it
+    reproduces. The result must be the student's own final result (see final_result), and
+    answers stating many more distinct values than the model answer are scaled down, so
+    listing candidates does not earn credit.
+    """
+    tolerance = CALCULATION_TOLERANCE if tolerance is None else tolerance
+    given = extract_quantities(user_answer or '')
+    if not given:
+        return {
+            'score': 0,
+            'feedback': render_feedback([phrases.NO_QUANTITIES]),
+            'feedback_codes': [phrases.NO_QUANTITIES],
+            'scoring_mode': 'calculation'
+        }
+
+    def found(expected, candidates):
+        return next((quantity for quantity in candidates if matches(expected, quantity, tolerance)), None)
+
+    result_line, stated = final_result(user_answer)
+    stated = stated or extract_quantities(result_line)  # nothing after its '=': the whole line
+    result_matches = [found(expected, stated) for expected in key.results]
+    results_found = sum(match is not None for match in result_matches)
+    working_found = sum(found(expected, given) is not None for expected in key.working)
+
+    # A final line offering several values is credited for one of them at most
+    candidates = _distinct(stated)
+    result_share = results_found / len(key.results) * min(1.0, len(key.results) / candidates)
+    if key.working:
+        share = RESULT_WEIGHT * result_share + (1 - RESULT_WEIGHT) * working_found / len(key.working)
+    else:
+        share = result_share
+
+    allowed = len(key.results) + len(key.working) + EXTRA_VALUES_ALLOWED
+    if _distinct(given) > allowed:
+        share *= allowed / _distinct(given)
+    score = round(share * 100)
+
+    guessing = candidates > len(key.results) or _distinct(given) > allowed
+    expected_result = ', '.join(str(quantity) for quantity in key.results)
+    if results_found == len(key.results) and not guessing:
+        feedback_codes = [[phrases.CORRECT_RESULT, expected_result]]
+        if any(expected.unit and not match.unit for expected, match in zip(key.results, result_matches)):
+            feedback_codes.append(phrases.STATE_UNITS)
+    elif results_found:
+        feedback_codes = [[phrases.PARTIAL_RESULT, expected_result]]
+    else:
+        feedback_codes = [[phrases.WRONG_RESULT, expected_result]]
+
+    if key.working and results_found < len(key.results):
+        feedback_codes.append([phrases.WORKING_REACHED, working_found, len(key.working)])
+    if guessing:
+        feedback_codes.append(phrases.TOO_MANY_VALUES)
+
+    return {
+        'score': max(0, min(100, score)),
+        'feedback': render_feedback(feedback_codes),
+        'feedback_codes': feedback_codes,
+        'scoring_mode': 'calculation'
+    }
@@ -0,0 +1,34 @@
+"""
+Choice Grader Module
+Grades multiple-choice answers by comparing the option letter picked with the
+question's key - no text processing, so web workers can grade them without
+loading the NLP scorer
+"""
+
+import re
+import feedback_phrases as phrases
+from feedback_phrases import render_feedback
+
+# Option letters of multiple-choice questions
+CHOICE_LETTERS = 'ABCDE'
+
+def selected_choice(user_answer):
+    """Option letter a multiple-choice answer picks ('B', 'b)', '(C) text', 'D. text'), or None"""
+    match = re.match(r'\s*\(?([A-Ea-e])(?:[).:]|\s*$)', user_answer or '')
+    return match.group(1).upper() if match else None
+
+def grade_choice(user_answer, correct_choice):
+    """Grade a multiple-choice answer by comparing option letters - no text processing at all"""
+    selected = selected_choice(user_answer)
+    if selected is None:
+        feedback_codes = [phrases.NO_OPTION]
+    elif selected == correct_choice:
+        feedback_codes = [[phrases.CORRECT_OPTION, correct_choice]]
+    else:
+        feedback_codes = [[phrases.WRONG_OPTION, selected, correct_choice]]
+    return {
+        'score': 100 if selected == correct_choice else 0,
+        'feedback': render_feedback(feedback_codes),
+        'feedback_codes': feedback_codes,
+        'scoring_mode': 'choice'
+    }
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Re-encode the feedback of answers stored before feedback was kept as phrase
+codes (see feedback_phrases.py). Text made only of known phrases is replaced by
+its codes; anything else (e.g. edited by hand) is left as text.
+
+Safe to run while the app is serving and to run again; each batch is its own
+transaction.
+
+Usage: python compact_feedback.py [--batch-size 1000]
+"""
+import argparse
+import time
+from app import app
+from models import Answer, db
+from feedback_phrases import encode_feedback, parse_feedback
+
+def compact_batch(after_id, batch_size):
+    """Encode one batch of text feedback after an answer id: (last id seen, rows encoded, rows kept as text)"""
+    rows = db.session.query(Answer.id, Answer.feedback_text).\
+           filter(Answer.id > after_id, Answer.feedback_codes.is_(None), Answer.feedback_text != '').\
+           order_by(Answer.id).limit(batch_size).all()
+    if not rows:
+        return None, 0, 0
+
+    updates = []
+    for answer_id, text in rows:
+        codes = parse_feedback(text)
+        if codes:
+            updates.append({'id': answer_id, 'feedback_text': '', 'feedback_codes': encode_feedback(codes)})
+    if updates:
+        db.session.execute(db.update(Answer), updates)
+    db.session.commit()
+    return rows[-1][0], len(updates), len(rows) - len(updates)
+
+def main():
+    parser = argparse.ArgumentParser(description="Store old answers' feedback as phrase codes")
+    parser.add_argument('--batch-size', type=int, default=1000, help='answers updated per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        after_id, encoded, kept = 0, 0, 0
+        while after_id is not None:
+            after_id, batch_encoded, batch_kept = compact_batch(after_id, args.batch_size)
+            encoded += batch_encoded
+            kept += batch_kept
+
+    print(f"Encoded the feedback of {encoded} answers, kept {kept} as text in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Concept Mastery Module
+Per-student record of how often each model-answer concept was covered or
+missed, updated incrementally on every scored answer. Concepts are keyed on
+their Porter stem, so "scaffold" and "scaffolds" count as one concept. Each (student, concept)
+cell of the sparse users x concepts matrix is one row, changed only by SQL
+increments, so concurrent scoring workers never lose each other's updates, and
+reading a student's row is one indexed range scan however long their history is
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from models import ConceptMastery, db
+from scoring_client import scoring_client
+from stemming import stem, stems
+
+logger = logging.getLogger(__name__)
+
+# Concepts need this many outcomes before they count as weak
+MIN_CONCEPT_ATTEMPTS = 2
+
+# Mastery (share of attempts where the concept was covered) below which a concept is weak
+WEAK_MASTERY = 0.5
+
+def _upsert(model):
+    """INSERT ... ON CONFLICT for the database in use (SQLite by default, PostgreSQL in production)"""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model)
+
+class MasteryTracker:
+    """Reads and incrementally updates the users x concepts mastery matrix"""
+
+    def record(self, user_id, components):
+        """
+        Add one answer's covered/missed concepts, as its scoring result's components
+        carry them, to the student's row. Joins the caller's transaction; the caller commits.
+        """
+        matched = set(components['matched']) if components else set()
+        missed = set(components['missed']) if components else set()
+        if not matched and not missed:
+            return
+
+        # One outcome per stem; matched last, so a stem both matched and missed counts as matched
+        outcomes = {}
+        for words, hit in ((missed, 0), (matched, 1)):
+            for word in sorted(words):
+                outcomes[stem(word)] = {'user_id': int(user_id), 'concept': stem(word), 'word': word,
+                                        'hits': hit, 'misses': 1 - hit}
+        try:
+            # Savepoint: a failed upsert must not abort the caller's transaction (and lose the answer)
+            with db.session.begin_nested():
+                # Increments in SQL: concurrent workers scoring the same student both count
+                insert = _upsert(ConceptMastery).values(list(outcomes.values()))
+                db.session.execute(insert.on_conflict_do_update(
+                    index_elements=[ConceptMastery.user_id, ConceptMastery.concept],
+                    set_={'hits': ConceptMastery.hits + insert.excluded.hits,
+                          'misses': ConceptMastery.misses + insert.excluded.misses,
+                          'word': insert.excluded.word,
+                          'updated_at': datetime.now()}
+                ))
+        except Exception as e:
+            logger.error(f"Error updating concept mastery for user {user_id}: {e}")
+
+    def get(self, user_id):
+        """The student's row: {concept: [times matched, times missed]}, concepts as last written"""
+        rows = db.session.query(ConceptMastery.concept, ConceptMastery.word, ConceptMastery.hits,
+                                ConceptMastery.misses).\
+               filter(ConceptMastery.user_id == int(user_id))
+        return {word or concept: [hits, misses] for concept, word, hits, misses in rows}
+
+    def weak_concepts(self, user_id, limit=5):
+        """The student's weakest concepts, least mastered first"""
+        total = ConceptMastery.hits + ConceptMastery.misses
+        rows = db.session.query(ConceptMastery.concept, ConceptMastery.word, ConceptMastery.hits,
+                                ConceptMastery.misses).\
+               filter(ConceptMastery.user_id == int(user_id)).\
+               filter(total >= MIN_CONCEPT_ATTEMPTS).\
+               filter(ConceptMastery.hits < WEAK_MASTERY * total)
+
+        weak = [{
+            'concept': word or concept,
+            'stem': concept,
+            'hits': hits,
+            'misses': misses,
+            'mastery': round(hits * 100.0 / (hits + misses))
+        } for concept, word, hits, misses in rows]
+        weak.sort(key=lambda item: (item['mastery'], -item['misses']))
+        return weak[:limit]
+
+    def question_weights(self, user_id, question_ids):
+        """
+        Selection weight per question: 1 plus how many of the student's weak
+        concepts it exercises, so weak areas come up more often
+        """
+        weak = {item['stem'] for item in self.weak_concepts(user_id, limit=None)}
+        if not weak:
+            return [1] * len(question_ids)
+        concepts = scoring_client.question_concepts(question_ids)
+        return [1 + len(stems(concepts.get(question_id, ())) & weak) for question_id in question_ids]
+
+# Initialize shared mastery tracker
+mastery_tracker = MasteryTracker()
@@ -3,6 +3,8 @@ In-memory data store for sample questions and mock AI functionality
 """
 import random
 from datetime import datetime
+import feedback_phrases as phrases
+from feedback_phrases import render_feedback
 
 # Sample questions for the tutoring system
 SAMPLE_QUESTIONS = [
@@ -81,7 +83,8 @@ def mock_ai_score(user_answer, model_answer, question_difficulty='medium'):
     if not user_answer or len(user_answer.strip()) < 5:
         return {
             'score': random.randint(20, 40),
-            'feedback': 'Your answer is too short. Please provide more detail and explanation.'
+            'feedback': render_feedback([phrases.MOCK_TOO_SHORT]),
+            'feedback_codes': [phrases.MOCK_TOO_SHORT]
         }
     
     # Base score based on difficulty
@@ -96,19 +99,20 @@ def mock_ai_score(user_answer, model_answer, question_difficulty='medium'):
     
     # Generate feedback based on score range
     if score >= 90:
-        feedback = "Excellent work! Your answer demonstrates a thorough understanding of the concept."
+        feedback_code = phrases.MOCK_EXCELLENT
     elif score >= 80:
-        feedback = "Good answer! You've covered the main points well. Consider adding more detail for a complete response."
+        feedback_code = phrases.MOCK_GOOD
     elif score >= 70:
-        feedback = "Satisfactory answer. You understand the basics but could expand on key concepts."
+        feedback_code = phrases.MOCK_SATISFACTORY
     elif score >= 60:
-        feedback = "Your answer shows some understanding but needs more development and accuracy."
+        feedback_code = phrases.MOCK_SOME_UNDERSTANDING
     else:
-        feedback = "Your answer needs significant improvement. Review the material and try to provide more comprehensive explanations."
+        feedback_code = phrases.MOCK_NEEDS_IMPROVEMENT
     
     return {
         'score': score,
-        'feedback': feedback
+        'feedback': render_feedback([feedback_code]),
+        'feedback_codes': [feedback_code]
     }
 
 def get_random_question():
@@ -17,8 +17,8 @@ from datetime import datetime
 import nltk
 from nltk.tokenize import sent_tokenize, word_tokenize
 from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
 import spacy
+from stemming import stems
 
 # Download required NLTK data
 try:
@@ -70,7 +70,6 @@ class EnhancedPDFProcessor:
     """Enhanced PDF processor with modern NLP techniques"""
     
     def __init__(self):
-        self.stemmer = PorterStemmer()
         self.stop_words = set(stopwords.words('english'))
         
         # Subject-specific keywords for better classification
@@ -199,9 +198,9 @@ class EnhancedPDFProcessor:
         return unique_chunks
 
     def _text_similarity(self, text1: str, text2: str) -> float:
-        """Calculate similarity between two texts using simple word overlap"""
-        words1 = set(word_tokenize(text1.lower()))
-        words2 = set(word_tokenize(text2.lower()))
+        """Calculate similarity between two texts using simple word overlap (on stems, so inflections match)"""
+        words1 = stems(word_tokenize(text1.lower()))
+        words2 = stems(word_tokenize(text2.lower()))
         
         if not words1 or not words2:
             return 0.0
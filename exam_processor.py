@@ -9,11 +9,23 @@ from flask import current_app
 from simplified_pdf_processor import SimplifiedPDFProcessor
 from nesa_pdf_processor import NESAPDFProcessor
 from models import Question, db
+from choice_grader import CHOICE_LETTERS
+from scoring_client import scoring_client
 import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+def parse_choice_options(options):
+    """Turn extracted option lines ("A) text", "B. text") into {letter: text}, in letter order"""
+    parsed = {}
+    for option in options:
+        match = re.match(r'\s*\(?([A-Ea-e])[).:]\s*(.*)', option or '', re.DOTALL)
+        if match and match.group(2).strip():
+            parsed[match.group(1).upper()] = match.group(2).strip()
+    return {letter: parsed[letter] for letter in CHOICE_LETTERS if letter in parsed}
+
 class ExamProcessor:
     """Main processor for exam papers and question management"""
     
@@ -195,11 +207,21 @@ class ExamProcessor:
                 question.question_text = question_data.get('text', '')
                 question.model_answer = question_data.get('generated_answer', '')
                 question.difficulty = question_data.get('complexity', 'medium')
+                question.question_type = question_data.get('type')
+                question.marks = question_data.get('marks')
+                
+                # Multiple-choice options; with a key the question is graded by option letter
+                options = parse_choice_options(question_data.get('multiple_choice_options') or [])
+                if options:
+                    question.choice_options = json.dumps(options)
+                    correct_choice = (question_data.get('correct_choice') or '').upper()
+                    question.correct_choice = correct_choice if correct_choice in options else None
                 
                 db.session.add(question)
                 saved_count += 1
             
             db.session.commit()
+            scoring_client.invalidate()
             return {
                 'success': True,
                 'saved_count': saved_count,
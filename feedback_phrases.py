@@ -0,0 +1,130 @@
+"""
+Feedback Phrases Module
+Phrase table for dictionary-encoded feedback. Scoring builds feedback from a
+fixed set of phrases, so answers store it as a short list of phrase codes
+(JSON: an id, or [id, arguments...] for phrases with blanks) and the text is
+rendered when it is read
+"""
+
+import re
+import json
+from functools import lru_cache
+
+# Distinct stored feedback values rendered per process (most answers share a few code lists)
+RENDER_CACHE_SIZE = 4096
+
+# Codes are stored with every answer: never renumber or reuse an id, only add new ones
+
+# generate_detailed_feedback
+EXCELLENT = 1
+GOOD = 2
+FAIR = 3
+NEEDS_IMPROVEMENT = 4
+LOW_SIMILARITY = 5
+PARTIAL_SIMILARITY = 6
+LOW_COVERAGE = 7
+PARTIAL_COVERAGE = 8
+KEY_CONCEPTS = 9
+POINTS_ADDRESSED = 10
+ALL_POINTS_ADDRESSED = 11
+TOO_BRIEF = 12
+
+# Answer bounds
+DEGRADED = 13
+TOO_SHORT = 14
+
+# Multiple-choice questions
+NO_OPTION = 15
+CORRECT_OPTION = 16
+WRONG_OPTION = 17
+
+# Calculation questions
+NO_QUANTITIES = 18
+CORRECT_RESULT = 19
+STATE_UNITS = 20
+PARTIAL_RESULT = 21
+WRONG_RESULT = 22
+WORKING_REACHED = 23
+TOO_MANY_VALUES = 30
+
+# Fallback scoring (mock_ai_score)
+MOCK_TOO_SHORT = 24
+MOCK_EXCELLENT = 25
+MOCK_GOOD = 26
+MOCK_SATISFACTORY = 27
+MOCK_SOME_UNDERSTANDING = 28
+MOCK_NEEDS_IMPROVEMENT = 29
+
+PHRASES = {
+    EXCELLENT: "🎉 Excellent answer! You demonstrated strong understanding of the concepts.",
+    GOOD: "✅ Good answer! You covered most key points effectively.",
+    FAIR: "👍 Fair answer! You have the right idea but could provide more detail.",
+    NEEDS_IMPROVEMENT: "📚 Your answer needs improvement. Let's work on understanding the key concepts.",
+    LOW_SIMILARITY: "Consider reviewing the core concepts - your answer doesn't align closely with the expected response.",
+    PARTIAL_SIMILARITY: "You're on the right track, but try to include more specific details from the lesson material.",
+    LOW_COVERAGE: "Try to address more of key points mentioned in the model answer.",
+    PARTIAL_COVERAGE: "You covered some important points. Consider expanding on the main concepts.",
+    KEY_CONCEPTS: "Key concepts to include: {0}.",
+    POINTS_ADDRESSED: 'You addressed {0} of {1} points of the model answer. Not yet covered: "{2}"',
+    ALL_POINTS_ADDRESSED: "You addressed every point of the model answer.",
+    TOO_BRIEF: "Your answer is quite brief. Try to provide more detailed explanations and examples.",
+    DEGRADED: "Your answer was very long, so only part of it was assessed. Focus on the key points.",
+    TOO_SHORT: "Answer is too short or empty. Please provide a more detailed response.",
+    NO_OPTION: "No option was selected. Choose one of the options.",
+    CORRECT_OPTION: "Correct! Option {0} is the right answer.",
+    WRONG_OPTION: "Option {0} is not correct. The right answer is option {1}.",
+    NO_QUANTITIES: "No numerical answer was found. Show your working and state the final result with its unit.",
+    CORRECT_RESULT: "Correct result ({0}).",
+    STATE_UNITS: "Remember to state the units of your answer.",
+    PARTIAL_RESULT: "Part of the result is correct. The expected result is {0}.",
+    WRONG_RESULT: "Your result does not match the expected {0}. Check your working and units.",
+    WORKING_REACHED: "You reached {0} of {1} intermediate values.",
+    TOO_MANY_VALUES: "State a single final result: answers listing several candidate values get partial credit.",
+    MOCK_TOO_SHORT: "Your answer is too short. Please provide more detail and explanation.",
+    MOCK_EXCELLENT: "Excellent work! Your answer demonstrates a thorough understanding of the concept.",
+    MOCK_GOOD: "Good answer! You've covered the main points well. Consider adding more detail for a complete response.",
+    MOCK_SATISFACTORY: "Satisfactory answer. You understand the basics but could expand on key concepts.",
+    MOCK_SOME_UNDERSTANDING: "Your answer shows some understanding but needs more development and accuracy.",
+    MOCK_NEEDS_IMPROVEMENT: "Your answer needs significant improvement. Review the material and try to provide "
+                            "more comprehensive explanations.",
+}
+
+def render_feedback(codes):
+    """Feedback text for a list of phrase codes"""
+    return ' '.join(PHRASES[code].format() if isinstance(code, int) else PHRASES[code[0]].format(*code[1:])
+                    for code in codes)
+
+def encode_feedback(codes):
+    """Compact JSON stored in the feedback_codes columns"""
+    return json.dumps(codes, separators=(',', ':'), ensure_ascii=False)
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def decode_feedback(encoded):
+    """Feedback text for a stored feedback_codes value"""
+    return render_feedback(json.loads(encoded))
+
+def _phrase_pattern(code):
+    parts = re.split(r'\{\d\}', PHRASES[code])
+    return re.compile('(?:' + '(.+?)'.join(re.escape(part) for part in parts) + ')(?: |$)')
+
+# Longest phrases first, so a phrase is never matched by a shorter one it starts with
+_PATTERNS = sorted(((code, _phrase_pattern(code)) for code in PHRASES), key=lambda item: -len(PHRASES[item[0]]))
+
+def parse_feedback(text):
+    """
+    Phrase codes for feedback text written before it was stored encoded, or None
+    when the text is not made of known phrases (it is then kept as text)
+    """
+    codes = []
+    position = 0
+    while position < len(text):
+        for code, pattern in _PATTERNS:
+            match = pattern.match(text, position)
+            if match:
+                arguments = [int(value) if value.isdigit() else value for value in match.groups()]
+                codes.append([code] + arguments if arguments else code)
+                position = match.end()
+                break
+        else:
+            return None
+    return codes if render_feedback(codes) == text else None
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Script to bring an existing database up to the current schema: creates new
+tables and adds columns introduced after a table was first created
+(create_all never alters tables). Run once per deploy, before starting the
+web workers; running it again is harmless.
+
+Usage: python migrate_database.py
+"""
+from sqlalchemy.exc import DBAPIError
+from app import app, db
+import models  # noqa: F401
+
+def server_default(column, dialect):
+    """DEFAULT clause filling existing rows with the model's constant default, or '' when it has none"""
+    default = column.default
+    if default is None or not default.is_scalar:
+        return ''
+    literal = db.literal(default.arg, type_=column.type).compile(dialect=dialect,
+                                                                compile_kwargs={'literal_binds': True})
+    return f' DEFAULT {literal}'
+
+def existing_columns(table_name):
+    return {column['name'] for column in db.inspect(db.engine).get_columns(table_name)}
+
+def add_column(table, column):
+    """ALTER TABLE ... ADD COLUMN; returns False when another process added it first"""
+    dialect = db.engine.dialect
+    column_type = column.type.compile(dialect=dialect)
+    default = server_default(column, dialect)
+    # NOT NULL only with a default to fill existing rows with
+    not_null = ' NOT NULL' if not column.nullable and default else ''
+    try:
+        db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} '
+                                   f'{column_type}{default}{not_null}'))
+        # Timestamps default to datetime.now, which SQLite cannot add as a column default
+        if column.default is not None and column.default.is_callable and isinstance(column.type, db.DateTime):
+            db.session.execute(db.text(f'UPDATE {table.name} SET {column.name} = CURRENT_TIMESTAMP'))
+        db.session.commit()
+    except DBAPIError:
+        db.session.rollback()
+        if column.name in existing_columns(table.name):
+            return False  # duplicate column: added concurrently
+        raise
+    return True
+
+def migrate_database():
+    """Create missing tables and add missing columns with their defaults"""
+    with app.app_context():
+        db.create_all()
+        for table in db.metadata.sorted_tables:
+            existing = existing_columns(table.name)
+            for column in table.columns:
+                if column.name not in existing and add_column(table, column):
+                    print(f"Added column {table.name}.{column.name}")
+        print("Database schema is up to date")
+
+if __name__ == '__main__':
+    migrate_database()
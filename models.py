@@ -1,7 +1,9 @@
+import json
 from datetime import datetime
 from app import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from feedback_phrases import decode_feedback, encode_feedback
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -39,8 +41,29 @@ class Question(db.Model):
     question_text = db.Column(db.Text, nullable=False)
     model_answer = db.Column(db.Text, nullable=False)
     difficulty = db.Column(db.String(20), default='medium')  # easy, medium, hard
+    question_type = db.Column(db.String(30), nullable=True)  # definition, calculation, listing... as extracted
+    marks = db.Column(db.Integer, nullable=True)
+    choice_options = db.Column(db.Text, nullable=True)  # JSON {"A": "option text", ...} for multiple-choice questions
+    correct_choice = db.Column(db.String(1), nullable=True)  # Letter of the right option; graded without NLP when set
     
     created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def choices(self):
+        """Options of a multiple-choice question: {letter: text}, empty for other questions"""
+        return json.loads(self.choice_options) if self.choice_options else {}
+
+class ReferenceAnswer(db.Model):
+    __tablename__ = 'reference_answers'
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False, index=True)
+    answer_text = db.Column(db.Text, nullable=False)  # Alternative acceptable answer besides model_answer
+    
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    # Relationships
+    question = db.relationship('Question', backref=db.backref('reference_answers', lazy=True,
+                                                              order_by='ReferenceAnswer.id'))
 
 class Answer(db.Model):
     __tablename__ = 'answers'
@@ -49,10 +72,154 @@ class Answer(db.Model):
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
     user_answer = db.Column(db.Text, nullable=False)
     score = db.Column(db.Integer, nullable=False)  # 0-100
-    feedback = db.Column(db.Text, nullable=False)
+    # Feedback is stored as phrase codes (JSON, see feedback_phrases) and rendered when read;
+    # feedback_text holds it as text only for answers scored before codes were stored
+    feedback_text = db.Column('feedback', db.Text, nullable=False, default='')
+    feedback_codes = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), default='scored')  # 'pending' while queued for async scoring
+    scoring_mode = db.Column(db.String(20), default='full')  # 'degraded': only a sample of a huge answer was scored; 'choice': graded by option letter
+    
+    # Score components in thousandths (0-1000) and the concepts of the closest reference,
+    # space-separated; NULL for answers not scored by NLP (choice, calculation, before scoring)
+    similarity = db.Column(db.SmallInteger, nullable=True)
+    coverage = db.Column(db.SmallInteger, nullable=True)
+    quality = db.Column(db.SmallInteger, nullable=True)
+    matched_concepts = db.Column(db.Text, nullable=True)
+    missed_concepts = db.Column(db.Text, nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.now)
     
     # Relationships
     user = db.relationship('User', backref=db.backref('answers', lazy=True))
     question = db.relationship('Question', backref=db.backref('answers', lazy=True))
+    
+    @property
+    def feedback(self):
+        """Feedback text, rendered from the phrase codes when the answer has them"""
+        if self.feedback_codes:
+            return decode_feedback(self.feedback_codes)
+        return self.feedback_text
+    
+    @feedback.setter
+    def feedback(self, text):
+        self.feedback_text = text
+        self.feedback_codes = None
+    
+    @staticmethod
+    def feedback_values(result):
+        """Column values for a scoring result's feedback: its phrase codes when it has them, else its text"""
+        if result.get('feedback_codes'):
+            return {'feedback_text': '', 'feedback_codes': encode_feedback(result['feedback_codes'])}
+        return {'feedback_text': result.get('feedback') or '', 'feedback_codes': None}
+    
+    def set_feedback(self, result):
+        """Store a scoring result's feedback on the answer"""
+        for column, value in self.feedback_values(result).items():
+            setattr(self, column, value)
+    
+    @staticmethod
+    def component_values(components):
+        """Column values for a scoring result's 'components' (all None when there are none)"""
+        if not components:
+            return dict.fromkeys(('similarity', 'coverage', 'quality', 'matched_concepts', 'missed_concepts'))
+        return {
+            'similarity': round(components['similarity'] * 1000),
+            'coverage': round(components['coverage'] * 1000),
+            'quality': round(components['quality'] * 1000),
+            'matched_concepts': ' '.join(components['matched']),
+            'missed_concepts': ' '.join(components['missed'])
+        }
+    
+    def set_components(self, components):
+        """Store a scoring result's components on the answer"""
+        for column, value in self.component_values(components).items():
+            setattr(self, column, value)
+    
+    def components(self):
+        """Stored components as scoring returns them, or None"""
+        if self.similarity is None:
+            return None
+        return {
+            'similarity': self.similarity / 1000,
+            'coverage': self.coverage / 1000,
+            'quality': self.quality / 1000,
+            'matched': self.matched_concepts.split() if self.matched_concepts else [],
+            'missed': self.missed_concepts.split() if self.missed_concepts else []
+        }
+
+class RegradeJob(db.Model):
+    __tablename__ = 'regrade_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed, superseded
+    total = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        """Progress summary for the admin API"""
+        return {
+            'id': self.id,
+            'question_id': self.question_id,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'progress': round(self.processed * 100.0 / self.total, 1) if self.total else 100.0,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ScoreCacheEntry(db.Model):
+    __tablename__ = 'score_cache'
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of question, model version and cleaned answer
+    question_id = db.Column(db.Integer, nullable=False, index=True)
+    model_version = db.Column(db.String(16), nullable=False)
+    corpus_version = db.Column(db.String(16), nullable=True, index=True)  # ScoringModel.corpus_version when scored
+    score = db.Column(db.Integer, nullable=False)
+    feedback = db.Column(db.Text, nullable=False)  # '' when feedback_codes is set
+    feedback_codes = db.Column(db.Text, nullable=True)  # JSON phrase codes, as on Answer
+    scoring_mode = db.Column(db.String(20), default='full')
+    components = db.Column(db.Text, nullable=True)  # JSON of the result's score components
+    
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class ConceptMastery(db.Model):
+    __tablename__ = 'concept_outcomes'
+    # One cell of the sparse users x concepts mastery matrix, changed only by SQL increments
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    concept = db.Column(db.Text, primary_key=True)  # Porter stem, so inflected forms share one cell
+    word = db.Column(db.Text, nullable=True)  # the concept as last written, shown to the student
+    hits = db.Column(db.Integer, nullable=False, default=0)  # times the concept was covered
+    misses = db.Column(db.Integer, nullable=False, default=0)  # times it was missed
+    
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+class BulkGradeProgress(db.Model):
+    __tablename__ = 'bulk_grade_progress'
+    # Input records of a bulk_grade.py --write-db run whose answers are stored; updated in the
+    # same transaction as the answers, so a resumed run never inserts them twice
+    input_path = db.Column(db.String(500), primary_key=True)
+    records = db.Column(db.Integer, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+class AnswerSignature(db.Model):
+    __tablename__ = 'answer_signatures'
+    answer_id = db.Column(db.Integer, db.ForeignKey('answers.id'), primary_key=True)
+    question_id = db.Column(db.Integer, nullable=False, index=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # MinHash values, uint32 array bytes
+
+class AnswerBucket(db.Model):
+    __tablename__ = 'answer_buckets'
+    # LSH band buckets: answers sharing a (question, band, bucket) row are near-duplicate candidates
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, nullable=False)
+    band = db.Column(db.SmallInteger, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    answer_id = db.Column(db.Integer, db.ForeignKey('answers.id'), nullable=False, index=True)
+    
+    __table_args__ = (db.Index('ix_answer_buckets_lookup', 'question_id', 'band', 'bucket'),)
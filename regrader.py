@@ -0,0 +1,199 @@
+"""
+Background Re-grading Module
+Rescores historical answers when a question's model answer changes, using a
+process pool off the web worker and writing results back in batched transactions
+"""
+
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from app import app
+from models import Answer, Question, RegradeJob, User, db
+from scoring_constants import CORRECT_THRESHOLD
+from answer_scorer import score_answer, scoring_model
+from choice_grader import grade_choice
+
+logger = logging.getLogger(__name__)
+
+# Answers scored per worker task and written per transaction
+REGRADE_BATCH_SIZE = int(os.environ.get('REGRADE_BATCH_SIZE', 200))
+
+# Worker processes per job (defaults to all but one core)
+REGRADE_WORKERS = int(os.environ.get('REGRADE_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+
+# Question features shipped once to each worker process by the pool initializer
+_worker_question = None
+
+def _init_worker(model_answer, difficulty, features):
+    """Pool initializer: keep the question being re-graded in the worker"""
+    global _worker_question
+    _worker_question = (model_answer, difficulty, features)
+
+def _score_batch(batch, question=None):
+    """Score (answer_id, user_answer) pairs in a worker process (or inline when question is given)"""
+    model_answer, difficulty, features = question or _worker_question
+    results = []
+    for answer_id, user_answer in batch:
+        result = score_answer(user_answer, model_answer, difficulty, features)
+        results.append((answer_id, result['score'], Answer.feedback_values(result), result.get('scoring_mode', 'full'),
+                        result.get('components')))
+    return results
+
+def _grade_choice_batch(batch, correct_choice):
+    """Grade (answer_id, user_answer) pairs of a multiple-choice question by option letter"""
+    results = []
+    for answer_id, user_answer in batch:
+        result = grade_choice(user_answer, correct_choice)
+        results.append((answer_id, result['score'], Answer.feedback_values(result), result['scoring_mode'], None))
+    return results
+
+class Regrader:
+    """Runs re-grading jobs in background threads that feed a process pool"""
+
+    def __init__(self, batch_size=REGRADE_BATCH_SIZE, max_workers=REGRADE_WORKERS):
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def start(self, question_id):
+        """Queue a re-grading job for a question and return it without waiting"""
+        job = RegradeJob()
+        job.question_id = question_id
+        job.status = 'queued'
+        db.session.add(job)
+        db.session.commit()
+
+        thread = threading.Thread(target=self._run, args=(job.id,), daemon=True,
+                                  name=f'regrade-{job.id}')
+        thread.start()
+        return job
+
+    def _run(self, job_id):
+        """Background thread body"""
+        with app.app_context():
+            self._regrade(db.session.get(RegradeJob, job_id))
+
+    def _regrade(self, job):
+        """Load answers, score them in the pool and write them back in batches"""
+        job_id = job.id
+        try:
+            # A newer job was queued before this one started
+            if self._is_superseded(job):
+                job.status = 'superseded'
+                job.finished_at = datetime.now()
+                db.session.commit()
+                return
+
+            question = db.session.get(Question, job.question_id)
+            if question is None:
+                raise ValueError(f'Question #{job.question_id} no longer exists')
+
+            # Answers as they are now; later submissions already use the new model answer,
+            # and pending ones will be scored against it by the scoring queue
+            rows = db.session.query(Answer.id, Answer.user_answer).\
+                   filter(Answer.question_id == question.id).\
+                   filter(db.or_(Answer.status.is_(None), Answer.status != 'pending')).\
+                   order_by(Answer.id).all()
+
+            job.status = 'running'
+            job.total = len(rows)
+            db.session.commit()
+
+            features = scoring_model.get_features(question.id, question.model_answer)
+            batches = [[(row.id, row.user_answer) for row in rows[start:start + self.batch_size]]
+                       for start in range(0, len(rows), self.batch_size)]
+
+            if question.correct_choice:
+                # Letter comparisons need no worker processes
+                scored = (_grade_choice_batch(batch, question.correct_choice) for batch in batches)
+            else:
+                scored = self._score_batches(batches, question.model_answer, question.difficulty, features)
+
+            for results in scored:
+                # Jobs of a question may run in different web workers: each batch is written holding
+                # the question row's lock, and only if no newer job exists by then, so an older job
+                # never overwrites scores a newer one has written
+                db.session.query(Question.id).filter(Question.id == job.question_id).with_for_update().scalar()
+                if self._is_superseded(job):
+                    job.status = 'superseded'
+                    break
+                self._write_batch(results)
+                job.processed += len(results)
+                db.session.commit()
+            else:
+                job.status = 'completed'
+
+            job.finished_at = datetime.now()
+            db.session.commit()
+            logger.info(f"Re-grading job #{job.id} {job.status}: {job.processed}/{job.total} answers")
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error in re-grading job #{job_id}: {e}")
+            job = db.session.get(RegradeJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.now()
+            db.session.commit()
+
+    def _score_batches(self, batches, model_answer, difficulty, features):
+        """Yield scored batches as they finish; small jobs skip the pool start-up cost"""
+        if len(batches) <= 1:
+            for batch in batches:
+                yield _score_batch(batch, (model_answer, difficulty, features))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                 initargs=(model_answer, difficulty, features)) as pool:
+            futures = [pool.submit(_score_batch, batch) for batch in batches]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _is_superseded(self, job):
+        """A newer job for the same question makes this one's scores obsolete"""
+        newest_id = db.session.query(db.func.max(RegradeJob.id)).\
+                    filter(RegradeJob.question_id == job.question_id).scalar()
+        return newest_id != job.id
+
+    def _write_batch(self, results):
+        """Write one batch of new scores and adjust user aggregates by their deltas"""
+        # Deltas are taken from the scores being replaced, read and locked in this transaction,
+        # so a score another job already rewrote is never subtracted twice
+        current = {row.id: (row.user_id, row.score) for row in
+                   db.session.query(Answer.id, Answer.user_id, Answer.score).
+                   filter(Answer.id.in_([result[0] for result in results])).with_for_update()}
+
+        answer_updates = []
+        user_deltas = {}
+        for answer_id, new_score, feedback, scoring_mode, components in results:
+            if answer_id not in current:
+                continue  # deleted while the job was running
+            user_id, old_score = current[answer_id]
+            answer_updates.append({'id': answer_id, 'score': new_score, **feedback,
+                                   'scoring_mode': scoring_mode, **Answer.component_values(components)})
+
+            score_delta = new_score - old_score
+            correct_delta = int(new_score >= CORRECT_THRESHOLD) - int(old_score >= CORRECT_THRESHOLD)
+            totals = user_deltas.setdefault(int(user_id), [0, 0])
+            totals[0] += score_delta
+            totals[1] += correct_delta
+
+        if answer_updates:
+            db.session.execute(db.update(Answer), answer_updates)
+
+        for user_id, (score_delta, correct_delta) in user_deltas.items():
+            if score_delta or correct_delta:
+                db.session.execute(
+                    db.update(User).where(User.id == user_id).values(
+                        total_score=User.total_score + score_delta,
+                        questions_correct=User.questions_correct + correct_delta
+                    )
+                )
+
+# Initialize shared re-grader
+regrader = Regrader()
@@ -1,42 +1,58 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, abort
 import os
 import json
 import logging
 from flask_login import current_user
 from app import app, db
 from auth import auth_bp, require_login, require_admin
-from models import User, Question, Answer
+from models import User, Question, Answer, RegradeJob, ReferenceAnswer
 from data_store import (
     get_random_question, 
     get_question_by_id, 
-    mock_ai_score, 
     get_all_subjects, 
     get_topics_by_subject,
     get_questions_by_subject,
     get_random_question_by_filters,
     SAMPLE_QUESTIONS
 )
-from exam_processor import exam_processor
+from exam_processor import exam_processor, parse_choice_options
+from choice_grader import grade_choice
+from scoring_client import MAX_ANSWER_CHARS, scoring_client
+from scoring_constants import CORRECT_THRESHOLD
+from scoring_queue import scoring_queue
+from score_cache import score_cache
+from concept_mastery import mastery_tracker
+from similarity_index import DUPLICATE_THRESHOLD, similarity_index
 import random
 import re
-from textblob import TextBlob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 # Database query helper functions
-def get_random_question_from_db():
+def question_dict(question):
+    """Question as passed to the templates; choices only for multiple-choice questions with a key"""
+    return {
+        'id': question.id,
+        'subject': question.subject,
+        'topic': question.topic,
+        'question_text': question.question_text,
+        'model_answer': question.model_answer,
+        'difficulty': question.difficulty,
+        'choices': question.choices() if question.correct_choice else {},
+        'correct_choice': question.correct_choice
+    }
+
+def pick_question(questions, user_id=None):
+    """Random choice, weighted towards the student's weak concepts when known"""
+    if user_id is None:
+        return random.choice(questions)
+    weights = mastery_tracker.question_weights(user_id, [question.id for question in questions])
+    return random.choices(questions, weights=weights)[0]
+
+def get_random_question_from_db(user_id=None):
     """Get a random question from database, fallback to sample if none"""
     questions = Question.query.all()
     if questions:
-        question = random.choice(questions)
-        return {
-            'id': question.id,
-            'subject': question.subject,
-            'topic': question.topic,
-            'question_text': question.question_text,
-            'model_answer': question.model_answer,
-            'difficulty': question.difficulty
-        }
+        question = pick_question(questions, user_id)
+        return question_dict(question)
     else:
         # Fallback to sample questions if database is empty
         return get_random_question()
@@ -58,7 +74,7 @@ def get_topics_by_subject_from_db(subject):
     else:
         return get_topics_by_subject(subject)
 
-def get_random_question_by_filters_from_db(subject=None, topic=None):
+def get_random_question_by_filters_from_db(subject=None, topic=None, user_id=None):
     """Get filtered random question from database"""
     query = Question.query
     
@@ -69,216 +85,61 @@ def get_random_question_by_filters_from_db(subject=None, topic=None):
     
     questions = query.all()
     if questions:
-        question = random.choice(questions)
-        return {
-            'id': question.id,
-            'subject': question.subject,
-            'topic': question.topic,
-            'question_text': question.question_text,
-            'model_answer': question.model_answer,
-            'difficulty': question.difficulty
-        }
+        question = pick_question(questions, user_id)
+        return question_dict(question)
     else:
         return get_random_question_by_filters(subject, topic)
 
+def parse_reference_answers(text):
+    """Split the alternative-answers textarea into answers (blocks separated by a '---' line)"""
+    blocks = re.split(r'^\s*---\s*$', text or '', flags=re.MULTILINE)
+    return [block.strip() for block in blocks if block.strip()]
+
+def update_choices(question, options_text, correct_choice):
+    """Set a question's options (one "A) text" line each) and key; returns True if they changed"""
+    options = parse_choice_options((options_text or '').splitlines())
+    correct_choice = (correct_choice or '').upper()
+    choice_options = json.dumps(options) if options else None
+    correct_choice = correct_choice if correct_choice in options else None
+    if choice_options == question.choice_options and correct_choice == question.correct_choice:
+        return False
+    
+    question.choice_options = choice_options
+    question.correct_choice = correct_choice
+    return True
+
+def replace_reference_answers(question, answer_texts):
+    """Replace a question's alternative reference answers; returns True if they changed"""
+    current = [reference.answer_text for reference in question.reference_answers]
+    if current == answer_texts:
+        return False
+    
+    ReferenceAnswer.query.filter_by(question_id=question.id).delete()
+    for answer_text in answer_texts:
+        reference = ReferenceAnswer()
+        reference.question_id = question.id
+        reference.answer_text = answer_text
+        db.session.add(reference)
+    return True
+
+def get_recent_answers_from_db(limit):
+    """Latest answers with their student and question, loading only the answer columns the admin pages show"""
+    return Answer.query.options(
+        db.load_only(Answer.id, Answer.user_id, Answer.question_id, Answer.score, Answer.created_at),
+        db.joinedload(Answer.user),
+        db.joinedload(Answer.question)
+    ).order_by(Answer.created_at.desc()).limit(limit).all()
+
 def get_question_by_id_from_db(question_id):
     """Get specific question by ID from database"""
     question = Question.query.get(question_id)
     if question:
-        return {
-            'id': question.id,
-            'subject': question.subject,
-            'topic': question.topic,
-            'question_text': question.question_text,
-            'model_answer': question.model_answer,
-            'difficulty': question.difficulty
-        }
+        return question_dict(question)
     else:
         return get_question_by_id(question_id)
 
-def intelligent_ai_score(user_answer, model_answer, question_difficulty='medium'):
-    """
-    Intelligent AI scoring using NLP techniques to compare student and model answers
-    """
-    try:
-        # Clean and normalize text
-        user_clean = clean_text(user_answer)
-        model_clean = clean_text(model_answer)
-        
-        if not user_clean or len(user_clean) < 5:
-            return {
-                'score': 0,
-                'feedback': 'Answer is too short or empty. Please provide a more detailed response.'
-            }
-        
-        # Calculate similarity score
-        similarity_score = calculate_text_similarity(user_clean, model_clean)
-        
-        # Extract key concepts from both answers
-        user_concepts = extract_key_concepts(user_clean)
-        model_concepts = extract_key_concepts(model_clean)
-        
-        # Calculate concept coverage
-        concept_coverage = calculate_concept_coverage(user_concepts, model_concepts)
-        
-        # Assess answer quality
-        quality_score = assess_answer_quality(user_clean)
-        
-        # Calculate final score (weighted combination)
-        final_score = int((similarity_score * 0.4 + concept_coverage * 0.4 + quality_score * 0.2) * 100)
-        
-        # Adjust for difficulty
-        if question_difficulty == 'easy' and final_score >= 60:
-            final_score = min(100, final_score + 5)
-        elif question_difficulty == 'hard' and final_score < 80:
-            final_score = max(50, final_score - 5)
-        
-        # Generate detailed feedback
-        feedback = generate_detailed_feedback(user_answer, model_answer, final_score, 
-                                           similarity_score, concept_coverage)
-        
-        return {
-            'score': max(0, min(100, final_score)),
-            'feedback': feedback
-        }
-        
-    except Exception as e:
-        logging.error(f"Error in intelligent scoring: {e}")
-        # Fallback to mock scoring
-        return mock_ai_score(user_answer, model_answer, question_difficulty)
-
-def clean_text(text):
-    """Clean and normalize text for comparison"""
-    if not text:
-        return ""
-    
-    # Remove extra whitespace and normalize
-    text = re.sub(r'\s+', ' ', text.strip())
-    
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters but keep basic punctuation
-    text = re.sub(r'[^\w\s\.\,\!\?\:\;]', '', text)
-    
-    return text
-
-def calculate_text_similarity(text1, text2):
-    """Calculate semantic similarity between two texts using TF-IDF"""
-    try:
-        vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
-        tfidf_matrix = vectorizer.fit_transform([text1, text2])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-        return similarity
-    except:
-        # Fallback to simple word overlap
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        return len(intersection) / len(union) if union else 0
-
-def extract_key_concepts(text):
-    """Extract key concepts from text using simple NLP techniques"""
-    try:
-        # Simple word-based concept extraction
-        words = re.findall(r'\b[a-zA-Z]{4,}\b', text.lower())
-        
-        # Remove common stop words
-        stop_words = {'this', 'that', 'with', 'have', 'will', 'from', 'they', 'been', 'were', 'said', 
-                     'each', 'which', 'their', 'time', 'would', 'there', 'could', 'other', 'more',
-                     'very', 'what', 'know', 'just', 'first', 'into', 'over', 'think', 'also'}
-        
-        concepts = set()
-        for word in words:
-            if word not in stop_words and len(word) > 3:
-                concepts.add(word)
-        
-        return concepts
-    except:
-        # Fallback to simple word extraction
-        words = text.split()
-        return set(word.lower() for word in words if len(word) > 3)
-
-def calculate_concept_coverage(user_concepts, model_concepts):
-    """Calculate how well user answer covers model answer concepts"""
-    if not model_concepts:
-        return 0.8  # Give benefit of doubt if no model concepts
-    
-    if not user_concepts:
-        return 0.0
-    
-    # Count matches
-    matches = 0
-    for model_concept in model_concepts:
-        for user_concept in user_concepts:
-            # Check for exact match or partial match
-            if model_concept == user_concept or model_concept in user_concept or user_concept in model_concept:
-                matches += 1
-                break
-    
-    coverage = matches / len(model_concepts)
-    return min(1.0, coverage)  # Cap at 1.0
-
-def assess_answer_quality(text):
-    """Assess overall quality of the answer"""
-    score = 0.5  # Base score
-    
-    # Length-based scoring
-    word_count = len(text.split())
-    if word_count >= 20:
-        score += 0.2
-    elif word_count >= 10:
-        score += 0.1
-    
-    # Structure indicators
-    if '.' in text or '!' in text or '?' in text:
-        score += 0.1  # Has sentences
-    
-    if any(word in text.lower() for word in ['first', 'second', 'third', 'finally', 'therefore', 'because']):
-        score += 0.1  # Has structure words
-    
-    # Technical indicators for construction topics
-    construction_terms = ['construction', 'building', 'scaffold', 'brick', 'mortar', 'foundation', 
-                         'safety', 'material', 'structure', 'tool', 'equipment']
-    if any(term in text.lower() for term in construction_terms):
-        score += 0.1  # Contains relevant terminology
-    
-    return min(1.0, score)
-
-def generate_detailed_feedback(user_answer, model_answer, score, similarity, coverage):
-    """Generate detailed feedback based on scoring components"""
-    feedback_parts = []
-    
-    if score >= 85:
-        feedback_parts.append("🎉 Excellent answer! You demonstrated strong understanding of the concepts.")
-    elif score >= 70:
-        feedback_parts.append("✅ Good answer! You covered most key points effectively.")
-    elif score >= 55:
-        feedback_parts.append("👍 Fair answer! You have the right idea but could provide more detail.")
-    else:
-        feedback_parts.append("📚 Your answer needs improvement. Let's work on understanding the key concepts.")
-    
-    # Similarity feedback
-    if similarity < 0.3:
-        feedback_parts.append("Consider reviewing the core concepts - your answer doesn't align closely with the expected response.")
-    elif similarity < 0.6:
-        feedback_parts.append("You're on the right track, but try to include more specific details from the lesson material.")
-    
-    # Coverage feedback
-    if coverage < 0.4:
-        feedback_parts.append("Try to address more of key points mentioned in the model answer.")
-    elif coverage < 0.7:
-        feedback_parts.append("You covered some important points. Consider expanding on the main concepts.")
-    
-    # Constructive suggestions
-    model_length = len(model_answer.split())
-    user_length = len(user_answer.split())
-    
-    if user_length < model_length * 0.3:
-        feedback_parts.append("Your answer is quite brief. Try to provide more detailed explanations and examples.")
-    
-    return " ".join(feedback_parts)
+# Largest number of answers accepted by the batch scoring API in one request
+MAX_BATCH_SIZE = 5000
 
 # Register the auth blueprint
 app.register_blueprint(auth_bp, url_prefix="/auth")
@@ -324,11 +185,15 @@ def student_dashboard():
     # Get available subjects for course selection
     subjects = get_all_subjects_from_db()
     
+    # Concepts the student keeps missing (one row lookup, no answer history scan)
+    weak_concepts = mastery_tracker.weak_concepts(user.id)
+    
     return render_template('student_dashboard.html', 
                          user=user, 
                          accuracy=accuracy, 
                          avg_score=avg_score,
-                         subjects=subjects)
+                         subjects=subjects,
+                         weak_concepts=weak_concepts)
 
 @app.route('/student/question')
 @require_login
@@ -340,12 +205,12 @@ def get_question():
     
     # Get filtered question or random if no filters
     if subject or topic:
-        question = get_random_question_by_filters_from_db(subject, topic)
+        question = get_random_question_by_filters_from_db(subject, topic, user_id=current_user.id)
         if not question:
             flash(f'No questions found for the selected filters. Getting a random question instead.', 'info')
-            question = get_random_question_from_db()
+            question = get_random_question_from_db(user_id=current_user.id)
     else:
-        question = get_random_question_from_db()
+        question = get_random_question_from_db(user_id=current_user.id)
     
     session['current_question_id'] = question['id']
     return render_template('question.html', question=question, 
@@ -370,6 +235,10 @@ def submit_answer():
         flash('Please provide an answer before submitting.', 'warning')
         return redirect(url_for('get_question'))
     
+    if len(user_answer) > MAX_ANSWER_CHARS:
+        flash(f'Your answer is too long. Please keep it under {MAX_ANSWER_CHARS:,} characters.', 'warning')
+        return redirect(url_for('get_question'))
+    
     if not question_id:
         flash('No question found. Please start a new question.', 'error')
         return redirect(url_for('student_dashboard'))
@@ -380,10 +249,36 @@ def submit_answer():
         flash('Question not found.', 'error')
         return redirect(url_for('student_dashboard'))
     
-    # Get intelligent AI scoring
-    scoring_result = intelligent_ai_score(user_answer, question['model_answer'], question['difficulty'])
+    # Multiple-choice questions are graded on the spot by option letter
+    if question.get('correct_choice'):
+        return submit_choice_answer(question, user_answer)
+    
+    # Async mode: store the answer as pending and let the scoring pool grade it
+    if app.config.get('ASYNC_SCORING'):
+        answer = Answer()
+        answer.user_id = current_user.id
+        answer.question_id = question_id
+        answer.user_answer = user_answer
+        answer.score = 0
+        answer.feedback = ''
+        answer.status = 'pending'
+        db.session.add(answer)
+        db.session.flush()
+        similarity_index.add(answer.id, question_id, user_answer)
+        
+        current_user.questions_attempted += 1
+        db.session.commit()
+        
+        scoring_queue.enqueue(answer.id)
+        session.pop('current_question_id', None)
+        return redirect(url_for('answer_result', answer_id=answer.id))
+    
+    # Get intelligent AI scoring (reused when the same answer was scored before)
+    scoring_result = score_cache.score(user_answer, question['model_answer'], question['difficulty'],
+                                       question_id=question['id'])
     score = scoring_result['score']
     feedback = scoring_result['feedback']
+    scoring_mode = scoring_result.get('scoring_mode', 'full')
     
     # Save answer to database
     answer = Answer()
@@ -391,13 +286,22 @@ def submit_answer():
     answer.question_id = question_id
     answer.user_answer = user_answer
     answer.score = score
-    answer.feedback = feedback
+    answer.set_feedback(scoring_result)
+    answer.scoring_mode = scoring_mode
+    answer.set_components(scoring_result.get('components'))
     db.session.add(answer)
+    db.session.flush()
+    
+    # Index the answer for copy detection
+    similarity_index.add(answer.id, question_id, user_answer)
+    
+    # Update the student's concept mastery row
+    mastery_tracker.record(current_user.id, scoring_result.get('components'))
     
     # Update user statistics
     current_user.questions_attempted += 1
     current_user.total_score += score
-    if score >= 70:  # Consider 70+ as correct
+    if score >= CORRECT_THRESHOLD:
         current_user.questions_correct += 1
     
     db.session.commit()
@@ -411,6 +315,129 @@ def submit_answer():
                          score=score,
                          feedback=feedback)
 
+def submit_choice_answer(question, user_answer):
+    """Grade and store a multiple-choice answer without the NLP scorer, cache or queue"""
+    result = grade_choice(user_answer, question['correct_choice'])
+    
+    # Not indexed for copy detection or concept mastery: a chosen letter is neither
+    
+    answer = Answer()
+    answer.user_id = current_user.id
+    answer.question_id = question['id']
+    answer.user_answer = user_answer
+    answer.score = result['score']
+    answer.set_feedback(result)
+    answer.scoring_mode = result['scoring_mode']
+    db.session.add(answer)
+    
+    current_user.questions_attempted += 1
+    current_user.total_score += result['score']
+    if result['score'] >= CORRECT_THRESHOLD:
+        current_user.questions_correct += 1
+    
+    db.session.commit()
+    session.pop('current_question_id', None)
+    
+    return render_template('result.html',
+                         question=question,
+                         user_answer=user_answer,
+                         score=result['score'],
+                         feedback=result['feedback'])
+
+@app.route('/student/result/<int:answer_id>')
+@require_login
+def answer_result(answer_id):
+    """Show the result of a submitted answer, or a pending page while it is being scored"""
+    answer = Answer.query.get_or_404(answer_id)
+    if answer.user_id != str(current_user.id) and current_user.role != 'admin':
+        abort(403)
+    
+    pending = answer.status == 'pending'
+    if pending:
+        scoring_queue.requeue_if_stale(answer)
+    
+    return render_template('result.html',
+                         question=get_question_by_id_from_db(answer.question_id),
+                         user_answer=answer.user_answer,
+                         score=answer.score,
+                         feedback=answer.feedback,
+                         pending=pending,
+                         answer_id=answer.id)
+
+@app.route('/api/answers/<int:answer_id>/status')
+@require_login
+def answer_status(answer_id):
+    """API endpoint polled by the pending result page"""
+    from flask import jsonify
+    answer = Answer.query.get_or_404(answer_id)
+    if answer.user_id != str(current_user.id) and current_user.role != 'admin':
+        abort(403)
+    
+    if answer.status == 'pending':
+        scoring_queue.requeue_if_stale(answer)
+        return jsonify({'status': 'pending'})
+    
+    # 'scored', or 'failed' when the answer could not be scored
+    return jsonify({'status': answer.status or 'scored', 'score': answer.score, 'feedback': answer.feedback})
+
+@app.route('/api/score/preview', methods=['POST'])
+@require_login
+def score_preview():
+    """API endpoint called while a student types: estimated score and feedback for the current draft"""
+    from flask import jsonify
+    retry_after = scoring_client.preview_retry_after(current_user.id)
+    if retry_after:
+        response = jsonify({'error': 'Too many preview requests', 'retry_after': round(retry_after, 2)})
+        response.headers['Retry-After'] = str(int(retry_after) + 1)
+        return response, 429
+    
+    payload = request.get_json(silent=True) or {}
+    draft = payload.get('answer')
+    if not isinstance(draft, str):
+        return jsonify({'error': 'Expected an "answer" text'}), 400
+    
+    if len(draft) > MAX_ANSWER_CHARS:
+        return jsonify({'error': f'Answers must be at most {MAX_ANSWER_CHARS} characters'}), 400
+    
+    question_id = session.get('current_question_id')
+    if not question_id:
+        return jsonify({'error': 'No question in progress'}), 400
+    
+    # Not stored, cached or counted: previews are scored from the daemon's cached question features
+    result = scoring_client.preview(current_user.id, question_id, draft)
+    if result is None:
+        return jsonify({'error': 'No preview is available for this question'}), 404
+    return jsonify(result)
+
+@app.route('/api/score/batch', methods=['POST'])
+@require_admin
+def score_batch():
+    """API endpoint to score many typed-up answers in one vectorized pass"""
+    from flask import jsonify
+    payload = request.get_json(silent=True) or {}
+    entries = payload.get('answers')
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'Expected a non-empty "answers" list'}), 400
+    
+    if len(entries) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} answers can be scored per request'}), 400
+    
+    items = []
+    for entry in entries:
+        try:
+            items.append((int(entry['question_id']), str(entry.get('answer', ''))))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({'error': 'Each answer needs a numeric "question_id" and an "answer" text'}), 400
+    
+    too_long = [index for index, (_, answer) in enumerate(items) if len(answer) > MAX_ANSWER_CHARS]
+    if too_long:
+        return jsonify({'error': f'Answers must be at most {MAX_ANSWER_CHARS} characters',
+                        'indexes': too_long[:100]}), 400
+    
+    results = scoring_client.batch_score(items)
+    return jsonify({'results': results, 'count': len(results)})
+
 @app.route('/admin/dashboard')
 @require_admin
 def admin_dashboard():
@@ -447,7 +474,7 @@ def admin_dashboard():
         }
     
     # Get recent answers for monitoring
-    recent_answers = Answer.query.order_by(Answer.created_at.desc()).limit(10).all()
+    recent_answers = get_recent_answers_from_db(10)
     
     # Get user statistics
     total_users = User.query.count()
@@ -470,25 +497,133 @@ def edit_question(question_id):
     question = Question.query.get_or_404(question_id)
     
     if request.method == 'POST':
+        previous_model_answer = question.model_answer
+        previous_difficulty = question.difficulty
+        previous_correct_choice = question.correct_choice
+        previous_question_type = question.question_type
+        
         # Update question with form data
         question.subject = request.form.get('subject', question.subject)
         question.topic = request.form.get('topic', question.topic)
         question.question_text = request.form.get('question_text', question.question_text)
         question.model_answer = request.form.get('model_answer', question.model_answer)
         question.difficulty = request.form.get('difficulty', question.difficulty)
+        question.question_type = request.form.get('question_type', question.question_type)
+        
+        references_changed = False
+        if 'reference_answers' in request.form:
+            references_changed = replace_reference_answers(
+                question, parse_reference_answers(request.form.get('reference_answers')))
+        
+        if 'choice_options' in request.form:
+            update_choices(question, request.form.get('choice_options'), request.form.get('correct_choice'))
+        grading_changed = (question.correct_choice != previous_correct_choice or
+                           (question.question_type or 'general') != (previous_question_type or 'general'))
+        
+        # Cached scores for the old question can never be hit again (the edit also changes the
+        # corpus version, which flushes every other question's cached scores on the next lookup)
+        score_cache.purge_question(question_id)
         
         try:
             db.session.commit()
+            scoring_client.invalidate()
             flash(f'Question #{question_id} has been updated successfully.', 'success')
+            
+            # Existing answers were scored against the old model answer
+            answer_count = Answer.query.filter_by(question_id=question_id).count()
+            answers_stale = (question.model_answer != previous_model_answer or references_changed or
+                             question.difficulty != previous_difficulty or grading_changed)
+            if answers_stale and answer_count:
+                job_id = scoring_client.regrade(question_id)
+                flash(f'Re-grading {answer_count} existing answers in the background (job #{job_id}).', 'info')
             return redirect(url_for('admin_dashboard'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating question: {str(e)}', 'error')
     
+    reference_answers_text = '\n---\n'.join(reference.answer_text for reference in question.reference_answers)
+    choice_options_text = '\n'.join(f'{letter}) {text}' for letter, text in question.choices().items())
     return render_template('admin_edit_question.html', 
                          question=question, 
+                         reference_answers_text=reference_answers_text,
+                         choice_options_text=choice_options_text,
                          subjects=get_all_subjects_from_db())
 
+@app.route('/admin/question/<int:question_id>/simulate', methods=['POST'])
+@require_admin
+def simulate_question(question_id):
+    """What-if API for the edit page: old vs new score distribution of the question's answers under a draft"""
+    from flask import jsonify
+    question = Question.query.get_or_404(question_id)
+    payload = request.get_json(silent=True) or {}
+    
+    model_answer = payload.get('model_answer')
+    if not isinstance(model_answer, str):
+        return jsonify({'error': 'Expected a "model_answer" text'}), 400
+    
+    difficulty = payload.get('difficulty') or question.difficulty
+    if difficulty not in ('easy', 'medium', 'hard'):
+        return jsonify({'error': 'Difficulty must be easy, medium or hard'}), 400
+    
+    # A draft switching to or from 'calculation' changes how the answers are graded
+    question_type = payload.get('question_type') or question.question_type
+    if question_type is not None and not isinstance(question_type, str):
+        return jsonify({'error': 'Expected a "question_type" text'}), 400
+    
+    if payload.get('correct_choice', question.correct_choice):
+        return jsonify({'error': 'Multiple-choice answers are graded by option letter, not the model answer'}), 400
+    
+    reference_answers = None
+    if isinstance(payload.get('reference_answers'), str):
+        reference_answers = parse_reference_answers(payload['reference_answers'])
+    
+    # Scored and discarded: nothing is stored, cached or re-graded
+    try:
+        result = scoring_client.simulate(question_id, model_answer, difficulty, reference_answers, question_type)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/score/cache-stats')
+@require_admin
+def score_cache_stats():
+    """API endpoint reporting score cache hit/miss statistics for this worker"""
+    from flask import jsonify
+    return jsonify(score_cache.stats())
+
+@app.route('/api/answers/<int:answer_id>/similar')
+@require_admin
+def similar_answers(answer_id):
+    """API endpoint listing answers to the same question that look copied from this one"""
+    from flask import jsonify
+    Answer.query.get_or_404(answer_id)
+    threshold = request.args.get('threshold', type=float)
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    return jsonify({
+        'answer_id': answer_id,
+        'similar': similarity_index.similar(answer_id, threshold=threshold, limit=limit)
+    })
+
+@app.route('/admin/question/<int:question_id>/similar-answers')
+@require_admin
+def answer_clusters(question_id):
+    """Report of clusters of near-identical answers to a question"""
+    question = Question.query.get_or_404(question_id)
+    threshold = request.args.get('threshold', type=float)
+    clusters = similarity_index.clusters(question_id, threshold=threshold)
+    return render_template('admin_answer_clusters.html',
+                         question=question,
+                         clusters=clusters,
+                         threshold=threshold if threshold is not None else DUPLICATE_THRESHOLD)
+
+@app.route('/api/regrade/<int:job_id>')
+@require_admin
+def regrade_status(job_id):
+    """API endpoint reporting progress of a background re-grading job"""
+    from flask import jsonify
+    job = RegradeJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
 @app.route('/admin/question/<int:question_id>/delete', methods=['POST'])
 @require_admin
 def delete_question(question_id):
@@ -496,12 +631,17 @@ def delete_question(question_id):
     question = Question.query.get_or_404(question_id)
     
     try:
-        # Delete associated answers first
+        # Delete associated answers and re-grading jobs first
+        similarity_index.remove_question(question_id)
         Answer.query.filter_by(question_id=question_id).delete()
+        RegradeJob.query.filter_by(question_id=question_id).delete()
+        ReferenceAnswer.query.filter_by(question_id=question_id).delete()
+        score_cache.purge_question(question_id)
         
         # Delete the question
         db.session.delete(question)
         db.session.commit()
+        scoring_client.invalidate()
         
         flash(f'Question #{question_id} has been deleted successfully.', 'success')
     except Exception as e:
@@ -601,8 +741,13 @@ def review_extracted_questions():
         flash('No questions to review. Please upload an exam paper first.', 'warning')
         return redirect(url_for('admin_dashboard'))
     
+    # Option letters as saving reads them, so the correct-option select offers exactly those
+    choice_options = {question['id']: parse_choice_options(question.get('multiple_choice_options') or [])
+                      for question in questions}
+    
     return render_template('admin_review_questions.html', 
                          questions=questions, 
+                         choice_options=choice_options,
                          metadata=metadata,
                          subjects=get_all_subjects())
 
@@ -642,7 +787,8 @@ def save_extracted_questions():
                     'complexity': request.form.get(f'complexity_{question_id}', question['complexity']),
                     'course': request.form.get(f'course_{question_id}', question['course']),
                     'topic': request.form.get(f'topic_{question_id}', question['topic']),
-                    'marks': int(request.form.get(f'marks_{question_id}', question['marks']))
+                    'marks': int(request.form.get(f'marks_{question_id}', question['marks'])),
+                    'correct_choice': request.form.get(f'correct_choice_{question_id}', '')
                 }
         
         # Save selected questions
@@ -700,10 +846,15 @@ def add_question():
         question.question_text = request.form.get('question_text')
         question.model_answer = request.form.get('model_answer')
         question.difficulty = request.form.get('difficulty')
+        question.question_type = request.form.get('question_type')
+        update_choices(question, request.form.get('choice_options'), request.form.get('correct_choice'))
         
         try:
             db.session.add(question)
+            db.session.flush()
+            replace_reference_answers(question, parse_reference_answers(request.form.get('reference_answers')))
             db.session.commit()
+            scoring_client.invalidate()
             flash(f'Question added successfully with ID #{question.id}.', 'success')
             return redirect(url_for('admin_dashboard'))
         except Exception as e:
@@ -732,7 +883,7 @@ def admin_analytics():
     # Answer statistics
     total_answers = Answer.query.count()
     avg_score = db.session.query(db.func.avg(Answer.score)).scalar() or 0
-    recent_activity = Answer.query.order_by(Answer.created_at.desc()).limit(20).all()
+    recent_activity = get_recent_answers_from_db(20)
     
     # Performance trends - simplified approach
     score_distribution = []
@@ -751,6 +902,17 @@ def admin_analytics():
             ('Below 60', score_below_60)
         ]
     
+    # Answers too long to score in full (only a bounded sample was assessed)
+    degraded_answers = Answer.query.filter(Answer.scoring_mode == 'degraded').count()
+    degraded_share = round(degraded_answers * 100.0 / total_answers, 2) if total_answers else 0
+    
+    # Average score components, aggregated from the values stored with each answer
+    averages = db.session.query(db.func.avg(Answer.similarity), db.func.avg(Answer.coverage),
+                                db.func.avg(Answer.quality)).one()
+    component_averages = [(label, round(value / 10, 1))
+                          for label, value in zip(('Similarity', 'Concept coverage', 'Quality'), averages)
+                          if value is not None]
+    
     return render_template('admin_analytics_simple.html',
                          total_questions=total_questions,
                          questions_by_subject=questions_by_subject,
@@ -761,7 +923,10 @@ def admin_analytics():
                          total_answers=total_answers,
                          avg_score=round(avg_score, 1),
                          recent_activity=recent_activity,
-                         score_distribution=score_distribution)
+                         score_distribution=score_distribution,
+                         degraded_answers=degraded_answers,
+                         degraded_share=degraded_share,
+                         component_averages=component_averages)
 
 @app.route('/admin/export')
 @require_admin
@@ -835,7 +1000,8 @@ def export_questions(format_type='csv'):
 
 def export_answers(format_type='csv'):
     """Export answers and performance data"""
-    answers = Answer.query.join(User).join(Question).all()
+    answers = Answer.query.join(User).join(Question).options(
+        db.contains_eager(Answer.user), db.contains_eager(Answer.question)).all()
     
     if format_type == 'csv':
         from flask import make_response
@@ -846,10 +1012,12 @@ def export_answers(format_type='csv'):
         writer = csv.writer(output)
         
         # Write headers
-        writer.writerow(['Answer ID', 'Student Name', 'Question ID', 'Subject', 'Topic', 'User Answer', 'Score', 'Feedback', 'Date'])
+        writer.writerow(['Answer ID', 'Student Name', 'Question ID', 'Subject', 'Topic', 'User Answer', 'Score', 'Feedback',
+                         'Similarity', 'Coverage', 'Quality', 'Matched Concepts', 'Missed Concepts', 'Date'])
         
         # Write data
         for a in answers:
+            components = a.components() or {}
             writer.writerow([
                 a.id,
                 a.user.username,
@@ -859,6 +1027,11 @@ def export_answers(format_type='csv'):
                 a.user_answer,
                 a.score,
                 a.feedback,
+                components.get('similarity', ''),
+                components.get('coverage', ''),
+                components.get('quality', ''),
+                ' '.join(components.get('matched', [])),
+                ' '.join(components.get('missed', [])),
                 a.created_at.strftime('%Y-%m-%d %H:%M:%S') if a.created_at else ''
             ])
         
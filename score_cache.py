@@ -0,0 +1,181 @@
+"""
+Score Cache Module
+Content-addressed memoization of scoring results so repeated answers skip
+intelligent_ai_score: an in-process LRU backed by a database table shared by
+every worker and kept across restarts. Keys include the corpus version, so a
+refitted bank or a different backend never reuses old scores; stored results of
+older corpus versions are flushed when a worker first sees a new one
+"""
+
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
+from models import ReferenceAnswer, ScoreCacheEntry, db
+from text_cleaning import clean_text
+from feedback_phrases import encode_feedback, render_feedback
+from scoring_client import scoring_client
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the scoring rules change, so results computed under older rules are not reused
+SCORING_RULES_VERSION = '7'
+
+def model_version(model_answer, question_difficulty='medium', reference_answers=(), corpus_version=''):
+    """
+    Short hash identifying what a score was computed against: the model answer, alternatives
+    and difficulty, the scoring rules and the corpus version of the fitted bank
+    """
+    digest = hashlib.sha1('\0'.join([SCORING_RULES_VERSION, corpus_version or '', question_difficulty or '',
+                                     model_answer] + list(reference_answers)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+class ScoreCache:
+    """Two-level cache of scoring results keyed by question, model version and cleaned answer"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._corpus_version = None  # last corpus version this worker saw
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def make_key(self, question_id, version, user_answer):
+        """Cache key for one answer; answers that clean to the same text share it"""
+        normalized = clean_text(user_answer)
+        return hashlib.sha256(f'{question_id}\0{version}\0{normalized}'.encode('utf-8')).hexdigest()
+
+    def score(self, user_answer, model_answer, question_difficulty='medium', question_id=None):
+        """Drop-in replacement for intelligent_ai_score that reuses earlier results"""
+        if question_id is None:
+            return scoring_client.score(user_answer, model_answer, question_difficulty)
+
+        # Read from the table rather than the scoring model, which may live in the scoring daemon
+        reference_answers = [text for (text,) in db.session.query(ReferenceAnswer.answer_text).
+                             filter(ReferenceAnswer.question_id == question_id).order_by(ReferenceAnswer.id)
+                             if clean_text(text)]
+        corpus_version = scoring_client.corpus_version()
+        self._check_corpus(corpus_version)
+        version = model_version(model_answer, question_difficulty, reference_answers, corpus_version)
+        key = self.make_key(question_id, version, user_answer)
+
+        result = self._lookup(key)
+        if result is not None:
+            return result
+
+        with self._lock:
+            self.misses += 1
+
+        result = scoring_client.score(user_answer, model_answer, question_difficulty, question_id=question_id)
+        # Multiple-choice and calculation grades are cheaper to recompute than to look up
+        if not result.get('fallback') and result.get('scoring_mode') not in ('choice', 'calculation'):
+            self._store(key, question_id, version, corpus_version, result)
+        return result
+
+    def _check_corpus(self, corpus_version):
+        """On a new corpus version, drop this worker's LRU and every stored result of other versions"""
+        with self._lock:
+            if corpus_version == self._corpus_version:
+                return
+            self._corpus_version = corpus_version
+            self._entries.clear()
+
+        try:
+            with db.engine.begin() as connection:
+                flushed = connection.execute(db.delete(ScoreCacheEntry).where(db.or_(
+                    ScoreCacheEntry.corpus_version.is_(None),
+                    ScoreCacheEntry.corpus_version != corpus_version
+                ))).rowcount
+            if flushed:
+                logger.info(f"Flushed {flushed} cached scores of older corpus versions")
+        except Exception as e:
+            logger.error(f"Error flushing score cache: {e}")
+
+    def _lookup(self, key):
+        """Check the LRU first, then the shared table"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return dict(result)
+
+        try:
+            entry = db.session.get(ScoreCacheEntry, key)
+        except Exception as e:
+            logger.error(f"Error reading score cache: {e}")
+            return None
+
+        if entry is None:
+            return None
+
+        feedback_codes = json.loads(entry.feedback_codes) if entry.feedback_codes else None
+        result = {'score': entry.score,
+                  'feedback': render_feedback(feedback_codes) if feedback_codes else entry.feedback,
+                  'feedback_codes': feedback_codes, 'scoring_mode': entry.scoring_mode or 'full',
+                  'components': json.loads(entry.components) if entry.components else None}
+        with self._lock:
+            self.db_hits += 1
+            self._remember(key, result)
+        return dict(result)
+
+    def _store(self, key, question_id, version, corpus_version, result):
+        """Remember a fresh result in the LRU and the shared table"""
+        result = {'score': result['score'], 'feedback': result['feedback'],
+                  'feedback_codes': result.get('feedback_codes'), 'scoring_mode': result.get('scoring_mode', 'full'),
+                  'components': result.get('components')}
+        with self._lock:
+            self._remember(key, result)
+
+        # Own connection and transaction, so the caller's session is never rolled back
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(db.insert(ScoreCacheEntry).values(
+                    key=key,
+                    question_id=question_id,
+                    model_version=version,
+                    corpus_version=corpus_version,
+                    score=result['score'],
+                    feedback='' if result['feedback_codes'] else result['feedback'],
+                    feedback_codes=encode_feedback(result['feedback_codes']) if result['feedback_codes'] else None,
+                    scoring_mode=result['scoring_mode'],
+                    components=json.dumps(result['components'], separators=(',', ':'))
+                    if result['components'] else None
+                ))
+        except IntegrityError:
+            pass  # Another worker stored the same answer first
+        except Exception as e:
+            logger.error(f"Error writing score cache: {e}")
+
+    def _remember(self, key, result):
+        """Insert into the LRU, evicting the least recently used entry (lock held)"""
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge_question(self, question_id):
+        """Drop stored results for a question (joins the caller's transaction)"""
+        ScoreCacheEntry.query.filter(ScoreCacheEntry.question_id == question_id).delete(synchronize_session=False)
+
+    def stats(self):
+        """Hit/miss statistics for this worker plus the size of the shared table"""
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            stats = {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) * 100.0 / lookups, 1) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'max_memory_entries': self.max_entries
+            }
+        stats['stored_entries'] = ScoreCacheEntry.query.count()
+        return stats
+
+# Initialize shared score cache
+score_cache = ScoreCache()
@@ -0,0 +1,73 @@
+"""
+Score Simulator Module
+What-if rescoring for admins editing a question: every stored answer to the
+question is scored against a draft model answer in one vectorized batch and
+the old and new score distributions are compared. Nothing is written - the
+draft corpus snapshot and the new scores are discarded afterwards.
+"""
+
+import time
+import numpy as np
+from models import Answer, db
+from scoring_constants import CORRECT_THRESHOLD
+from answer_scorer import batch_intelligent_ai_score, clean_text, scoring_model
+
+# Score bands shown side by side, as on the analytics page: (label, lowest score, highest score)
+SCORE_BANDS = [('90-100', 90, 100), ('80-89', 80, 89), ('70-79', 70, 79), ('60-69', 60, 69), ('Below 60', 0, 59)]
+
+# Answers with the largest score change listed in the result
+LARGEST_CHANGES_SHOWN = 5
+
+def _summary(scores):
+    return {
+        'mean': round(float(scores.mean()), 1),
+        'median': float(np.median(scores)),
+        'correct': int((scores >= CORRECT_THRESHOLD).sum())
+    }
+
+def simulate_model_answer(question_id, model_answer, difficulty=None, reference_answers=None, question_type=None):
+    """
+    Old vs new scores of a question's answers if its model answer (and optionally difficulty, type and
+    alternative answers) were replaced by a draft. Raises ValueError for a draft that cannot be scored.
+    """
+    if not clean_text(model_answer):
+        raise ValueError('The draft model answer has no words to score against')
+
+    start = time.perf_counter()
+    rows = db.session.query(Answer.id, Answer.user_answer, Answer.score).\
+           filter(Answer.question_id == question_id).\
+           filter(db.or_(Answer.status.is_(None), Answer.status != 'pending')).\
+           order_by(Answer.id).all()
+
+    result = {'answers': len(rows)}
+    if not rows:
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    corpus = scoring_model.what_if_corpus(question_id, model_answer, difficulty, reference_answers, question_type)
+    if question_id not in corpus.reference_rows:
+        raise ValueError('The question is not in the scoring bank')
+    scored = batch_intelligent_ai_score([(question_id, user_answer) for _, user_answer, _ in rows], corpus,
+                                        with_feedback=False)
+
+    answer_ids = np.array([answer_id for answer_id, _, _ in rows])
+    old = np.array([score for _, _, score in rows])
+    new = np.array([item['score'] for item in scored])
+    delta = new - old
+
+    largest = np.argsort(-np.abs(delta), kind='stable')[:LARGEST_CHANGES_SHOWN]
+    result.update({
+        'old': _summary(old),
+        'new': _summary(new),
+        'distribution': [{'range': label,
+                          'old': int(((old >= low) & (old <= high)).sum()),
+                          'new': int(((new >= low) & (new <= high)).sum())}
+                         for label, low, high in SCORE_BANDS],
+        'raised': int((delta > 0).sum()),
+        'lowered': int((delta < 0).sum()),
+        'unchanged': int((delta == 0).sum()),
+        'largest_changes': [{'answer_id': int(answer_ids[index]), 'old': int(old[index]), 'new': int(new[index])}
+                            for index in largest if delta[index] != 0],
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+    })
+    return result
@@ -0,0 +1,167 @@
+"""
+Scoring Client Module
+Thin client the web workers use for everything that needs the fitted scoring
+model: scores, previews, what-if simulations, re-grading jobs and concept
+lookups are sent to the scoring daemon (scoring_daemon.py) over its Unix
+socket. Only the standard library is imported here; the scorer and its
+dependencies are loaded in-process solely as the fallback, when SCORING_SOCKET
+is unset or the daemon cannot be reached.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Unix socket the daemon listens on; unset means every worker scores in-process
+SCORING_SOCKET = os.environ.get('SCORING_SOCKET')
+
+# Seconds a worker waits for the daemon before scoring in-process instead
+SCORING_SOCKET_TIMEOUT = float(os.environ.get('SCORING_SOCKET_TIMEOUT', 10))
+
+# After a failed request, workers skip the daemon for this long
+RETRY_AFTER_SECONDS = 30
+
+# Seconds a worker reuses the corpus version before asking again (the model's own check interval)
+CORPUS_VERSION_TTL = 5.0
+
+# Longest answer (characters) accepted for scoring at all
+MAX_ANSWER_CHARS = int(os.environ.get('MAX_ANSWER_CHARS', 100000))
+
+# Returned by _request when the daemon did not answer
+_UNAVAILABLE = object()
+
+class ScoringClient:
+    """Sends scoring work to the daemon; falls back to in-process scoring"""
+
+    def __init__(self, socket_path=SCORING_SOCKET, timeout=SCORING_SOCKET_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._retry_at = 0.0
+        self._corpus_version = None
+        self._corpus_version_expires = 0.0
+
+    def score(self, user_answer, model_answer, question_difficulty='medium', question_id=None):
+        """Drop-in replacement for intelligent_ai_score"""
+        result = self._result({'op': 'score', 'user_answer': user_answer, 'model_answer': model_answer,
+                                'question_difficulty': question_difficulty, 'question_id': question_id})
+        if result is _UNAVAILABLE:
+            from answer_scorer import intelligent_ai_score
+            result = intelligent_ai_score(user_answer, model_answer, question_difficulty, question_id=question_id)
+        return result
+
+    def batch_score(self, items):
+        """Drop-in replacement for batch_intelligent_ai_score"""
+        result = self._result({'op': 'batch', 'items': [list(item) for item in items]})
+        if result is _UNAVAILABLE:
+            from answer_scorer import batch_intelligent_ai_score
+            result = batch_intelligent_ai_score(items)
+        return result
+
+    def corpus_version(self):
+        """Version of the fitted bank that scores depend on (see ScoringModel.corpus_version)"""
+        now = time.monotonic()
+        if self._corpus_version is None or now >= self._corpus_version_expires:
+            version = self._result({'op': 'corpus_version'})
+            if version is _UNAVAILABLE:
+                from answer_scorer import scoring_model
+                version = scoring_model.corpus_version()
+            self._corpus_version = version
+            self._corpus_version_expires = now + CORPUS_VERSION_TTL
+        return self._corpus_version
+
+    def invalidate(self):
+        """Make the daemon (and this worker's model, if it was ever loaded) refit on the next lookup"""
+        self._corpus_version = None
+        self._request({'op': 'invalidate'})
+        # Loaded only if this worker has scored in-process; nothing to refit otherwise
+        answer_scorer = sys.modules.get('answer_scorer')
+        if answer_scorer is not None:
+            answer_scorer.scoring_model.invalidate()
+
+    def question_concepts(self, question_ids):
+        """Model-answer concepts of each question in the bank: {question_id: set}"""
+        result = self._result({'op': 'question_concepts', 'question_ids': list(question_ids)})
+        if result is not _UNAVAILABLE:
+            return {int(question_id): set(concepts) for question_id, concepts in result.items()}
+
+        from answer_scorer import scoring_model
+        concepts = {}
+        for question_id in question_ids:
+            features = scoring_model.get_features(question_id)
+            if features is not None:
+                concepts[question_id] = features.concepts
+        return concepts
+
+    def preview_retry_after(self, user_id):
+        """Seconds the student must still wait before another preview; 0 records a preview now"""
+        result = self._result({'op': 'preview_retry_after', 'user_id': user_id})
+        if result is _UNAVAILABLE:
+            from answer_preview import answer_previewer
+            result = answer_previewer.retry_after(user_id)
+        return result
+
+    def preview(self, user_id, question_id, draft):
+        """Score preview of a draft: {'score', 'feedback'}, or None when the question has no preview"""
+        result = self._request({'op': 'preview', 'user_id': user_id, 'question_id': question_id, 'draft': draft})
+        if result is _UNAVAILABLE:
+            from answer_preview import answer_previewer
+            result = answer_previewer.preview(user_id, question_id, draft)
+        return result
+
+    def simulate(self, question_id, model_answer, difficulty=None, reference_answers=None, question_type=None):
+        """simulate_model_answer in the daemon; raises ValueError for a draft that cannot be scored"""
+        result = self._result({'op': 'simulate', 'question_id': question_id, 'model_answer': model_answer,
+                                'difficulty': difficulty, 'reference_answers': reference_answers,
+                                'question_type': question_type})
+        if result is _UNAVAILABLE:
+            from score_simulator import simulate_model_answer
+            result = simulate_model_answer(question_id, model_answer, difficulty, reference_answers, question_type)
+        return result
+
+    def regrade(self, question_id):
+        """Start a background re-grading job for a question; returns the job id"""
+        result = self._result({'op': 'regrade', 'question_id': question_id})
+        if result is _UNAVAILABLE:
+            from regrader import regrader
+            result = regrader.start(question_id).id
+        return result
+
+    def _request(self, payload):
+        """
+        Send one request to the daemon and return its result; _UNAVAILABLE means do the work
+        in-process instead. A ValueError raised in the daemon is raised here as well.
+        """
+        if not self.socket_path or time.monotonic() < self._retry_at:
+            return _UNAVAILABLE
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(self.timeout)
+                connection.connect(self.socket_path)
+                connection.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+                with connection.makefile('rb') as stream:
+                    response = json.loads(stream.readline())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Scoring daemon unavailable ({e}); scoring in-process for {RETRY_AFTER_SECONDS}s")
+            self._retry_at = time.monotonic() + RETRY_AFTER_SECONDS
+            return _UNAVAILABLE
+
+        if response.get('invalid'):
+            raise ValueError(response['error'])
+        if 'error' in response:
+            logger.error(f"Scoring daemon error: {response['error']}")
+            return _UNAVAILABLE
+        return response['result']
+
+    def _result(self, payload):
+        """_request for operations that always produce a result: a None result also means do it in-process"""
+        result = self._request(payload)
+        return _UNAVAILABLE if result is None else result
+
+# Initialize shared scoring client
+scoring_client = ScoringClient()
@@ -0,0 +1,9 @@
+"""
+Scoring Constants Module
+Values shared by every path that scores answers or keeps score statistics -
+live submissions, the scoring queue, re-grading, bulk grading and what-if
+simulation - so they always agree
+"""
+
+# Score at or above which an answer counts as correct (User.questions_correct)
+CORRECT_THRESHOLD = 70
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Scoring Daemon Module
+Optional local process that holds the scoring model and serves scoring
+requests to the web workers over a Unix domain socket, so the fitted corpus
+is built and kept in memory once instead of once per gunicorn worker.
+Concurrent score requests are grouped into batches and scored with
+batch_intelligent_ai_score.
+
+Previews, what-if simulations, re-grading jobs and concept lookups run here
+too, so web workers never load the scorer. Workers talk to the daemon through
+scoring_client.py, which does the work in-process only when SCORING_SOCKET is
+unset or the daemon cannot be reached.
+
+Usage: SCORING_SOCKET=/run/intellitutor/scoring.sock python scoring_daemon.py
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import socketserver
+from answer_scorer import batch_intelligent_ai_score, intelligent_ai_score, scoring_model
+from answer_preview import answer_previewer
+from score_simulator import simulate_model_answer
+from scoring_client import SCORING_SOCKET
+
+logger = logging.getLogger(__name__)
+
+# Requests arriving within this window are scored together, up to MAX_BATCH requests
+BATCH_WINDOW_SECONDS = 0.005
+MAX_BATCH = 64
+
+class InvalidRequest(Exception):
+    """A request the client must reject (e.g. an unscorable draft), not a daemon failure"""
+
+class _PendingScore:
+    """A score request waiting for its batch"""
+
+    def __init__(self, request):
+        self.request = request
+        self.result = None
+        self.done = threading.Event()
+
+class ScoringDaemon:
+    """Serves scoring requests over a Unix socket, batching concurrent score requests"""
+
+    def __init__(self, socket_path, batch_window=BATCH_WINDOW_SECONDS, max_batch=MAX_BATCH):
+        self.socket_path = socket_path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+
+    def serve_forever(self):
+        from app import app
+        self.app = app
+
+        with app.app_context():
+            scoring_model.get_corpus()  # fit before accepting requests
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # left behind by a previous run
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # One JSON request per line; a connection may send several
+                for line in self.rfile:
+                    try:
+                        response = {'result': daemon.dispatch(json.loads(line))}
+                    except InvalidRequest as e:
+                        response = {'error': str(e), 'invalid': True}
+                    except Exception as e:
+                        logger.error(f"Error handling scoring request: {e}")
+                        response = {'error': str(e)}
+                    self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 256  # every gunicorn worker thread may connect at once
+
+        server = Server(self.socket_path, Handler)
+        threading.Thread(target=self._batch_loop, daemon=True, name='scoring-batcher').start()
+        logger.info(f"Scoring daemon listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def dispatch(self, request):
+        """Run one request; score requests wait for the batcher, the rest run directly"""
+        op = request.get('op')
+        if op == 'score':
+            pending = _PendingScore(request)
+            self._queue.put(pending)
+            pending.done.wait()
+            if pending.result is None:
+                raise RuntimeError('Scoring failed')  # an error reply: the worker scores in-process
+            return pending.result
+
+        with self.app.app_context():
+            if op == 'batch':
+                items = [(question_id, answer) for question_id, answer in request['items']]
+                return batch_intelligent_ai_score(items)
+            if op == 'question_concepts':
+                corpus = scoring_model.get_corpus()
+                features = corpus.features if corpus is not None else {}
+                return {str(question_id): sorted(features[question_id].concepts)
+                        for question_id in request['question_ids'] if question_id in features}
+            if op == 'corpus_version':
+                return scoring_model.corpus_version()
+            if op == 'invalidate':
+                scoring_model.invalidate()
+                return None
+            if op == 'preview_retry_after':
+                return answer_previewer.retry_after(request['user_id'])
+            if op == 'preview':
+                return answer_previewer.preview(request['user_id'], request['question_id'], request['draft'])
+            if op == 'simulate':
+                try:
+                    return simulate_model_answer(request['question_id'], request['model_answer'],
+                                                 request.get('difficulty'), request.get('reference_answers'),
+                                                 request.get('question_type'))
+                except ValueError as e:
+                    raise InvalidRequest(str(e)) from e
+            if op == 'regrade':
+                from regrader import regrader
+                return regrader.start(request['question_id']).id
+            if op == 'ping':
+                return 'pong'
+        raise LookupError(f"Unknown operation '{op}'")
+
+    def _batch_loop(self):
+        """Collect score requests for up to batch_window seconds and score them together"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self.app.app_context():
+                try:
+                    self._score_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error scoring batch of {len(batch)}: {e}")
+                    self._score_each(batch)
+                finally:
+                    for pending in batch:
+                        pending.done.set()
+
+    def _score_each(self, batch):
+        """Score one request at a time (intelligent_ai_score has its own fallback); after a failed batch"""
+        for pending in batch:
+            if pending.result is not None:
+                continue
+            request = pending.request
+            try:
+                pending.result = intelligent_ai_score(request['user_answer'], request['model_answer'],
+                                                      request.get('question_difficulty', 'medium'),
+                                                      question_id=request.get('question_id'))
+            except Exception as e:
+                logger.error(f"Error scoring request for question {request.get('question_id')}: {e}")
+
+    def _score_batch(self, batch):
+        """Vectorized scoring for requests matching the bank; the rest one at a time as in-process"""
+        corpus = scoring_model.get_corpus()
+        batched = []
+        for pending in batch:
+            request = pending.request
+            features = corpus.features.get(request.get('question_id')) if corpus is not None else None
+            # The batch path scores against the bank's current model answer and difficulty
+            if (features is not None and features.model_answer == request['model_answer']
+                    and features.difficulty == (request.get('question_difficulty') or 'medium')):
+                batched.append(pending)
+            else:
+                pending.result = intelligent_ai_score(request['user_answer'], request['model_answer'],
+                                                      request.get('question_difficulty', 'medium'),
+                                                      question_id=request.get('question_id'))
+
+        if batched:
+            results = batch_intelligent_ai_score(
+                [(pending.request['question_id'], pending.request['user_answer']) for pending in batched], corpus)
+            for pending, result in zip(batched, results):
+                result.pop('question_id', None)
+                pending.result = result
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve answer scoring to the web workers over a Unix socket')
+    parser.add_argument('--socket', default=SCORING_SOCKET or 'instance/scoring.sock', help='socket path')
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW_SECONDS * 1000,
+                        help='how long to wait for more requests before scoring a batch')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='most requests scored together')
+    args = parser.parse_args()
+
+    ScoringDaemon(args.socket, batch_window=args.batch_window_ms / 1000, max_batch=args.max_batch).serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Asynchronous Scoring Module
+Scores submitted answers in a local process pool (or threads waiting on the
+scoring daemon) so submit_answer only has to store the pending answer and return
+"""
+
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import app
+from models import Answer, Question, User, db
+from scoring_constants import CORRECT_THRESHOLD
+from data_store import get_question_by_id
+from score_cache import score_cache
+from scoring_client import scoring_client
+from concept_mastery import mastery_tracker
+
+logger = logging.getLogger(__name__)
+
+# Pending answers older than this were probably lost with a restarted worker
+STALE_PENDING_SECONDS = 120
+
+def _score_pending(answer_id):
+    """Pool task: score one pending answer and update the student's statistics"""
+    try:
+        with app.app_context():
+            answer = db.session.get(Answer, answer_id)
+            if answer is None or answer.status != 'pending':
+                return
+
+            # Sample questions are not in the database; submit_answer scores them against their model answer
+            question = db.session.get(Question, answer.question_id)
+            if question is not None:
+                model_answer, difficulty = question.model_answer, question.difficulty
+            else:
+                sample = get_question_by_id(answer.question_id)
+                if sample is None:
+                    logger.error(f"Question #{answer.question_id} of pending answer #{answer_id} not found")
+                    answer.feedback = 'This answer could not be scored because its question no longer exists.'
+                    answer.status = 'failed'
+                    db.session.commit()
+                    return
+                model_answer, difficulty = sample['model_answer'], sample['difficulty']
+
+            scoring_result = score_cache.score(answer.user_answer, model_answer, difficulty,
+                                               question_id=answer.question_id)
+            score = scoring_result['score']
+
+            answer.score = score
+            answer.set_feedback(scoring_result)
+            answer.scoring_mode = scoring_result.get('scoring_mode', 'full')
+            answer.set_components(scoring_result.get('components'))
+            answer.status = 'scored'
+            mastery_tracker.record(answer.user_id, scoring_result.get('components'))
+
+            # Atomic increments: other workers may be updating the same student
+            db.session.execute(
+                db.update(User).where(User.id == int(answer.user_id)).values(
+                    total_score=User.total_score + score,
+                    questions_correct=User.questions_correct + int(score >= CORRECT_THRESHOLD)
+                )
+            )
+            db.session.commit()
+
+    except Exception as e:
+        logger.error(f"Error scoring answer #{answer_id}: {e}")
+
+class ScoringQueue:
+    """Local pool that scores pending answers and writes the results back"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def enqueue(self, answer_id):
+        """Schedule a pending answer for scoring and return immediately"""
+        with self._lock:
+            if answer_id in self._in_flight:
+                return
+            self._in_flight.add(answer_id)
+            try:
+                future = self._pool().submit(_score_pending, answer_id)
+            except BrokenExecutor:
+                # A pool process died; start a fresh pool
+                self._executor = None
+                future = self._pool().submit(_score_pending, answer_id)
+        future.add_done_callback(lambda _: self._finished(answer_id))
+
+    def _pool(self):
+        """The executor, created on first use (lock held)"""
+        if self._executor is None:
+            max_workers = self.max_workers or app.config.get('SCORING_WORKERS', 2)
+            if scoring_client.socket_path:
+                # The scoring daemon does the work; pool threads only wait for its replies
+                self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scoring')
+            else:
+                # Scoring is CPU-bound, so it runs in processes rather than under this worker's GIL.
+                # Spawned, not forked: a fork of this threaded worker could copy a lock (logging, the
+                # connection pool) held by another thread and deadlock. Each process imports the app
+                # and fits its own scoring model - memory per process is about one model; set
+                # SCORING_SOCKET to share the daemon's model instead.
+                self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _finished(self, answer_id):
+        with self._lock:
+            self._in_flight.discard(answer_id)
+
+    def requeue_if_stale(self, answer):
+        """Re-queue a pending answer whose scoring task was lost (e.g. worker restart)"""
+        if answer.status != 'pending' or answer.created_at is None:
+            return
+        if answer.created_at < datetime.now() - timedelta(seconds=STALE_PENDING_SECONDS):
+            logger.warning(f"Re-queueing stale pending answer #{answer.id}")
+            self.enqueue(answer.id)
+
+# Initialize shared scoring queue
+scoring_queue = ScoringQueue()
@@ -0,0 +1,216 @@
+"""
+Semantic Space Module
+Latent semantic analysis (TruncatedSVD) space trained offline over the question
+bank and stored student answers. It is saved as plain NumPy files that every
+worker memory-maps, so loading is near-instant and the pages are shared.
+Each training run writes a new version directory and then atomically replaces
+the pointer file naming the current one, so the space is never missing
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+logger = logging.getLogger(__name__)
+
+# Where train_semantic_space.py writes the space and the scorer loads it from
+SEMANTIC_SPACE_DIR = os.environ.get('SEMANTIC_SPACE_DIR', os.path.join('instance', 'semantic_space'))
+
+# Latent dimensions kept by the SVD
+SEMANTIC_COMPONENTS = int(os.environ.get('SEMANTIC_COMPONENTS', 100))
+
+# Share of the similarity component taken by semantic similarity when a space is available
+SEMANTIC_WEIGHT = float(os.environ.get('SEMANTIC_WEIGHT', 0.5))
+
+# Hashed term space the projection is defined over
+SEMANTIC_FEATURES = 2 ** 16
+
+PROJECTION_FILE = 'projection.npy'  # features x components, idf folded in
+VECTORS_FILE = 'reference_vectors.npy'  # references x components, L2-normalised
+QUESTIONS_FILE = 'reference_questions.npy'  # question id of each reference row
+KEYS_FILE = 'reference_keys.npy'  # hash of each reference's cleaned text
+META_FILE = 'meta.json'  # written last; its presence marks a complete space
+CURRENT_FILE = 'CURRENT'  # name of the current version directory; replaced atomically after training
+
+def _term_vectorizer():
+    """Stateless unigram counts, so nothing but the arrays has to be stored"""
+    return HashingVectorizer(stop_words='english', n_features=SEMANTIC_FEATURES,
+                             alternate_sign=False, norm=None, dtype=np.float32)
+
+def _sublinear(counts):
+    """1 + log(tf), matching the TfidfTransformer used for training"""
+    counts = counts.tocsr(copy=True)
+    np.log(counts.data, out=counts.data)
+    counts.data += 1
+    return counts
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def reference_key(cleaned_text):
+    """Identifies a stored reference vector, so edited model answers are re-projected"""
+    return hashlib.sha1(cleaned_text.encode('utf-8')).digest()[:16]
+
+def _current_version(path):
+    """Name of the current version directory, or None for a space saved before versioning"""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def space_version(path=None):
+    """The current version of the trained space, or None when no space has been trained"""
+    path = path or SEMANTIC_SPACE_DIR
+    version = _current_version(path)
+    if version is not None:
+        return version
+    try:
+        return os.stat(os.path.join(path, META_FILE)).st_mtime
+    except OSError:
+        return None
+
+class SemanticSpace:
+    """A trained LSA space backed by read-only memory-mapped arrays"""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.projection = np.load(os.path.join(path, PROJECTION_FILE), mmap_mode='r')
+        self.reference_vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+        questions = np.load(os.path.join(path, QUESTIONS_FILE), mmap_mode='r')
+        keys = np.load(os.path.join(path, KEYS_FILE), mmap_mode='r')
+        self._rows = {}
+        for row, (question_id, key) in enumerate(zip(questions.tolist(), keys.tolist())):
+            self._rows[(question_id, key)] = row
+        self._vectorizer = _term_vectorizer()
+
+    @classmethod
+    def load(cls, path=None):
+        """Open the trained space, or return None if there is none"""
+        path = path or SEMANTIC_SPACE_DIR
+        version = _current_version(path)
+        if version is not None:
+            path = os.path.join(path, version)
+        try:
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            return cls(path, meta)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error loading semantic space from {path}: {e}")
+            return None
+
+    def __reduce__(self):
+        # Pickle (e.g. to pool workers) as a path; the receiver maps the same files
+        return (SemanticSpace, (self.path, self.meta))
+
+    @property
+    def dimensions(self):
+        return self.projection.shape[1]
+
+    def transform(self, cleaned_texts):
+        """Project cleaned texts into the space: texts x components, L2-normalised"""
+        counts = _sublinear(self._vectorizer.transform(cleaned_texts))
+        # Sparse @ row-major projection only reads the rows of terms that occur
+        return _normalize_rows(np.asarray(counts @ self.projection, dtype=np.float32))
+
+    def transform_terms(self, term_counts):
+        """transform() for one text given as its {unigram: count} after stop-word removal"""
+        hasher = FeatureHasher(n_features=SEMANTIC_FEATURES, input_type='pair', alternate_sign=False,
+                               dtype=np.float32)
+        counts = _sublinear(hasher.transform([term_counts.items()]))
+        return _normalize_rows(np.asarray(counts @ self.projection, dtype=np.float32))[0]
+
+    def reference_vectors_for(self, question_id, cleaned_references):
+        """Stored vectors for a question's references, projecting any that changed since training"""
+        rows = [self._rows.get((question_id, reference_key(text))) for text in cleaned_references]
+        if all(row is not None for row in rows):
+            return np.asarray(self.reference_vectors[rows])
+        return self.transform(cleaned_references)
+
+def train_semantic_space(references, answers, path=None, n_components=None):
+    """
+    Fit an LSA space over reference answers and student answers (all cleaned text)
+    and write it to path. references is a list of (question_id, cleaned text);
+    answers an iterable of cleaned texts. Returns the metadata written.
+    """
+    path = path or SEMANTIC_SPACE_DIR
+    vectorizer = _term_vectorizer()
+    reference_texts = [text for _, text in references]
+    answers = [text for text in answers if text]
+
+    documents = reference_texts + answers
+    counts = vectorizer.transform(documents)
+    # Drop hashed columns no document uses, so the SVD works on the real vocabulary
+    used = np.flatnonzero(counts.getnnz(axis=0))
+    if len(used) < 2 or len(documents) < 3:
+        raise ValueError('Not enough text to train a semantic space')
+
+    transformer = TfidfTransformer(sublinear_tf=True)
+    tfidf = transformer.fit_transform(counts[:, used])
+
+    n_components = min(n_components or SEMANTIC_COMPONENTS, len(documents) - 1, len(used) - 1)
+    svd = TruncatedSVD(n_components=n_components, random_state=42)
+    svd.fit(tfidf)
+
+    # transform() applies sublinear tf itself; idf is folded into the projection
+    # (row normalisation before projecting is irrelevant once the output is normalised)
+    projection = np.zeros((SEMANTIC_FEATURES, n_components), dtype=np.float32)
+    projection[used] = (transformer.idf_[:, None] * svd.components_.T).astype(np.float32)
+
+    reference_counts = _sublinear(counts[:len(reference_texts)])
+    reference_vectors = _normalize_rows(np.asarray(reference_counts @ projection, dtype=np.float32))
+
+    meta = {
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'components': int(n_components),
+        'features': SEMANTIC_FEATURES,
+        'references': len(reference_texts),
+        'answers': len(answers),
+        'terms': int(len(used)),
+        'explained_variance': round(float(svd.explained_variance_ratio_.sum()), 4)
+    }
+
+    # Write a new version directory, then point CURRENT at it with one atomic replace,
+    # so workers refitting at any moment find either the old space or the new one
+    version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    version_path = os.path.join(path, version)
+    os.makedirs(version_path)
+    np.save(os.path.join(version_path, PROJECTION_FILE), projection)
+    np.save(os.path.join(version_path, VECTORS_FILE), reference_vectors)
+    np.save(os.path.join(version_path, QUESTIONS_FILE), np.array([qid for qid, _ in references], dtype=np.int64))
+    np.save(os.path.join(version_path, KEYS_FILE),
+            np.array([reference_key(text) for text in reference_texts], dtype='S16'))
+    with open(os.path.join(version_path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    previous = _current_version(path)
+    tmp_path = os.path.join(path, f'{CURRENT_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, CURRENT_FILE))
+
+    # Keep the previous version for workers that read the old pointer just before the swap;
+    # mapped files of anything older stay readable after deletion
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        if name in (version, previous, CURRENT_FILE):
+            continue
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        elif previous is not None and name in (PROJECTION_FILE, VECTORS_FILE, QUESTIONS_FILE, KEYS_FILE,
+                                               META_FILE):
+            os.remove(entry)  # a space saved before versioning, kept as the previous one until now
+    return meta
@@ -0,0 +1,77 @@
+"""
+Sentence Alignment Module
+Optional scorer for long essay answers. A single document cosine cannot tell
+which parts of the model answer an essay covered, so the reference answers
+and the student answer are split into sentences and aligned: one sparse
+similarity matrix (reference sentences x student sentences) per submission,
+reduced with a vectorized max per row, gives how well every point of the
+model answer is covered
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import List
+import numpy as np
+
+# Questions worth at least this many marks are aligned sentence by sentence; 0 turns it off
+SENTENCE_ALIGNMENT_MIN_MARKS = int(os.environ.get('SENTENCE_ALIGNMENT_MIN_MARKS', 10))
+
+# Cosine at which a student sentence fully covers a model-answer sentence
+SENTENCE_MATCH_THRESHOLD = 0.4
+
+# Sentence ends, line breaks and bullets (model answers are often written as lists)
+SENTENCE_BREAK = re.compile(r'(?<=[.!?;])\s+|\n+|\s+[-•]\s+')
+
+def split_sentences(text):
+    """Sentences of a text that contain a word (so list markers such as '1.' are dropped)"""
+    return [sentence.strip() for sentence in SENTENCE_BREAK.split(text or '') if re.search(r'[a-zA-Z]{2}', sentence)]
+
+@dataclass
+class SentenceKey:
+    """Sentences of every reference answer of a question, stacked into one sparse matrix"""
+    sentences: List[str]  # all references' sentences, reference by reference
+    starts: np.ndarray  # index of each reference's first sentence
+    vectors: object  # sentences x vocabulary sparse rows, L2-normalised
+
+    def align(self, user_vectors):
+        """Align a student's sentence vectors with every reference sentence in one product"""
+        if user_vectors.shape[0] == 0:
+            best = np.zeros(len(self.sentences))
+        else:
+            # Rows are L2-normalised, so the products are cosines
+            best = (self.vectors @ user_vectors.T).max(axis=1).toarray().ravel()
+        return SentenceAlignment(self, best)
+
+@dataclass
+class SentenceAlignment:
+    """Best cosine of each reference sentence against any student sentence"""
+    key: SentenceKey
+    best: np.ndarray
+
+    def coverages(self):
+        """Per reference: mean of its sentences' coverage, each full at SENTENCE_MATCH_THRESHOLD"""
+        credit = np.minimum(1.0, self.best / SENTENCE_MATCH_THRESHOLD)
+        counts = np.diff(np.append(self.key.starts, len(self.key.sentences)))
+        return np.add.reduceat(credit, self.key.starts) / counts
+
+    def points(self, reference):
+        """(sentence, covered) for each sentence of one reference, in order"""
+        start = self.key.starts[reference]
+        end = self.key.starts[reference + 1] if reference + 1 < len(self.key.starts) else len(self.key.sentences)
+        return [(self.key.sentences[index], bool(self.best[index] >= SENTENCE_MATCH_THRESHOLD))
+                for index in range(start, end)]
+
+def sentence_key(references, embed):
+    """
+    Stack the sentences of a question's references into a SentenceKey, or None when
+    no reference has more than one sentence (then alignment adds nothing).
+    embed maps a list of sentences to L2-normalised sparse rows.
+    """
+    reference_sentences = [split_sentences(text) or [text] for text in references]
+    if max(len(sentences) for sentences in reference_sentences) < 2:
+        return None
+
+    sentences = [sentence for group in reference_sentences for sentence in group]
+    starts = np.cumsum([0] + [len(group) for group in reference_sentences[:-1]])
+    return SentenceKey(sentences=sentences, starts=starts, vectors=embed(sentences).tocsr())
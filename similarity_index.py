@@ -0,0 +1,239 @@
+"""
+Answer Similarity Index Module
+MinHash signatures and LSH band buckets over submitted answers, maintained on
+every insert, so near-identical submissions are found with a handful of
+indexed lookups instead of comparing every pair of answers
+"""
+
+import os
+import re
+import zlib
+import hashlib
+import logging
+import numpy as np
+from models import Answer, AnswerBucket, AnswerSignature, User, db
+
+logger = logging.getLogger(__name__)
+
+# MinHash signature length; split into LSH_BANDS bands of NUM_PERMUTATIONS / LSH_BANDS rows.
+# 16 bands x 4 rows: answers above ~0.5 Jaccard similarity almost always share a bucket
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+
+# Answers are compared as sets of overlapping word n-grams of this size
+SHINGLE_SIZE = 3
+
+# Estimated Jaccard similarity at or above which answers count as near-identical
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', 0.8))
+
+# Universal hash family h(x) = (a*x + b) mod p; fixed seed so signatures never change
+_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20240611)
+_HASH_A = _random.randint(1, _PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+_HASH_B = _random.randint(0, _PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+
+# Parameters per IN (...) query, below SQLite's limit
+_QUERY_CHUNK = 900
+
+def shingles(text):
+    """Word n-grams of an answer, ignoring case, punctuation and spacing"""
+    words = re.findall(r'[a-z0-9]+', (text or '').lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(text):
+    """MinHash signature (uint32 array) of an answer, or None if it has no words"""
+    shingle_set = shingles(text)
+    if not shingle_set:
+        return None
+    # crc32 is stable across processes, unlike hash()
+    hashed = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set),
+                         dtype=np.uint64, count=len(shingle_set))
+    return ((hashed[:, None] * _HASH_A + _HASH_B) % _PRIME).min(axis=0).astype(np.uint32)
+
+def band_buckets(signature):
+    """One bucket id per band: a 63-bit hash of that band's rows"""
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    return [int.from_bytes(hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(),
+                                           digest_size=8).digest(), 'big') >> 1
+            for band in range(LSH_BANDS)]
+
+def estimated_similarity(signature_a, signature_b):
+    """Share of agreeing MinHash values: an unbiased estimate of Jaccard similarity"""
+    return float(np.mean(signature_a == signature_b))
+
+def _signature(data):
+    return np.frombuffer(data, dtype=np.uint32)
+
+class SimilarityIndex:
+    """Near-duplicate index over answers, scoped per question"""
+
+    def add(self, answer_id, question_id, user_answer):
+        """Index one new answer; joins the caller's transaction"""
+        self.add_many([(answer_id, question_id, user_answer)])
+
+    def add_many(self, answers):
+        """Index (answer_id, question_id, user_answer) rows in bulk; joins the caller's transaction"""
+        signatures = []
+        buckets = []
+        for answer_id, question_id, user_answer in answers:
+            signature = minhash(user_answer)
+            if signature is None:
+                continue
+            signatures.append({'answer_id': answer_id, 'question_id': question_id,
+                               'signature': signature.tobytes()})
+            buckets.extend({'question_id': question_id, 'band': band, 'bucket': bucket, 'answer_id': answer_id}
+                           for band, bucket in enumerate(band_buckets(signature)))
+
+        if signatures:
+            db.session.execute(db.insert(AnswerSignature), signatures)
+            db.session.execute(db.insert(AnswerBucket), buckets)
+
+    def remove_question(self, question_id):
+        """Drop the index entries of a question's answers"""
+        AnswerBucket.query.filter_by(question_id=question_id).delete(synchronize_session=False)
+        AnswerSignature.query.filter_by(question_id=question_id).delete(synchronize_session=False)
+
+    def similar(self, answer_id, threshold=None, limit=20):
+        """Answers to the same question that look like a copy of the given one"""
+        entry = db.session.get(AnswerSignature, answer_id)
+        if entry is None:
+            return []
+        return self._matches(entry.question_id, _signature(entry.signature), threshold, limit, exclude=answer_id)
+
+    def similar_to_text(self, question_id, user_answer, threshold=None, limit=20):
+        """Stored answers to a question that look like a copy of the given text"""
+        signature = minhash(user_answer)
+        if signature is None:
+            return []
+        return self._matches(question_id, signature, threshold, limit)
+
+    def _matches(self, question_id, signature, threshold, limit, exclude=None):
+        """Verify LSH candidates against their signatures and describe the close ones"""
+        threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+        band_filter = db.or_(*[db.and_(AnswerBucket.band == band, AnswerBucket.bucket == bucket)
+                               for band, bucket in enumerate(band_buckets(signature))])
+        candidate_ids = {answer_id for (answer_id,) in
+                         db.session.query(AnswerBucket.answer_id).
+                         filter(AnswerBucket.question_id == question_id).filter(band_filter).distinct()}
+        candidate_ids.discard(exclude)
+
+        scored = []
+        for answer_id, data in self._signatures(candidate_ids):
+            similarity = estimated_similarity(signature, _signature(data))
+            if similarity >= threshold:
+                scored.append((similarity, answer_id))
+        scored.sort(reverse=True)
+        scored = scored[:limit]
+
+        answers = self._describe([answer_id for _, answer_id in scored])
+        return [dict(answers[answer_id], similarity=round(similarity, 3))
+                for similarity, answer_id in scored if answer_id in answers]
+
+    def clusters(self, question_id, threshold=None):
+        """
+        Groups of near-identical answers to a question, largest first. Only
+        answers that share an LSH bucket with another answer are compared.
+        """
+        threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+        colliding = db.session.query(AnswerBucket.band, AnswerBucket.bucket).\
+                    filter(AnswerBucket.question_id == question_id).\
+                    group_by(AnswerBucket.band, AnswerBucket.bucket).\
+                    having(db.func.count(AnswerBucket.id) > 1).subquery()
+        rows = db.session.query(colliding.c.band, colliding.c.bucket, AnswerBucket.answer_id).\
+               join(AnswerBucket, db.and_(AnswerBucket.question_id == question_id,
+                                          AnswerBucket.band == colliding.c.band,
+                                          AnswerBucket.bucket == colliding.c.bucket)).\
+               order_by(colliding.c.band, colliding.c.bucket, AnswerBucket.answer_id).all()
+        if not rows:
+            return []
+
+        groups = {}
+        for band, bucket, answer_id in rows:
+            groups.setdefault((band, bucket), []).append(answer_id)
+        signatures = {answer_id: _signature(data)
+                      for answer_id, data in self._signatures({answer_id for _, _, answer_id in rows})}
+
+        parent = {}
+
+        def find(answer_id):
+            parent.setdefault(answer_id, answer_id)
+            while parent[answer_id] != answer_id:
+                parent[answer_id] = parent[parent[answer_id]]
+                answer_id = parent[answer_id]
+            return answer_id
+
+        # Within a bucket, compare each answer to the representatives found so far rather
+        # than to every other member, so a bucket of n copies costs O(n), not O(n^2)
+        for members in groups.values():
+            representatives = []
+            for answer_id in members:
+                for representative in representatives:
+                    if estimated_similarity(signatures[answer_id], signatures[representative]) >= threshold:
+                        parent[find(answer_id)] = find(representative)
+                        break
+                else:
+                    representatives.append(answer_id)
+
+        clustered = {}
+        for answer_id in signatures:
+            clustered.setdefault(find(answer_id), []).append(answer_id)
+        clustered = [sorted(members) for members in clustered.values() if len(members) > 1]
+        clustered.sort(key=lambda members: (-len(members), members[0]))
+
+        answers = self._describe([answer_id for members in clustered for answer_id in members])
+        return [{
+            'size': len(members),
+            'distinct_users': len({answers[answer_id]['user_id'] for answer_id in members if answer_id in answers}),
+            'answers': [answers[answer_id] for answer_id in members if answer_id in answers]
+        } for members in clustered]
+
+    def backfill(self, batch_size=1000):
+        """Index answers stored before the index existed; returns how many were added"""
+        added = 0
+        while True:
+            rows = db.session.query(Answer.id, Answer.question_id, Answer.user_answer).\
+                   outerjoin(AnswerSignature, AnswerSignature.answer_id == Answer.id).\
+                   filter(AnswerSignature.answer_id.is_(None)).\
+                   order_by(Answer.id).limit(batch_size).all()
+            if not rows:
+                return added
+            self.add_many(rows)
+            # Answers without words get no signature; park them so the loop moves on
+            indexed = {answer_id for answer_id, _ in self._signatures({row.id for row in rows})}
+            db.session.add_all([AnswerSignature(answer_id=row.id, question_id=row.question_id, signature=b'')
+                                for row in rows if row.id not in indexed])
+            db.session.commit()
+            added += len(indexed)
+
+    def _signatures(self, answer_ids):
+        """(answer_id, signature bytes) for the given answers, in chunks of IN (...) parameters"""
+        answer_ids = sorted(answer_ids)
+        for start in range(0, len(answer_ids), _QUERY_CHUNK):
+            chunk = answer_ids[start:start + _QUERY_CHUNK]
+            for answer_id, data in db.session.query(AnswerSignature.answer_id, AnswerSignature.signature).\
+                    filter(AnswerSignature.answer_id.in_(chunk)):
+                if data:
+                    yield answer_id, data
+
+    def _describe(self, answer_ids):
+        """Answer details for reports, keyed by answer id"""
+        described = {}
+        for start in range(0, len(answer_ids), _QUERY_CHUNK):
+            chunk = answer_ids[start:start + _QUERY_CHUNK]
+            rows = db.session.query(Answer, User).join(User, User.id == db.cast(Answer.user_id, db.Integer)).\
+                   filter(Answer.id.in_(chunk))
+            for answer, user in rows:
+                described[answer.id] = {
+                    'answer_id': answer.id,
+                    'user_id': user.id,
+                    'user': user.first_name or user.username,
+                    'score': answer.score,
+                    'created_at': answer.created_at.isoformat() if answer.created_at else None,
+                    'preview': answer.user_answer[:160]
+                }
+        return described
+
+# Initialize shared similarity index
+similarity_index = SimilarityIndex()
@@ -0,0 +1,224 @@
+"""
+Spell Normalization Module
+SymSpell-style deletion index over the question bank vocabulary. Misspelled
+student words ("scafolding") are mapped to the closest bank word before
+concepts are extracted, so they still count as matches. Lookups are dictionary
+probes of the word's deletions, so correcting a word takes microseconds.
+Real English words the bank does not use ("tiles", "steal") are left alone:
+only words missing from a general English word list are corrected.
+
+The index is saved to disk together with a hash of the vocabulary it was built
+from; it is loaded on first use and rebuilt whenever the vocabulary changes.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Where the deletion index is stored between runs
+SPELL_INDEX_PATH = os.environ.get('SPELL_INDEX_PATH', os.path.join('instance', 'spell_index.json'))
+
+# Largest edit distance corrected; words shorter than LONG_WORD_LENGTH get at most one edit
+MAX_EDIT_DISTANCE = 2
+LONG_WORD_LENGTH = 8
+
+# Shorter words are left alone - too many valid words are one edit apart
+MIN_CORRECTION_LENGTH = 5
+
+# Distinct misspellings remembered per worker
+CORRECTION_CACHE_SIZE = 65536
+
+# Word list (one word per line) of real words never corrected; unset uses the NLTK words corpus,
+# installed in a setup step (python -m nltk.downloader words) - scoring never downloads it
+SPELL_LEXICON_PATH = os.environ.get('SPELL_LEXICON_PATH')
+
+# Regular inflections stripped to find a word's base form in the lexicon: suffix -> endings restored
+INFLECTIONS = [('ies', ('y',)), ('ied', ('y',)), ('ily', ('y',)), ('es', ('', 'e')), ('s', ('',)),
+               ('ed', ('', 'e')), ('ing', ('', 'e')), ('ly', ('', 'le')), ('er', ('', 'e')), ('est', ('', 'e'))]
+
+WORD_PATTERN = re.compile(r'\b[a-z]{%d,}\b' % MIN_CORRECTION_LENGTH)
+
+def deletions(word, max_distance):
+    """Every string obtained by deleting up to max_distance characters from word"""
+    found = set()
+    current = {word}
+    for _ in range(max_distance):
+        current = {candidate[:index] + candidate[index + 1:]
+                   for candidate in current if len(candidate) > 1 for index in range(len(candidate))}
+        found |= current
+    return found
+
+def edit_distance(source, target, max_distance):
+    """Optimal string alignment distance (adjacent transpositions allowed), or max_distance + 1 if larger"""
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+@lru_cache(maxsize=None)
+def english_lexicon():
+    """
+    Lowercase words of a general English word list, or None when none is installed. Read
+    from disk only: loaded when the bank is fitted, never fetched while scoring.
+    """
+    try:
+        if SPELL_LEXICON_PATH:
+            with open(SPELL_LEXICON_PATH, 'r', encoding='utf-8') as f:
+                words = [line.strip() for line in f]
+        else:
+            from nltk.corpus import words as words_corpus
+            words = words_corpus.words()
+    except (ImportError, LookupError, OSError):
+        logger.warning("No English word list installed (python -m nltk.downloader words); "
+                       "only non-substitution typos are corrected")
+        return None
+    return frozenset(word.lower() for word in words if word.isalpha())
+
+def base_forms(word):
+    """The word and the base forms its regular inflections may come from ("tiles" -> "tile")"""
+    forms = {word}
+    for suffix, endings in INFLECTIONS:
+        stem = word[:-len(suffix)]
+        if word.endswith(suffix) and len(stem) >= 2:
+            forms.update(stem + ending for ending in endings)
+            if len(stem) >= 3 and stem[-1] == stem[-2]:
+                forms.add(stem[:-1])  # "stopped" -> "stop"
+    return forms
+
+def is_substitution(word, candidate):
+    """Whether two words differ only by one replaced letter"""
+    return len(word) == len(candidate) and sum(a != b for a, b in zip(word, candidate)) == 1
+
+def vocabulary_of(cleaned_texts):
+    """Word frequencies of the words the index can correct to"""
+    counts = Counter()
+    for text in cleaned_texts:
+        counts.update(WORD_PATTERN.findall(text))
+    return counts
+
+class SpellIndex:
+    """
+    Corrects words outside the English lexicon to the closest bank word; the deletion
+    index is loaded or built on first use
+    """
+
+    def __init__(self, vocabulary, path=SPELL_INDEX_PATH, max_distance=MAX_EDIT_DISTANCE, lexicon=None):
+        self.vocabulary = dict(vocabulary)  # word -> frequency, used to break distance ties
+        self.path = path
+        self.max_distance = max_distance
+        self.lexicon = lexicon  # real words never corrected; None = english_lexicon()
+        # Identifies the word set; frequencies only rank candidates, so they are not part of it
+        self.version = hashlib.sha1(
+            json.dumps([max_distance, sorted(self.vocabulary)]).encode('utf-8')).hexdigest()[:16]
+        self._deletes = None
+        self._lock = threading.Lock()
+        self._correct_unknown = lru_cache(maxsize=CORRECTION_CACHE_SIZE)(self._closest)
+
+    def __getstate__(self):
+        # Worker processes load the index from disk themselves rather than unpickling it
+        return {'vocabulary': self.vocabulary, 'path': self.path, 'max_distance': self.max_distance,
+                'lexicon': self.lexicon}
+
+    def __setstate__(self, state):
+        self.__init__(state['vocabulary'], state['path'], state['max_distance'], state['lexicon'])
+
+    def normalize(self, cleaned_text):
+        """Replace misspelled words in a clean_text()-ed text with their corrections"""
+        if not self.vocabulary:
+            return cleaned_text
+        return WORD_PATTERN.sub(lambda match: self.correct(match.group()), cleaned_text)
+
+    def correct(self, word):
+        """
+        The word itself if the bank uses it or it is a real English word, else the closest
+        bank word within range, else the word
+        """
+        if word in self.vocabulary or len(word) < MIN_CORRECTION_LENGTH:
+            return word
+        return self._correct_unknown(word)
+
+    def _closest(self, word):
+        lexicon = self.lexicon if self.lexicon is not None else english_lexicon()
+        if lexicon and not lexicon.isdisjoint(base_forms(word)):
+            return word
+
+        deletes = self._load()
+        max_distance = self.max_distance if len(word) >= LONG_WORD_LENGTH else min(1, self.max_distance)
+
+        candidates = set()
+        for probe in deletions(word, max_distance) | {word}:
+            if probe in self.vocabulary:
+                candidates.add(probe)
+            candidates.update(deletes.get(probe, ()))
+
+        best = None
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, max_distance)
+            # Without a word list, one replaced letter too often turns one real word into another
+            if not lexicon and is_substitution(word, candidate):
+                continue
+            if distance <= max_distance:
+                rank = (distance, -self.vocabulary[candidate], candidate)
+                if best is None or rank < best:
+                    best = rank
+        return best[2] if best is not None else word
+
+    def _load(self):
+        """The deletion index: from disk when it matches this vocabulary, otherwise built and saved"""
+        if self._deletes is not None:
+            return self._deletes
+
+        with self._lock:
+            if self._deletes is None:
+                deletes = self._read()
+                if deletes is None:
+                    deletes = self._build()
+                    self._write(deletes)
+                self._deletes = deletes
+        return self._deletes
+
+    def _build(self):
+        deletes = {}
+        for word in self.vocabulary:
+            for deletion in deletions(word, self.max_distance):
+                deletes.setdefault(deletion, []).append(word)
+        logger.info(f"Spell index built: {len(self.vocabulary)} words, {len(deletes)} deletions")
+        return deletes
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return stored['deletes'] if stored.get('version') == self.version else None
+
+    def _write(self, deletes):
+        """Atomic replace, so concurrent workers never read a half-written file"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.version, 'deletes': deletes}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save spell index to {self.path}: {e}")
@@ -19,6 +19,7 @@ function initializeIntelliTutor() {
     initializeKeyboardShortcuts();
     initializeThemeToggle();
     initializeSearchAndFilter();
+    initializeAnswerPreview();
 }
 
 /**
@@ -280,6 +281,95 @@ function initializeKeyboardShortcuts() {
     });
 }
 
+/**
+ * Live score preview while a student types an answer
+ */
+function initializeAnswerPreview() {
+    const textarea = document.querySelector('[data-preview-url]');
+    const panel = document.getElementById('answerPreview');
+    
+    if (!textarea || !panel) {
+        return;
+    }
+    
+    const previewUrl = textarea.getAttribute('data-preview-url');
+    const debounceDelay = 600;   // wait for a pause in typing
+    const minInterval = 1000;    // at most one preview request per second
+    let timer = null;
+    let inFlight = false;
+    let queued = false;
+    let nextAllowed = 0;
+    let disabled = false;
+    
+    function schedule(delay) {
+        clearTimeout(timer);
+        timer = setTimeout(sendPreview, Math.max(delay, nextAllowed - Date.now()));
+    }
+    
+    function sendPreview() {
+        if (disabled) {
+            return;
+        }
+        if (inFlight) {
+            queued = true;
+            return;
+        }
+        if (!textarea.value.trim()) {
+            panel.classList.add('d-none');
+            return;
+        }
+        
+        inFlight = true;
+        nextAllowed = Date.now() + minInterval;
+        fetch(previewUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ answer: textarea.value })
+        })
+            .then(response => {
+                if (response.status === 429) {
+                    // Rate limited: try again once the server allows it
+                    return response.json().then(data => {
+                        nextAllowed = Date.now() + (data.retry_after || 1) * 1000;
+                        queued = true;
+                        return null;
+                    });
+                }
+                if (response.status === 404) {
+                    disabled = true;  // no preview for this question
+                    return null;
+                }
+                return response.ok ? response.json() : null;
+            })
+            .then(data => {
+                if (data) {
+                    showAnswerPreview(panel, data);
+                }
+            })
+            .catch(() => {})
+            .finally(() => {
+                inFlight = false;
+                if (queued) {
+                    queued = false;
+                    schedule(0);
+                }
+            });
+    }
+    
+    textarea.addEventListener('input', () => schedule(debounceDelay));
+}
+
+/**
+ * Show a preview score and feedback
+ */
+function showAnswerPreview(panel, data) {
+    const badge = panel.querySelector('[data-preview-score]');
+    badge.textContent = `${data.score}%`;
+    badge.className = `badge bg-${data.score >= 70 ? 'success' : data.score >= 50 ? 'warning' : 'danger'}`;
+    panel.querySelector('[data-preview-feedback]').textContent = data.feedback;
+    panel.classList.remove('d-none');
+}
+
 /**
  * Theme toggle functionality
  */
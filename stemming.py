@@ -0,0 +1,23 @@
+"""
+Stemming Module
+Porter stems behind a bounded memo cache, shared by answer scoring and the PDF
+processors. Vocabulary is small and repetitive, so almost every call is a cache
+hit and the stemmer itself only runs for words not seen before
+"""
+
+from functools import lru_cache
+from nltk.stem import PorterStemmer
+
+# Distinct words remembered per process
+STEM_CACHE_SIZE = 1 << 17
+
+_stemmer = PorterStemmer()
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """Porter stem of a lowercase word ("scaffolds", "scaffolding" -> "scaffold")"""
+    return _stemmer.stem(word)
+
+def stems(words):
+    """Set of the stems of some words"""
+    return {stem(word) for word in words}
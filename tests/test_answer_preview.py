@@ -0,0 +1,111 @@
+"""A draft patched edit by edit must preview as a freshly tokenized draft and as score_answer scores it"""
+
+from types import SimpleNamespace
+import pytest
+import answer_scorer
+from answer_preview import AnswerPreviewer, _Draft, common_prefix_length
+from answer_scorer import score_answer
+from sentence_alignment import SENTENCE_ALIGNMENT_MIN_MARKS
+from spell_index import SpellIndex, vocabulary_of
+from text_cleaning import clean_text
+
+# (id, model answer, difficulty, question type, marks); question 1 is long enough for sentence alignment
+QUESTIONS = [
+    (1, 'Scaffolding must be inspected by a competent person before first use. It must be inspected again '
+        'after bad weather. Guard rails and toe boards prevent falls from the working platform. '
+        'Loading bays must not be overloaded with bricks.', 'hard', 'essay', SENTENCE_ALIGNMENT_MIN_MARKS),
+    (2, 'Mortar is a mix of cement, sand and water that bonds bricks together. '
+        'Lime improves workability and reduces shrinkage cracking.', 'medium', 'definition', 3),
+]
+
+ALTERNATIVES = {2: ['Cement, sand and water mixed into a paste that holds brickwork together.']}
+
+# Successive versions of a draft: typing, an edit in the middle, a deletion, a retyped ending,
+# a misspelling, pasting over everything and clearing it
+EDITS = [
+    'M',
+    'Mort',
+    'Mortar is',
+    'Mortar is a mix of cement and water.',
+    'Mortar is a mix of cement, sand and water.',
+    'Mortar is a mix of cement, sand and water. First, it bonds bricks together.',
+    'Mortar is a mix of cement, sand and water. It bonds bricks together.',
+    'Mortar is a mix of cement and water. It bonds bricks together.',
+    'Mortar is a mix of cement and water. It bonds bricks together, lime adds workabilty.',
+    'Mortar is a mix of cement and water.  It bonds bricks   together, lime adds workability!',
+    'Scaffolding must be inspected before first use and after bad weather.',
+    'Scaffolding must be inspected before first use. Guard rails prevent falls from the platform.',
+    '',
+    'ok',
+]
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A snapshot of the bank above, served to the previewer in place of the database's"""
+    references = [clean_text(text) for question_id, model_answer, _, _, _ in QUESTIONS
+                  for text in [model_answer] + ALTERNATIVES.get(question_id, [])]
+    base = SimpleNamespace(spell_index=SpellIndex(vocabulary_of(references), path=str(tmp_path / 'spell_index.json'),
+                                                  lexicon=frozenset()),
+                           semantic_space=None)
+    snapshot = answer_scorer.scoring_model._fit_snapshot(('test',), QUESTIONS, ALTERNATIVES, {}, base=base)
+    monkeypatch.setattr(answer_scorer.scoring_model, '_current_snapshot', lambda: snapshot)
+    return snapshot
+
+def fresh_preview(features, text):
+    draft = _Draft(features)
+    draft.update(text)
+    return draft.preview()
+
+def test_common_prefix_length():
+    assert common_prefix_length('mortar is', 'mortar was') == 7
+    assert common_prefix_length('mortar', 'mortar') == 6
+    assert common_prefix_length('', 'mortar') == 0
+    assert common_prefix_length('brick', 'mortar') == 0
+
+@pytest.mark.parametrize('question_id', [1, 2])
+def test_incremental_preview_matches_fresh_draft(corpus, question_id):
+    features = corpus.features[question_id]
+    draft = _Draft(features)
+    for text in EDITS:
+        draft.update(text)
+        assert draft.preview() == fresh_preview(features, text), text
+
+@pytest.mark.parametrize('question_id', [1, 2])
+def test_preview_matches_score_answer(corpus, question_id):
+    features = corpus.features[question_id]
+    draft = _Draft(features)
+    for text in EDITS:
+        draft.update(text)
+        expected = score_answer(text, features.model_answer, features.difficulty, features)
+        assert draft.preview() == {'score': expected['score'], 'feedback': expected['feedback']}, text
+
+def test_draft_counts_return_to_empty(corpus):
+    draft = _Draft(corpus.features[2])
+    for text in EDITS:
+        draft.update(text)
+    draft.update('')
+    assert (draft.words, draft.tokens, draft.characters) == ([], [], 0)
+    assert not (draft.terms or draft.unigrams or draft.stems or draft.signals)
+
+def test_previewer_keeps_one_draft_per_student_and_question(corpus):
+    previewer = AnswerPreviewer(max_drafts=2, min_interval=0)
+    for text in EDITS:
+        assert previewer.preview(7, 2, text) == fresh_preview(corpus.features[2], text), text
+    previewer.preview(8, 2, 'Mortar')
+    previewer.preview(9, 1, 'Scaffolding')
+    assert list(previewer._drafts) == [(8, 2), (9, 1)]
+
+def test_previewer_skips_unknown_questions(corpus):
+    assert AnswerPreviewer(min_interval=0).preview(7, 99, 'Mortar bonds bricks') is None
+
+def test_rate_limit_per_student():
+    previewer = AnswerPreviewer(min_interval=60)
+    assert previewer.retry_after(7) == 0
+    assert 0 < previewer.retry_after(7) <= 60
+    assert previewer.retry_after(8) == 0
+
+def test_rate_limit_keeps_the_most_recent_students():
+    previewer = AnswerPreviewer(max_drafts=3, min_interval=0)
+    for user_id in [1, 2, 3, 1, 4, 5]:
+        previewer.retry_after(user_id)
+    assert list(previewer._last_preview) == [1, 4, 5]
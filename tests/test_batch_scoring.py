@@ -0,0 +1,85 @@
+"""The vectorized batch path must score every answer as intelligent_ai_score does"""
+
+from types import SimpleNamespace
+import pytest
+import answer_scorer
+from answer_scorer import batch_intelligent_ai_score, intelligent_ai_score
+from spell_index import SpellIndex, vocabulary_of
+from text_cleaning import clean_text
+
+# (id, model answer, difficulty, question type, marks)
+QUESTIONS = [
+    (1, 'Scaffolding must be inspected by a competent person before first use and after bad weather. '
+        'Guard rails and toe boards prevent falls from the working platform.', 'medium', 'definition', 4),
+    (2, 'Mortar is a mix of cement, sand and water that bonds bricks together. '
+        'Lime improves workability and reduces shrinkage cracking.', 'hard', 'definition', 3),
+    (3, 'Area = 5 m x 3 m = 15 m²\nBricks = 15 x 60 = 900 bricks', 'easy', 'calculation', 2),
+    (4, 'Option B', 'easy', 'multiple_choice', 1),
+]
+
+ALTERNATIVES = {1: ['A competent person inspects scaffolds before use, weekly and after storms; '
+                    'guard rails stop workers falling.']}
+
+ANSWER_KEYS = {4: 'B'}
+
+ITEMS = [
+    (1, 'A competent person should inspect the scaffolding before use and after bad weather.'),
+    (1, 'Scafolding needs guard rails and toe boards so nobody falls off the platform.'),
+    (1, 'Bricks are laid in stretcher bond.'),
+    (1, 'ok'),
+    (2, 'Mortar bonds bricks together. It is made from cement, sand and water, and lime helps workability.'),
+    (2, 'Concrete is poured into formwork and left to cure.'),
+    (2, ''),
+    (3, '15 m² x 60 = 900 bricks'),
+    (3, 'About 800 bricks'),
+    (4, 'b'),
+    (4, 'C'),
+]
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A snapshot of the bank above, served to intelligent_ai_score in place of the database's"""
+    references = [clean_text(text) for question_id, model_answer, _, _, _ in QUESTIONS
+                  for text in [model_answer] + ALTERNATIVES.get(question_id, [])]
+    base = SimpleNamespace(spell_index=SpellIndex(vocabulary_of(references), path=str(tmp_path / 'spell_index.json'),
+                                                  lexicon=frozenset()),
+                           semantic_space=None)
+    snapshot = answer_scorer.scoring_model._fit_snapshot(('test',), QUESTIONS, ALTERNATIVES, ANSWER_KEYS, base=base)
+    monkeypatch.setattr(answer_scorer.scoring_model, '_current_snapshot', lambda: snapshot)
+    return snapshot
+
+def single(question_id, user_answer):
+    model_answer, difficulty = next((text, difficulty) for row_id, text, difficulty, _, _ in QUESTIONS
+                                    if row_id == question_id)
+    return intelligent_ai_score(user_answer, model_answer, difficulty, question_id=question_id)
+
+def test_batch_matches_single_scoring(corpus):
+    batch = batch_intelligent_ai_score(ITEMS, corpus=corpus)
+    assert len(batch) == len(ITEMS)
+    for (question_id, user_answer), result in zip(ITEMS, batch):
+        expected = single(question_id, user_answer)
+        assert result['score'] == expected['score'], user_answer
+        assert result.get('feedback_codes') == expected.get('feedback_codes'), user_answer
+        assert result.get('scoring_mode', 'full') == expected.get('scoring_mode', 'full'), user_answer
+
+def test_batch_matches_single_components(corpus):
+    batch = batch_intelligent_ai_score(ITEMS, corpus=corpus)
+    for (question_id, user_answer), result in zip(ITEMS, batch):
+        expected = single(question_id, user_answer).get('components')
+        if expected is None:
+            assert result.get('components') is None, user_answer
+            continue
+        components = result['components']
+        for name in ('similarity', 'coverage', 'quality'):
+            assert components[name] == pytest.approx(expected[name], abs=1e-6), (user_answer, name)
+        assert components['matched'] == expected['matched'], user_answer
+        assert components['missed'] == expected['missed'], user_answer
+
+def test_batch_scores_without_feedback_match(corpus):
+    with_feedback = batch_intelligent_ai_score(ITEMS, corpus=corpus)
+    scores_only = batch_intelligent_ai_score(ITEMS, corpus=corpus, with_feedback=False)
+    assert [result['score'] for result in scores_only] == [result['score'] for result in with_feedback]
+
+def test_batch_of_unknown_question(corpus):
+    assert batch_intelligent_ai_score([(99, 'Some answer about bricks')], corpus=corpus)[0]['score'] is None
+    assert batch_intelligent_ai_score([], corpus=corpus) == []
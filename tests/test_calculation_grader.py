@@ -0,0 +1,108 @@
+"""Calculation answers must be graded by their own final result and the working that leads to it"""
+
+import pytest
+import feedback_phrases as phrases
+from calculation_grader import calculation_key, extract_quantities, final_result, grade_calculation
+
+MODEL_ANSWER = """Area of wall = 5 m x 3 m = 15 m²
+Bricks per m² = 60
+Bricks needed = 15 x 60 = 900 bricks"""
+
+@pytest.fixture
+def key():
+    return calculation_key(MODEL_ANSWER)
+
+def codes(result):
+    """Feedback phrase codes of a result, without their arguments"""
+    return [code[0] if isinstance(code, list) else code for code in result['feedback_codes']]
+
+def test_key_separates_result_from_working(key):
+    assert [(quantity.value, quantity.unit) for quantity in key.results] == [(900.0, 'bricks')]
+    assert {quantity.value for quantity in key.working} == {5.0, 3.0, 15.0, 60.0}
+
+def test_key_keeps_the_unit_of_a_working_value():
+    key = calculation_key('Length = 4\nArea = 4 m x 2 m = 8 m²')
+    assert next(quantity for quantity in key.working if quantity.value == 4.0).unit == 'm'
+
+def test_model_answer_without_a_result_has_no_key():
+    assert calculation_key('Lay the bricks in stretcher bond with 10 courses') is None
+    assert calculation_key('No figures at all') is None
+
+def test_final_result_is_after_the_last_equals_sign():
+    line, quantities = final_result('Volume = 2 x 3 = 6 m³\nSo the answer = 6 m³ of concrete\nWell done.')
+    assert line == 'So the answer = 6 m³ of concrete'
+    assert [(quantity.value, quantity.dimension) for quantity in quantities] == [(6.0, 'volume')]
+
+def test_final_result_without_equals_sign_is_the_whole_line():
+    _, quantities = final_result('Working: 15 x 60\nTotal 900 bricks')
+    assert [quantity.value for quantity in quantities] == [900.0]
+
+def test_final_result_of_text_without_numbers():
+    assert final_result('I do not know') == (None, [])
+    assert final_result('') == (None, [])
+
+def test_step_numbers_are_not_quantities():
+    assert [quantity.value for quantity in extract_quantities('Step 1: 5 m\n2) 3 m')] == [5.0, 3.0]
+
+def test_thousands_separators_and_written_units():
+    quantities = extract_quantities('1,200 kg over 4 square metres')
+    assert [(quantity.base_value, quantity.dimension) for quantity in quantities] == \
+        [(1200.0, 'mass'), (4.0, 'area')]
+
+def test_full_answer_scores_full_marks(key):
+    result = grade_calculation(MODEL_ANSWER, key)
+    assert result['score'] == 100
+    assert codes(result) == [phrases.CORRECT_RESULT]
+    assert result['scoring_mode'] == 'calculation'
+
+def test_result_alone_earns_the_result_weight(key):
+    result = grade_calculation('900 bricks', key)
+    assert result['score'] == 70
+    assert codes(result) == [phrases.CORRECT_RESULT]
+
+def test_working_alone_earns_the_rest(key):
+    result = grade_calculation('5 m x 3 m = 15 m², 60 per m², so = 800 bricks', key)
+    assert result['score'] == 30
+    assert codes(result) == [phrases.WRONG_RESULT, phrases.WORKING_REACHED]
+
+def test_result_within_tolerance_matches(key):
+    assert grade_calculation('= 905 bricks', key)['score'] == 70
+    assert grade_calculation('= 950 bricks', key)['score'] == 0
+
+def test_result_in_another_unit_is_converted():
+    key = calculation_key('Span = 3 m x 1.5 = 4.5 m')
+    assert grade_calculation('= 4500 mm', key)['score'] == 70
+    assert grade_calculation('= 450 cm', key)['score'] == 70
+
+def test_missing_unit_is_matched_by_value_and_flagged(key):
+    result = grade_calculation('15 x 60 = 900', key)
+    assert result['score'] >= 70
+    assert codes(result) == [phrases.CORRECT_RESULT, phrases.STATE_UNITS]
+
+def test_mismatched_unit_does_not_match():
+    key = calculation_key('Span = 3 m x 1.5 = 4.5 m')
+    result = grade_calculation('= 4.5 kg', key)
+    assert result['score'] == 0
+    assert codes(result)[0] == phrases.WRONG_RESULT
+
+def test_several_values_on_the_final_line_share_the_credit(key):
+    result = grade_calculation('= 800 bricks or 900 bricks or 1000 bricks', key)
+    assert result['score'] == round(70 / 3)
+    assert codes(result) == [phrases.PARTIAL_RESULT, phrases.TOO_MANY_VALUES]
+
+def test_result_must_be_on_the_final_line(key):
+    result = grade_calculation('First guess 900 bricks\nActually = 1000 bricks', key)
+    assert result['score'] == 0
+    assert codes(result)[0] == phrases.WRONG_RESULT
+
+def test_no_number_at_all(key):
+    result = grade_calculation('You need a lot of bricks', key)
+    assert result['score'] == 0
+    assert result['feedback_codes'] == [phrases.NO_QUANTITIES]
+    assert grade_calculation('', key)['score'] == 0
+
+def test_listing_every_number_scores_near_zero(key):
+    listing = ' '.join(str(number) for number in range(3000))
+    result = grade_calculation(listing, key)
+    assert result['score'] <= 1
+    assert phrases.TOO_MANY_VALUES in codes(result)
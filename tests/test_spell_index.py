@@ -0,0 +1,41 @@
+"""Spelling correction must fix typos of bank words without rewriting real words"""
+
+import pytest
+from spell_index import SpellIndex, base_forms
+
+# Bank words each real word below is one letter away from
+VOCABULARY = {'times': 3, 'leading': 2, 'safety': 5, 'steel': 4, 'scaffolding': 6, 'mortar': 2, 'receive': 1}
+
+# Base forms only: inflections are found through base_forms
+LEXICON = {'tile', 'load', 'safe', 'steal', 'time', 'lead', 'safety', 'steel', 'scaffolding', 'mortar', 'receive'}
+
+@pytest.fixture
+def index(tmp_path):
+    return SpellIndex(VOCABULARY, path=str(tmp_path / 'spell_index.json'), lexicon=frozenset(LEXICON))
+
+@pytest.mark.parametrize('word', ['tiles', 'loading', 'safely', 'steal'])
+def test_real_words_are_kept(index, word):
+    assert index.correct(word) == word
+
+@pytest.mark.parametrize('word, expected', [('scafolding', 'scaffolding'), ('morter', 'mortar'),
+                                            ('recieve', 'receive')])
+def test_misspellings_are_corrected(index, word, expected):
+    assert index.correct(word) == expected
+
+def test_normalize_keeps_real_words(index):
+    assert index.normalize('steal tiles need scafolding for safely loading') == \
+        'steal tiles need scaffolding for safely loading'
+
+def test_without_lexicon_one_replaced_letter_is_not_corrected(tmp_path):
+    index = SpellIndex(VOCABULARY, path=str(tmp_path / 'spell_index.json'), lexicon=frozenset())
+    assert [index.correct(word) for word in ['tiles', 'loading', 'safely', 'steal']] == \
+        ['tiles', 'loading', 'safely', 'steal']
+    assert index.correct('scafolding') == 'scaffolding'
+    assert index.correct('recieve') == 'receive'
+
+def test_base_forms():
+    assert {'tile'} <= base_forms('tiles')
+    assert {'load'} <= base_forms('loading')
+    assert {'safe'} <= base_forms('safely')
+    assert {'stop'} <= base_forms('stopped')
+    assert {'easy'} <= base_forms('easily')
@@ -0,0 +1,23 @@
+"""
+Text Cleaning Module
+Normalization applied to every answer and reference before it is compared,
+kept apart from the scorer so cache keys can be computed without loading it
+"""
+
+import re
+
+def clean_text(text):
+    """Clean and normalize text for comparison"""
+    if not text:
+        return ""
+
+    # Remove extra whitespace and normalize
+    text = re.sub(r'\s+', ' ', text.strip())
+
+    # Convert to lowercase
+    text = text.lower()
+
+    # Remove special characters but keep basic punctuation
+    text = re.sub(r'[^\w\s\.\,\!\?\:\;]', '', text)
+
+    return text
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Train the LSA semantic space used by the scorer over every model answer,
+alternative reference answer and scored student answer, and save it as
+memory-mapped NumPy files (see semantic_space.py).
+
+Run it offline whenever the bank or the answer history has grown; running
+workers pick the new space up on their next model refresh.
+
+Usage: python train_semantic_space.py [--components 100] [--output instance/semantic_space]
+"""
+import argparse
+import time
+from app import app
+from models import Answer, Question, ReferenceAnswer, db
+from text_cleaning import clean_text
+from semantic_space import SEMANTIC_COMPONENTS, SEMANTIC_SPACE_DIR, train_semantic_space
+
+def collect_references():
+    """(question id, cleaned text) for each reference, model answer first, as the scorer orders them"""
+    alternatives = {}
+    for question_id, answer_text in db.session.query(ReferenceAnswer.question_id, ReferenceAnswer.answer_text).\
+            order_by(ReferenceAnswer.id):
+        alternatives.setdefault(question_id, []).append(answer_text)
+
+    references = []
+    for question_id, model_answer in db.session.query(Question.id, Question.model_answer):
+        for text in [model_answer] + alternatives.get(question_id, []):
+            cleaned = clean_text(text)
+            if cleaned:
+                references.append((question_id, cleaned))
+    return references
+
+def collect_answers():
+    """Cleaned text of every scored student answer, streamed from the database"""
+    query = db.session.query(Answer.user_answer).\
+            filter(db.or_(Answer.status.is_(None), Answer.status != 'pending')).\
+            yield_per(1000)
+    for (user_answer,) in query:
+        yield clean_text(user_answer)
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the LSA semantic space used for scoring')
+    parser.add_argument('--components', type=int, default=SEMANTIC_COMPONENTS, help='latent dimensions')
+    parser.add_argument('--output', default=SEMANTIC_SPACE_DIR, help='directory to write the space to')
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        meta = train_semantic_space(collect_references(), collect_answers(),
+                                    path=args.output, n_components=args.components)
+
+    print(f"Trained {meta['components']}-d semantic space on {meta['references']} references and "
+          f"{meta['answers']} answers ({meta['terms']} terms, {meta['explained_variance'] * 100:.1f}% "
+          f"variance explained) in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+if __name__ == '__main__':
+    main()